@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark the IPC codecs, encode/decode per event and optionally through a ZMQ PUB/SUB pair."""
+
+import argparse
+import json
+import os
+import time
+
+from ipc_codec import CODECS
+
+# Representative of the OrderAck events that dominate the PUB stream
+SAMPLE_EVENT = {
+    "type": "Type: A",
+    "payload": {
+        "ts_ns": 1751544073564577000, "order_token": "ORD440682629HZ", "order_book_id": 1232,
+        "side": "S", "order_id": 10001, "qty": 123, "price": 2200, "time_in_force": 0,
+        "open_close": 0, "client_account": "334", "order_state": 1, "customer_info": "",
+        "exchange_info": "", "pretrade_qty": 123, "display_qty": 0, "client_category": 1,
+        "off_hours": 1,
+    },
+}
+
+
+# throughput and CPU time per event, bench-ipc.js in the repo root measures the Node side
+def bench_codec(codec, n: int) -> dict:
+    event = SAMPLE_EVENT
+    encode, decode = codec.encode, codec.decode
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(n):
+        data = encode(event)
+    enc_wall, enc_cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(n):
+        decode(data)
+    dec_wall, dec_cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    return {
+        "codec": codec.name,
+        "size_bytes": len(data),
+        "encode_per_sec": n / enc_wall,
+        "decode_per_sec": n / dec_wall,
+        "encode_cpu_us": enc_cpu / n * 1e6,
+        "decode_cpu_us": dec_cpu / n * 1e6,
+    }
+
+
+def bench_zmq(codec, n: int) -> dict:
+    import zmq
+
+    path = f"/tmp/ouch-ipc-bench-{os.getpid()}.sock"
+    ctx = zmq.Context()
+    pub = ctx.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.bind(f"ipc://{path}")
+    sub = ctx.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.connect(f"ipc://{path}")
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    time.sleep(0.2)  # slow joiner
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(n):
+        pub.send(codec.encode(SAMPLE_EVENT))
+    for _ in range(n):
+        codec.decode(sub.recv())
+    elapsed, cpu_used = time.perf_counter() - wall, time.process_time() - cpu
+
+    pub.close(0)
+    sub.close(0)
+    ctx.term()
+    os.remove(path)
+    return {"codec": codec.name, "events_per_sec": n / elapsed, "cpu_us_per_event": cpu_used / n * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPC encoding benchmark")
+    parser.add_argument("-n", type=int, default=200_000, help="events per run")
+    parser.add_argument("--zmq", action="store_true", help="also measure PUB/SUB over ipc://")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {"codec": [bench_codec(c, args.n) for c in CODECS.values()]}
+    if args.zmq:
+        results["zmq"] = [bench_zmq(c, args.n) for c in CODECS.values()]
+
+    for section, rows in results.items():
+        print(f"--- {section} ---")
+        for row in rows:
+            print("  ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
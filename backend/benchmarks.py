@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Codec and framing benchmark suite with regression tracking against a saved baseline."""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+from ipc_codec import CODECS
+from ouch_msgs import *
+from soupbin_msgs import *
+from transport import OuchClient
+from util import create_ouch_message_from_json
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+# One sample of every OUCH message, as the test server and frontend produce them
+SAMPLES = [
+    EnterOrder("ORD44075547BS4", 12, "B", 123, 22.0, 0, 0, "ACC1", "cust", "exch", 0, 1, 0),
+    ReplaceOrder("ORD44075547BS4", "ORD44075547BS5", 150, 2300, 0, "ACC1", "cust", "exch", 0, 1),
+    CancelOrder("ORD44075547BS4"),
+    CancelOrderByID(12, "B", 10001),
+    MassQuote("ORD44075547BS4", 1, "ACC1", "exch", 1, 12, 22, 23, 100, 100),
+    OrderAck(1751544073564577000, "ORD440682629HZ", 1232, "S", 10001, 123, 2200, 0, 0, "334", 1,
+             "", "", 123, 0, 1, 1, b"\x00" * 3),
+    OrderReject(1751544073564577000, "ORD440682629HZ", 5),
+    OrderReplaceAck(1751544073564577000, "ORD440682629H1", "ORD440682629HZ", 1232, "S", 10002, 150,
+                    2300, 0, 0, "334", 1, "", "", 150, 0, 1),
+    OrderCancelAck(1751544073564577000, "ORD440682629HZ", 1232, "S", 10001, 1),
+    OrderExecuted(1751544073564577000, "ORD440682629HZ", 1232, 100, 2200, 55555, 1, b"\x00" * 16),
+    MassQuoteAck(1751544073564577000, "ORD440682629HZ", 1232, "B", 0, 100, 0, 2200),
+    MassQuoteReject(1751544073564577000, "ORD440682629HZ", 1232, 7),
+]
+
+ENTER_ORDER_JSON = {
+    "type": "EnterOrder", "order_token": "ORD44075547BS4", "order_book_id": 12, "side": "B",
+    "qty": 123, "price": 22, "time_in_force": 0, "open_close": 0, "client_account": "3",
+    "customer_info": "", "exchange_info": "", "display_qty": 0, "client_category": 1, "off_hours": 1,
+}
+
+
+def _inbound_stream(n: int) -> bytes:
+    """n SequencedData frames cycling through the inbound message types."""
+    inbound = [m for m in SAMPLES if type(m) in OUCH_MessageFactory.INBOUND_TYPES.values()]
+    frames = [SoupPacketFactory.serialize(SequencedData(message=m.TYPE_ID + m.to_soupbin())) for m in inbound]
+    return b"".join(frames[i % len(frames)] for i in range(n))
+
+
+# ── cases ───────────────────────────────────────────────────────────────
+# Each factory returns (fn, ops): fn() runs `ops` operations once.
+
+def case_soup_serialize():
+    pkt = SequencedData(message=SAMPLES[5].TYPE_ID + SAMPLES[5].to_soupbin())
+    return lambda: SoupPacketFactory.serialize(pkt), 1
+
+
+def case_soup_parse_frame():
+    frame = memoryview(SoupPacketFactory.serialize(SequencedData(message=SAMPLES[5].TYPE_ID + SAMPLES[5].to_soupbin())))
+    return lambda: SoupPacketFactory.parse_frame(frame), 1
+
+
+def case_frame_enter_order():
+    """EnterOrder to a framed UnsequencedData, as send_ouch_msg builds it"""
+    msg = SAMPLES[0]
+    return lambda: SoupPacketFactory.serialize(UnsequencedData(message=msg.TYPE_ID + msg.to_soupbin())), 1
+
+
+def case_template_render():
+    """The same frame patched into a pre-encoded OrderTemplate"""
+    from order_templates import OrderTemplate
+    template = OrderTemplate(SAMPLES[0])
+    return lambda: template.render("ORD44075547BS4", 123, 22.0), 1
+
+
+def case_json_to_ouch():
+    return lambda: create_ouch_message_from_json(dict(ENTER_ORDER_JSON)), 1
+
+
+def _client():
+    # no pub socket or observers: measures framing + decode + dispatch only
+    return OuchClient()
+
+
+def case_data_received_fragmented():
+    """1000 frames delivered in 7 byte TCP reads."""
+    stream = _inbound_stream(1000)
+    chunks = [stream[i:i + 7] for i in range(0, len(stream), 7)]
+    client = _client()
+
+    def run():
+        for chunk in chunks:
+            client.data_received(chunk)
+    return run, 1000
+
+
+def case_data_received_coalesced():
+    """1000 frames delivered in 64 KiB TCP reads."""
+    stream = _inbound_stream(1000)
+    chunks = [stream[i:i + 65536] for i in range(0, len(stream), 65536)]
+    client = _client()
+
+    def run():
+        for chunk in chunks:
+            client.data_received(chunk)
+    return run, 1000
+
+
+def case_bulk_decode():
+    """1000 contiguous OrderExecuted payloads into one structured array."""
+    from ouch_dtypes import decode_payloads
+    buf = SAMPLES[9].to_soupbin() * 1000
+    return lambda: decode_payloads(buf, OrderExecuted.TYPE_ID), 1000
+
+
+def case_decode_frames():
+    """1000 mixed SequencedData frames into per-type structured arrays."""
+    from ouch_dtypes import decode_frames
+    stream = _inbound_stream(1000)
+    return lambda: decode_frames(stream), 1000
+
+
+def _codec_cases():
+    cases = {}
+    for msg in SAMPLES:
+        name = type(msg).__name__
+        payload = msg.to_soupbin()
+        cases[f"ouch_to_soupbin[{name}]"] = (lambda m=msg: (lambda: m.to_soupbin(), 1))
+        cases[f"ouch_from_soupbin[{name}]"] = (lambda c=type(msg), p=payload: (lambda: c.from_soupbin(p), 1))
+
+    event = {"type": "Type: A", "payload": {k: v for k, v in SAMPLES[5].__dict__.items() if k != "reserved_bits"}}
+    for codec in CODECS.values():
+        cases[f"ipc_encode[{codec.name}]"] = (lambda c=codec: (lambda: c.encode(event), 1))
+        data = codec.encode(event)
+        cases[f"ipc_decode[{codec.name}]"] = (lambda c=codec, d=data: (lambda: c.decode(d), 1))
+    return cases
+
+
+CASES = {
+    "soup_serialize": case_soup_serialize,
+    "soup_parse_frame": case_soup_parse_frame,
+    **_codec_cases(),
+    "frame[EnterOrder]": case_frame_enter_order,
+    "template_render[EnterOrder]": case_template_render,
+    "json_to_ouch[EnterOrder]": case_json_to_ouch,
+    "data_received[fragmented]": case_data_received_fragmented,
+    "data_received[coalesced]": case_data_received_coalesced,
+    "bulk_decode[OrderExecuted]": case_bulk_decode,
+    "bulk_decode[frames]": case_decode_frames,
+}
+
+
+def measure(factory, min_time: float, repeat: int) -> dict:
+    fn, ops = factory()
+    # calibrate the loop count so one round takes about min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed * 1.2))
+
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / (number * ops) * 1e9)
+    return {"ns_per_op": min(rounds), "median_ns": statistics.median(rounds), "ops": number * ops * repeat}
+
+
+async def _loopback(n: int) -> dict:
+    """Sequential EnterOrder → ack round trips against an in-process test server."""
+    import test_server_ouch
+    from sdk import OuchSession
+
+    test_server_ouch.logger.setLevel(logging.WARNING)
+    server = test_server_ouch.OuchTestServer()
+    srv = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    session = await OuchSession.connect("127.0.0.1", port, "bench", "bench")
+
+    rtts = []
+    for i in range(n):
+        start = time.perf_counter_ns()
+        await (await session.enter_order(f"BENCH{i:09d}", 1, "B", 10, 10.0, client_account="BENCH"))
+        rtts.append(time.perf_counter_ns() - start)
+
+    await session.close()
+    srv.close()
+    await srv.wait_closed()
+    rtts.sort()
+    return {"ns_per_op": statistics.median(rtts), "median_ns": statistics.median(rtts),
+            "p99_ns": rtts[int(len(rtts) * 0.99)], "ops": n}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = res["ns_per_op"] / base["ns_per_op"]
+        res["vs_baseline"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="OUCH codec and framing benchmarks. Every run is appended to <results>/history.jsonl and, "
+                    "unless it is saved as the baseline, compared with it: a case slower by more than "
+                    "--threshold fails the run (exit status 1).",
+        epilog="python benchmarks.py --save-baseline on the reference commit, then python benchmarks.py "
+               "on the candidate (-k parse runs only cases containing \"parse\")")
+    parser.add_argument("-k", help="only run cases whose name contains this string")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per measurement round")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per case, the fastest is kept")
+    parser.add_argument("--loopback", type=int, default=2000, help="round trips against the test server, 0 to skip")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    parser.add_argument("--results", default=RESULTS_DIR, help="directory for baseline and history")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # transport's per-message DEBUG logs would dominate the measurement
+    os.environ["DEBUG"] = "false"
+
+    results = {}
+    for name, factory in CASES.items():
+        if args.k and args.k not in name:
+            continue
+        results[name] = measure(factory, args.min_time, args.repeat)
+        print(f"{name:<40} {results[name]['ns_per_op']:>12.0f} ns/op")
+
+    if args.loopback and (not args.k or args.k in "loopback_roundtrip"):
+        results["loopback_roundtrip"] = asyncio.run(_loopback(args.loopback))
+        print(f"{'loopback_roundtrip':<40} {results['loopback_roundtrip']['ns_per_op']:>12.0f} ns/op")
+
+    run = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "results": results,
+    }
+
+    os.makedirs(args.results, exist_ok=True)
+    baseline_path = os.path.join(args.results, "baseline.json")
+    regressions = []
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path} ({run['commit']})")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\nCompared with baseline {baseline['commit']}:")
+        for name, res in results.items():
+            if "vs_baseline" in res:
+                flag = "  REGRESSION" if (name, res["vs_baseline"]) in regressions else ""
+                print(f"{name:<40} {res['vs_baseline']:>8.2f}x{flag}")
+    else:
+        print("\nNo baseline yet, run with --save-baseline to create one")
+
+    with open(os.path.join(args.results, "history.jsonl"), "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Unsolicited inbound flood for stressing the client's receive path."""
+
+import struct
+from itertools import accumulate
+
+from ouch_msgs import *
+
+MIX_TYPES = {
+    "A": "OrderAck",
+    "E": "OrderExecuted",
+    "C": "OrderCancelAck",
+}
+
+_TS = struct.Struct(">Q")
+# ts_ns is the first field of every inbound message: 2 length bytes, 'S', OUCH type byte
+TS_OFFSET = 4
+
+
+def _frame(ouch_msg) -> bytes:
+    body = ouch_msg.TYPE_ID + ouch_msg.to_soupbin()
+    return (len(body) + 1).to_bytes(2, "big") + b"S" + body
+
+
+def _message(kind: str, n: int, book: int):
+    token = f"FLOOD{n:09d}"
+    order_id = 900_000_000 + n
+    if kind == "A":
+        return OrderAck(ts_ns=0, order_token=token, order_book_id=book, side="B", order_id=order_id,
+                        qty=100, price=1000, time_in_force=0, open_close=0, client_account="FLOOD",
+                        order_state=1, customer_info="", exchange_info="", pretrade_qty=100,
+                        display_qty=0, client_category=1, off_hours=0, reserved_bits=b"\x00" * 3)
+    if kind == "E":
+        return OrderExecuted(ts_ns=0, order_token=token, order_book_id=book, traded_qty=1, trade_price=1000,
+                             match_id=order_id, client_category=1, reserved_bits=b"\x00" * 16)
+    return OrderCancelAck(ts_ns=0, order_token=token, order_book_id=book, side="B", order_id=order_id, reason=1)
+
+
+class Flood:
+    """
+    Frames encoded once up front: a pool of order tokens, each with one
+    message per type in the mix (OrderAck, OrderExecuted, OrderCancelAck by
+    default, a plausible order life cycle). take() slices that cycle and
+    patches the current time into every ts_ns, so the client can measure
+    how far behind the server it is reading.
+    """
+
+    def __init__(self, mix: str = "AEC", tokens: int = 1024, book: int = 1):
+        unknown = set(mix) - set(MIX_TYPES)
+        if not mix or unknown:
+            raise ValueError(f"Flood mix must use {''.join(MIX_TYPES)}, got {mix!r}")
+        self.frames = [_frame(_message(kind, n, book)) for n in range(tokens) for kind in mix]
+        self.sizes = [len(f) for f in self.frames]
+        self.pos = 0
+
+    def take(self, n: int, ts_ns: int):
+        """The next n frames of the cycle as (bytearray, [frame sizes]), stamped with ts_ns"""
+        frames, sizes, total = self.frames, self.sizes, len(self.frames)
+        chunk_frames, chunk_sizes = [], []
+        pos = self.pos
+        while n > 0:
+            end = min(total, pos + n)
+            chunk_frames.extend(frames[pos:end])
+            chunk_sizes.extend(sizes[pos:end])
+            n -= end - pos
+            pos = end % total
+        self.pos = pos
+
+        data = bytearray(b"".join(chunk_frames))
+        pack_into = _TS.pack_into
+        for offset in accumulate(chunk_sizes[:-1], initial=0):
+            pack_into(data, offset + TS_OFFSET, ts_ns)
+        return data, chunk_sizes
@@ -2,6 +2,7 @@ import asyncio
 import logging
 from datetime import datetime, timezone
 from soupbin_msgs import ClientHeartbeat
+from metrics import REGISTRY, GAP_BUCKETS
 
 from typing import TYPE_CHECKING
 
@@ -10,6 +11,9 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+SERVER_GAP = REGISTRY.histogram("ouch_server_heartbeat_gap_seconds",
+                                "Time between consecutive server heartbeats", GAP_BUCKETS)
+
 class HeartbeatController:
     
     timeoutThreshold = 5  # seconds
@@ -28,7 +32,7 @@ class HeartbeatController:
                 current_time = datetime.now(timezone.utc)
                 if (current_time - self.clientTimestamp).total_seconds() > self.timeoutThreshold:
                     logger.debug("Sending heartbeat")
-                    await self.client.send_q.put(ClientHeartbeat())
+                    self.client.send_outgoing_msg(ClientHeartbeat())
                     self.refresh_client_timestamp()
                 
                 # Check server timestamp too
@@ -45,5 +49,7 @@ class HeartbeatController:
         logger.debug("Client timestamp refreshed")
 
     def refresh_server_timestamp(self):
-        self.serverTimestamp = datetime.now(timezone.utc)
+        now = datetime.now(timezone.utc)
+        SERVER_GAP.observe((now - self.serverTimestamp).total_seconds())
+        self.serverTimestamp = now
         logger.debug("Server timestamp refreshed")
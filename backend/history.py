@@ -0,0 +1,223 @@
+"""Bounded history of every OUCH message sent and received, paged by the "history" CONN command."""
+
+import logging
+import os
+import struct
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ouch_msgs import OUCH_MessageFactory
+
+logger = logging.getLogger(__name__)
+
+INBOUND = ord("I")
+OUTBOUND = ord("O")
+
+# with a spill path, evicted messages go to <spill>.dat (payloads back to back) and <spill>.meta (one record each)
+SPILL_META = np.dtype([("offset", "<i8"), ("ts_ns", "<i8"), ("direction", "u1"), ("type", "u1"),
+                       ("size", "<u2")])
+_META = struct.Struct("<qqBBH")
+
+MAX_PAGE = 1000
+
+
+class MessageHistory:
+
+    def __init__(self, capacity: int = 100_000, arena_bytes: Optional[int] = None,
+                 spill_path: Optional[str] = None):
+        self.capacity = capacity
+        # OUCH payloads are 15-148 bytes, 96 per message on average is plenty
+        self.arena = bytearray(arena_bytes or capacity * 96)
+        self.ts_ns = np.zeros(capacity, dtype=np.int64)
+        self.direction = np.zeros(capacity, dtype=np.uint8)
+        self.type = np.zeros(capacity, dtype=np.uint8)
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.size = np.zeros(capacity, dtype=np.uint16)
+        # scalar writes through memoryviews skip NumPy's per-item overhead on the append path
+        self._ts = memoryview(self.ts_ns)
+        self._dir = memoryview(self.direction)
+        self._type = memoryview(self.type)
+        self._start = memoryview(self.start)
+        self._size = memoryview(self.size)
+
+        self.first = 0          # oldest position still in memory
+        self.next = 0           # position of the next message
+        self._head = 0          # arena write offset
+
+        self.spill_path = spill_path
+        self._spill_data = self._spill_meta = None
+        self._spill_bytes = 0
+        self._data_fd = None
+        self._meta = None       # memory map of the spilled records, remapped when it grows
+        if spill_path:
+            # one spill per process, a restart starts a fresh one
+            os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+            self._spill_data = open(spill_path + ".dat", "wb", buffering=1 << 20)
+            self._spill_meta = open(spill_path + ".meta", "wb", buffering=1 << 16)
+            self._data_fd = os.open(spill_path + ".dat", os.O_RDONLY)
+
+    def __len__(self) -> int:
+        return self.next - self.first
+
+    @property
+    def spilled(self) -> int:
+        """Positions [0, spilled) are on disk, the rest are in memory"""
+        return self.first if self._spill_data is not None else 0
+
+    def append(self, direction: int, payload: bytes) -> int:
+        """Record one OUCH payload (type byte first), returns its position"""
+        n = len(payload)
+        if n > len(self.arena) or n > 0xFFFF:
+            return -1
+        cap = self.capacity
+        head = self._head
+        if head + n > len(self.arena):
+            # too little room left before the end, drop what is still there and wrap
+            while self.next > self.first and self.start[self.first % cap] >= head:
+                self._evict()
+            head = 0
+        while self.next > self.first and (self.next - self.first == cap
+                                          or head <= self._start[self.first % cap] < head + n):
+            self._evict()
+
+        pos = self.next
+        slot = pos % cap
+        self.arena[head:head + n] = payload
+        self._ts[slot] = time.time_ns()
+        self._dir[slot] = direction
+        self._type[slot] = payload[0]
+        self._start[slot] = head
+        self._size[slot] = n
+        self._head = head + n
+        self.next = pos + 1
+        return pos
+
+    def _evict(self):
+        slot = self.first % self.capacity
+        if self._spill_data is not None:
+            start, n = self._start[slot], self._size[slot]
+            self._spill_data.write(self.arena[start:start + n])
+            self._spill_meta.write(_META.pack(self._spill_bytes, self._ts[slot], self._dir[slot],
+                                              self._type[slot], n))
+            self._spill_bytes += n
+        self.first += 1
+
+    def payload(self, pos: int) -> Optional[bytes]:
+        """Raw payload at a position, None if it is neither in memory nor spilled"""
+        if self.first <= pos < self.next:
+            slot = pos % self.capacity
+            start = self._start[slot]
+            return bytes(self.arena[start:start + self._size[slot]])
+        if 0 <= pos < self.spilled:
+            meta = self._meta_view()[pos]
+            return os.pread(self._data_fd, int(meta["size"]), int(meta["offset"]))
+        return None
+
+    def _meta_view(self) -> np.ndarray:
+        if self._meta is None or len(self._meta) != self.spilled:
+            self._spill_data.flush()
+            self._spill_meta.flush()
+            self._meta = np.memmap(self.spill_path + ".meta", dtype=SPILL_META, mode="r", shape=(self.spilled,))
+        return self._meta
+
+    def _memory_columns(self):
+        """Memory-resident columns in position order (oldest first)"""
+        cap = self.capacity
+        lo, hi = self.first % cap, self.next % cap
+        if len(self) == 0:
+            slots = np.empty(0, dtype=np.int64)
+        elif lo < hi:
+            slots = np.arange(lo, hi)
+        else:
+            slots = np.concatenate((np.arange(lo, cap), np.arange(0, hi)))
+        return self.ts_ns[slots], self.direction[slots], self.type[slots]
+
+    @staticmethod
+    def _match(ts, direction, types, type_codes, dir_code, since_ns, until_ns) -> np.ndarray:
+        mask = np.ones(len(ts), dtype=bool)
+        if type_codes is not None:
+            mask &= np.isin(types, type_codes)
+        if dir_code is not None:
+            mask &= direction == dir_code
+        if since_ns is not None:
+            mask &= ts >= since_ns
+        if until_ns is not None:
+            mask &= ts < until_ns
+        return np.flatnonzero(mask)
+
+    def query(self, offset: int = 0, limit: int = 100, types: Optional[Iterable[str]] = None,
+              direction: Optional[str] = None, since_ns: Optional[int] = None, until_ns: Optional[int] = None,
+              newest_first: bool = True) -> dict:
+        """
+        One page of matching messages. `types` are OUCH type bytes ("A", "E",
+        ...), `direction` is "I" or "O", the time range is [since_ns, until_ns)
+        on logged_ns, the local receive/send time. `total` is the number of matches, so the UI can
+        size its scrollbar without fetching them.
+        """
+        offset, limit = int(offset), min(int(limit), MAX_PAGE)
+        if offset < 0 or limit < 0:
+            raise ValueError("offset and limit must not be negative")
+        if direction is not None and direction not in ("I", "O"):
+            raise ValueError(f"direction must be 'I' or 'O', got {direction!r}")
+        type_codes = np.frombuffer("".join(types).encode(), dtype=np.uint8) if types else None
+        dir_code = ord(direction) if direction else None
+        since_ns = None if since_ns is None else int(since_ns)
+        until_ns = None if until_ns is None else int(until_ns)
+
+        filters = (type_codes, dir_code, since_ns, until_ns)
+        unfiltered = all(f is None for f in filters)
+        # positions are contiguous, so without filters the page is plain arithmetic
+        if unfiltered:
+            lo = 0 if self.spilled else self.first
+            matches = None
+            total = self.next - lo
+        else:
+            parts = []
+            if self.spilled:
+                meta = self._meta_view()
+                parts.append(self._match(meta["ts_ns"], meta["direction"], meta["type"], *filters))
+            parts.append(self.first + self._match(*self._memory_columns(), *filters))
+            matches = np.concatenate(parts)
+            total = len(matches)
+
+        if newest_first:
+            end = max(total - offset, 0)
+            window = range(end - 1, max(end - limit, 0) - 1, -1)
+        else:
+            window = range(offset, min(offset + limit, total))
+        positions = [lo + i for i in window] if matches is None else [int(matches[i]) for i in window]
+
+        return {"total": total, "offset": offset, "limit": limit, "first": 0 if self.spilled else self.first,
+                "next": self.next, "messages": [self.describe(pos) for pos in positions]}
+
+    def describe(self, pos: int) -> Optional[dict]:
+        """Decode the message at a position into a plain dict for the UI"""
+        if self.first <= pos < self.next:
+            slot = pos % self.capacity
+            ts, direction = self._ts[slot], self._dir[slot]
+        elif 0 <= pos < self.spilled:
+            meta = self._meta_view()[pos]
+            ts, direction = int(meta["ts_ns"]), int(meta["direction"])
+        else:
+            return None
+        payload = self.payload(pos)
+        row = {"pos": pos, "logged_ns": ts, "direction": chr(direction), "type": payload[:1].decode()}
+        try:
+            if direction == INBOUND:
+                msg = OUCH_MessageFactory.create_inbound_message(payload)
+            else:
+                msg = OUCH_MessageFactory.create_message(payload)
+            row.update((k, v) for k, v in msg.__dict__.items() if k != "reserved_bits")
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            row["error"] = str(e)
+            row["raw"] = payload.hex()
+        return row
+
+    def close(self):
+        if self._spill_data is not None:
+            self._spill_data.close()
+            self._spill_meta.close()
+            os.close(self._data_fd)
+            self._spill_data = self._spill_meta = self._meta = None
@@ -0,0 +1,62 @@
+"""Event encodings for the backend/Electron IPC, msgpack when both ends have it and JSON otherwise."""
+
+import json
+import logging
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON stays available as fallback
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+class JsonCodec:
+    name = "json"
+
+    @staticmethod
+    def encode(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    @staticmethod
+    def decode(data: bytes):
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    @staticmethod
+    def encode(obj) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def decode(data: bytes):
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {"json": JsonCodec}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec
+
+
+def negotiate(offered) -> type:
+    """Pick the first encoding offered by the peer that we support, JSON otherwise."""
+    for name in offered or ():
+        codec = CODECS.get(name)
+        if codec is not None:
+            return codec
+    return JsonCodec
+
+
+def decode_any(data: bytes):
+    """
+    Decode an IPC frame in either encoding. Every IPC message is a map, so a
+    JSON frame always starts with '{' and a msgpack frame never does, which
+    lets both sides accept either encoding at any time.
+    """
+    if data[:1] == b"{":
+        return json.loads(data)
+    if msgpack is None:
+        raise ValueError("Received binary IPC frame but msgpack is not installed")
+    return msgpack.unpackb(data, raw=False)
@@ -0,0 +1,83 @@
+"""Inbound lag of the OUCH receive path, measured against the server timestamps."""
+
+import asyncio
+import logging
+import time
+from array import array
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InboundLagMonitor:
+    """
+    How far behind the server the client is reading: for every inbound OUCH
+    message, the gap between the server's ts_ns and the moment the message
+    is handled. Per interval it publishes an "InboundLag" event with the
+    message rate and lag percentiles; a lag that keeps growing means the
+    receive path is slower than the inbound rate.
+
+    Lags only mean "behind" when both clocks agree, i.e. against a test
+    server on the same host.
+    """
+
+    def __init__(self, publish: Optional[Callable[[str, dict], None]] = None, interval: float = 1.0):
+        self.publish = publish
+        self.interval = interval
+        self._lags = array("q")     # ns, this interval
+        self.total = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._report_loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ── observer hooks ──────────────────────────────────────────────────
+
+    def on_ouch_inbound(self, msg, size=None):
+        ts_ns = getattr(msg, "ts_ns", 0)
+        if ts_ns:
+            self._lags.append(time.time_ns() - ts_ns)
+
+    def on_ouch_outbound(self, msg, size=None):
+        pass
+
+    # ── reporting ───────────────────────────────────────────────────────
+
+    def report(self, elapsed: float) -> Optional[dict]:
+        """Summarise and reset the current interval, None if nothing arrived"""
+        lags, self._lags = self._lags, array("q")
+        if not lags:
+            return None
+        self.total += len(lags)
+        ordered = sorted(lags)
+        n = len(ordered)
+        return {
+            "msgs": n,
+            "msgs_per_sec": n / elapsed,
+            "total_msgs": self.total,
+            "lag_ms_p50": ordered[n // 2] / 1e6,
+            "lag_ms_p99": ordered[min(n - 1, int(n * 0.99))] / 1e6,
+            "lag_ms_max": ordered[-1] / 1e6,
+            # lag of the newest message: how far behind we are right now
+            "lag_ms_last": lags[-1] / 1e6,
+        }
+
+    async def _report_loop(self):
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            stats = self.report(now - last)
+            last = now
+            if stats is None:
+                continue
+            logger.info(f"📥 Inbound {stats['msgs_per_sec']:,.0f} msgs/s, lag p50 {stats['lag_ms_p50']:.2f} ms "
+                        f"p99 {stats['lag_ms_p99']:.2f} ms, now {stats['lag_ms_last']:.2f} ms behind")
+            if self.publish:
+                self.publish("InboundLag", stats)
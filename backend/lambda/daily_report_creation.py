@@ -1,106 +1,275 @@
-# sample 
+"""
+Daily trading report over the backend's SQLite journal (see store.py).
+
+For one UTC day the journal is read in chunks straight into NumPy columns,
+then aggregated with vectorized group-bys:
+
+  fills       fills, bought/sold qty and VWAP per (order_book_id, client_account),
+              with order-to-trade ratio per key
+  rejects     OrderReject counts by reject_code
+  latency     ack latency (OrderAck ts_ns - order sent) percentiles and histogram
+  summary     totals and the order-to-trade ratio for the day
+
+Tables are written as CSV, or as Parquet when pyarrow is installed, and the
+summary as JSON, under <out_dir>/<date>/. Several days are built in
+parallel on a process pool.
+
+    lambda_handler({"date": "2025-07-03"}, None)
+    lambda_handler({"dates": ["2025-07-01", "2025-07-02"], "workers": 4}, None)
+    python daily_report_creation.py --db ouch_store.sqlite3 2025-07-01 2025-07-02
+"""
+
+import argparse
+import csv
 import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output needs pyarrow, CSV doesn't
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 100_000
+# outbound message types that count as order actions for the order-to-trade ratio:
+# EnterOrder, ReplaceOrder, CancelOrder, CancelOrderByID
+ORDER_ACTIONS = ("O", "U", "X", "Y")
+# ack latency histogram edges in microseconds, log spaced from 1 µs to 10 s
+LATENCY_EDGES_US = np.logspace(0, 7, 29)
+LATENCY_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def day_bounds(day: str):
+    """[start, end) of a UTC day in epoch nanoseconds"""
+    start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    start_ns = int(start.timestamp()) * 1_000_000_000
+    return start_ns, start_ns + 86_400 * 1_000_000_000
+
+
+def _stream(conn: sqlite3.Connection, sql: str, params, dtypes: dict) -> dict:
+    """
+    Run a query and collect its columns as NumPy arrays, fetching CHUNK_ROWS
+    rows at a time so the day never exists as one list of Python tuples.
+    """
+    names = list(dtypes)
+    chunks = {name: [] for name in names}
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        for name, column in zip(names, zip(*rows)):
+            chunks[name].append(np.array(column, dtype=dtypes[name]))
+    return {name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+            for name, parts in chunks.items()}
+
+
+def _group(book: np.ndarray, account: np.ndarray):
+    """Unique (book, account) keys and the key index of every row"""
+    if not len(book):
+        return [], np.empty(0, dtype=np.int64)
+    keys, inverse = np.unique(np.rec.fromarrays([book, account]), return_inverse=True)
+    return [(int(b), str(a)) for b, a in keys.tolist()], inverse.ravel()
+
+
+def fills_by_key(conn: sqlite3.Connection, start_ns: int, end_ns: int) -> list:
+    """Fill statistics and order-to-trade ratio per (order_book_id, client_account)"""
+    fills = _stream(conn, "SELECT COALESCE(order_book_id, -1), COALESCE(client_account, ''), side = 'B', qty, price "
+                          "FROM executions WHERE ts_ns >= ? AND ts_ns < ?", (start_ns, end_ns),
+                    {"book": np.int64, "account": "U16", "buy": np.bool_, "qty": np.int64, "price": np.int64})
+    orders = _stream(conn, "SELECT COALESCE(order_book_id, -1), COALESCE(client_account, '') FROM messages "
+                           f"WHERE direction = 'O' AND msg_type IN ({','.join('?' * len(ORDER_ACTIONS))}) "
+                           "AND ts_ns >= ? AND ts_ns < ?", (*ORDER_ACTIONS, start_ns, end_ns),
+                     {"book": np.int64, "account": "U16"})
+
+    # one key space for fills and order actions so both line up by index
+    n_fills = len(fills["book"])
+    keys, inverse = _group(np.concatenate([fills["book"], orders["book"]]),
+                           np.concatenate([fills["account"], orders["account"]]))
+    if not keys:
+        return []
+    fill_key, order_key = inverse[:n_fills], inverse[n_fills:]
+    n = len(keys)
+
+    buy = fills["buy"]
+    qty = fills["qty"].astype(np.float64)
+    notional = qty * fills["price"]
+    count = np.bincount(fill_key, minlength=n)
+    bought = np.bincount(fill_key, weights=np.where(buy, qty, 0), minlength=n)
+    sold = np.bincount(fill_key, weights=np.where(buy, 0, qty), minlength=n)
+    buy_notional = np.bincount(fill_key, weights=np.where(buy, notional, 0), minlength=n)
+    sell_notional = np.bincount(fill_key, weights=np.where(buy, 0, notional), minlength=n)
+    actions = np.bincount(order_key, minlength=n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        buy_vwap = np.where(bought > 0, buy_notional / bought, 0.0)
+        sell_vwap = np.where(sold > 0, sell_notional / sold, 0.0)
+        vwap = np.where(bought + sold > 0, (buy_notional + sell_notional) / (bought + sold), 0.0)
+        otr = np.where(count > 0, actions / count, np.nan)
+
+    return [{
+        "order_book_id": book if book >= 0 else None,
+        "client_account": account,
+        "fills": int(count[i]),
+        "bought_qty": int(bought[i]),
+        "sold_qty": int(sold[i]),
+        "net_qty": int(bought[i] - sold[i]),
+        "buy_vwap": round(float(buy_vwap[i]), 4),
+        "sell_vwap": round(float(sell_vwap[i]), 4),
+        "vwap": round(float(vwap[i]), 4),
+        "order_actions": int(actions[i]),
+        "order_to_trade": None if np.isnan(otr[i]) else round(float(otr[i]), 4),
+    } for i, (book, account) in enumerate(keys)]
+
+
+def rejects_by_code(conn: sqlite3.Connection, start_ns: int, end_ns: int) -> list:
+    codes = _stream(conn, "SELECT code FROM messages WHERE direction = 'I' AND msg_type = 'J' "
+                          "AND ts_ns >= ? AND ts_ns < ? AND code IS NOT NULL", (start_ns, end_ns),
+                    {"code": np.int64})["code"]
+    counts = np.bincount(codes) if len(codes) else np.empty(0, dtype=np.int64)
+    return [{"reject_code": int(code), "count": int(counts[code])} for code in np.flatnonzero(counts)]
+
+
+def ack_latency(conn: sqlite3.Connection, start_ns: int, end_ns: int):
+    """Percentiles and histogram of OrderAck time minus the time the order was sent"""
+    latency_ns = _stream(conn, "SELECT m.ts_ns - o.ts_ns FROM messages m JOIN orders o ON o.order_token = m.order_token "
+                               "WHERE m.direction = 'I' AND m.msg_type = 'A' AND m.ts_ns >= ? AND m.ts_ns < ?",
+                         (start_ns, end_ns), {"latency": np.int64})["latency"]
+    latency_us = latency_ns / 1000.0
+    stats = {"count": int(len(latency_us))}
+    if len(latency_us):
+        stats.update(mean_us=round(float(latency_us.mean()), 3), min_us=round(float(latency_us.min()), 3),
+                     max_us=round(float(latency_us.max()), 3))
+        for p, value in zip(LATENCY_PERCENTILES, np.percentile(latency_us, LATENCY_PERCENTILES)):
+            stats[f"p{p:g}_us"] = round(float(value), 3)
+
+    # clip into the outer bins so nothing is silently dropped
+    counts, edges = np.histogram(np.clip(latency_us, LATENCY_EDGES_US[0], LATENCY_EDGES_US[-1]),
+                                 bins=LATENCY_EDGES_US)
+    histogram = [{"from_us": round(float(lo), 3), "to_us": round(float(hi), 3), "count": int(c)}
+                 for lo, hi, c in zip(edges[:-1], edges[1:], counts)]
+    return stats, histogram
+
+
+def _write_table(path: str, rows: list, fmt: str) -> str:
+    """Write rows as Parquet (when asked for and pyarrow is there) or CSV, returns the file written"""
+    if fmt == "parquet" and pa is not None:
+        path += ".parquet"
+        pq.write_table(pa.Table.from_pylist(rows), path)
+        return path
+    path += ".csv"
+    with open(path, "w", newline="") as f:
+        if rows:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return path
+
+
+def build_report(db_path: str, day: str, out_dir: str, fmt: str = "csv") -> dict:
+    """Build and write the report for one UTC day, returns its summary"""
+    start_ns, end_ns = day_bounds(day)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        fills = fills_by_key(conn, start_ns, end_ns)
+        rejects = rejects_by_code(conn, start_ns, end_ns)
+        latency, histogram = ack_latency(conn, start_ns, end_ns)
+    finally:
+        conn.close()
+
+    total_fills = sum(r["fills"] for r in fills)
+    total_actions = sum(r["order_actions"] for r in fills)
+    summary = {
+        "date": day,
+        "fills": total_fills,
+        "traded_qty": sum(r["bought_qty"] + r["sold_qty"] for r in fills),
+        "order_actions": total_actions,
+        "order_to_trade": round(total_actions / total_fills, 4) if total_fills else None,
+        "rejects": sum(r["count"] for r in rejects),
+        "ack_latency": latency,
+    }
+
+    day_dir = os.path.join(out_dir, day)
+    os.makedirs(day_dir, exist_ok=True)
+    if fmt == "parquet" and pa is None:
+        logger.warning("pyarrow is not installed, writing CSV instead of Parquet")
+    summary["files"] = [
+        _write_table(os.path.join(day_dir, "fills"), fills, fmt),
+        _write_table(os.path.join(day_dir, "rejects"), rejects, fmt),
+        _write_table(os.path.join(day_dir, "ack_latency_histogram"), histogram, fmt),
+    ]
+    summary_path = os.path.join(day_dir, "summary.json")
+    summary["files"].append(summary_path)
+    with open(summary_path, "w") as f:
+        json.dump({**summary, "rejects_by_code": rejects}, f, indent=2)
+    return summary
+
+
+def build_reports(db_path: str, days: list, out_dir: str, fmt: str = "csv", workers: int = 0) -> list:
+    """One report per day; several days are spread over a process pool"""
+    if len(days) == 1 or workers == 1:
+        return [build_report(db_path, day, out_dir, fmt) for day in days]
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        return list(pool.map(build_report, [db_path] * len(days), days, [out_dir] * len(days), [fmt] * len(days)))
+
+
+def _days(event: dict) -> list:
+    if event.get("dates"):
+        return list(event["dates"])
+    if event.get("start") and event.get("end"):
+        first = date.fromisoformat(event["start"])
+        last = date.fromisoformat(event["end"])
+        return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+    return [event.get("date") or datetime.now(timezone.utc).date().isoformat()]
 
-# Received event: {
-#    type: 'Type: A',
-#    payload: {
-#      ts_ns: 1751544073564577000,
-#      order_token: 'ORD440682629HZ',
-#      order_book_id: 1232,
-#      side: 'S',
-#      order_id: 10001,
-#      qty: 123,
-#      price: 2200,
-#      time_in_force: 0,
-#      open_close: 0,
-#      client_account: '334',
-#      order_state: 1,
-#      customer_info: '',
-#      exchange_info: '',
-#      pretrade_qty: 123,
-#      display_qty: 0,
-#      client_category: 1,
-#      off_hours: 1
-#    }
-
-# Order sent to backend: {
-#    type: 'EnterOrder',
-#    order_token: 'ORD44075547BS4',
-#    order_book_id: 12,
-#    side: 'B',
-#    qty: 123,
-#    price: 22,
-#    time_in_force: 0,
-#    open_close: 0,
-#    client_account: '3',
-#    customer_info: '',
-#    exchange_info: '',
-#    display_qty: 0,
-#    client_category: 1,
-#    off_hours: 1
-#  }
 
 def lambda_handler(event, context):
     """
-    Lambda function to create a daily report.
-    No real use for now, needs persistent session storage for real use.
+    Create the daily report. The event may set "date" (default today, UTC),
+    "dates" or "start"/"end" for several days, "db_path", "out_dir",
+    "format" ("csv" or "parquet") and "workers".
     """
+    event = event or {}
     try:
-        print("Creating daily report...")
-        
+        db_path = event.get("db_path") or os.getenv("STORE_PATH", "ouch_store.sqlite3")
+        out_dir = event.get("out_dir") or os.getenv("REPORT_DIR", "/tmp/reports")
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Journal not found: {db_path}")
 
-        
-        # Simulate successful report creation
+        print("Creating daily report...")
+        summaries = build_reports(db_path, _days(event), out_dir, event.get("format", "csv"),
+                                  int(event.get("workers", 0)))
         print("Daily report created successfully.")
-        
-        # return a list of OUCH messages passed during the session
-        list_of_messages = [
-            {
-                'type': 'EnterOrder',
-                'order_token': 'ORD44075547BS4',
-                'order_book_id': 12,
-                'side': 'B',
-                'qty': 123,
-                'price': 22,    
-                'time_in_force': 0,
-                'open_close': 0,    
-                'client_account': '3',
-                'customer_info': '',
-                'exchange_info': '',
-                'display_qty': 0,
-                'client_category': 1,
-                'off_hours': 1
-            },
-            {
-                'type': 'EnterOrder',
-                'order_token': 'ORD440682629HZ',
-                'order_book_id': 1232,
-                'side': 'S',
-                'order_id': 10001,
-                'qty': 123,
-                'price': 2200,
-                'time_in_force': 0, 
-                'open_close': 0,
-                'client_account': '334',
-                'order_state': 1,
-                'customer_info': '',
-                'exchange_info': '',
-                'display_qty': 0,
-                'client_category': 1,
-                'off_hours': 1
-            }
-        ]
-        # Convert the list of messages to JSON
-        messages_json = json.dumps(list_of_messages)    
 
         return {
             'statusCode': 200,
-            'body': messages_json
+            'body': json.dumps(summaries if len(summaries) > 1 else summaries[0])
         }
-    
+
     except Exception as e:
         print(f"Error creating daily report: {e}")
         return {
             'statusCode': 500,
             'body': f"Error creating daily report: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily report over the OUCH SQLite journal")
+    parser.add_argument("dates", nargs="*", help="UTC days (YYYY-MM-DD), default today")
+    parser.add_argument("--db", default=os.getenv("STORE_PATH", "ouch_store.sqlite3"), help="journal path")
+    parser.add_argument("--out", default=os.getenv("REPORT_DIR", "reports"), help="output directory")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--workers", type=int, default=0, help="processes for multi-day runs, 0 for one per CPU")
+    args = parser.parse_args()
+    result = lambda_handler({"dates": args.dates, "db_path": args.db, "out_dir": args.out,
+                             "format": args.format, "workers": args.workers}, None)
+    print(result["body"] if result["statusCode"] != 200 else json.dumps(json.loads(result["body"]), indent=2))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""Load generator and throughput/latency benchmark for OuchClient."""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from ouch_msgs import *
+from sdk import OuchSession
+
+logger = logging.getLogger("ouch-load-gen")
+
+
+def percentiles(values, points=(50, 90, 99, 99.9)) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    n = len(values)
+    out = {f"p{p:g}": values[min(n - 1, int(n * p / 100))] for p in points}
+    out["max"] = values[-1]
+    out["mean"] = sum(values) / n
+    return out
+
+
+class LoadGenerator:
+
+    def __init__(self, session: OuchSession, args):
+        self.session = session
+        self.client = session.client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.books = [int(b) for b in args.books.split(",")]
+        self.mix = self._parse_mix(args.mix)
+
+        self._next_token = 0
+        self._prefix = args.token_prefix
+        self._inflight = {}        # token -> (kind, send time ns)
+        self._live = []            # acked tokens that can be replaced / cancelled
+        self._live_idx = {}        # token -> index in _live
+        self.latencies_us = {"enter": [], "replace": [], "cancel": []}
+        self.sent = {"enter": 0, "replace": 0, "cancel": 0}
+        self.responses = 0
+        self.rejects = 0
+        self.fills = 0
+        self.timeline = []
+        self._window_open = asyncio.Event()
+        self._window_open.set()
+        self.client.add_observer(self)
+
+    @staticmethod
+    def _parse_mix(spec: str):
+        mix = {}
+        for part in spec.split(","):
+            kind, _, weight = part.partition("=")
+            if kind not in ("enter", "replace", "cancel"):
+                raise ValueError(f"Unknown order kind in mix: {kind}")
+            mix[kind] = float(weight)
+        return list(mix), list(mix.values())
+
+    def _token(self) -> str:
+        self._next_token += 1
+        return f"{self._prefix}{self._next_token:0{14 - len(self._prefix)}d}"
+
+    def _live_add(self, token):
+        self._live_idx[token] = len(self._live)
+        self._live.append(token)
+
+    def _live_remove(self, token):
+        idx = self._live_idx.pop(token, None)
+        if idx is None:
+            return
+        last = self._live.pop()
+        if last != token:
+            self._live[idx] = last
+            self._live_idx[last] = idx
+
+    # ── order flow ──────────────────────────────────────────────────────
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._inflight)
+
+    def send_one(self):
+        kinds, weights = self.mix
+        kind = self.rng.choices(kinds, weights)[0]
+        if kind != "enter" and not self._live:
+            kind = "enter"
+
+        args = self.args
+        if kind == "enter":
+            token = self._token()
+            msg = EnterOrder(order_token=token, order_book_id=self.rng.choice(self.books),
+                             side=self.rng.choice("BS"), qty=self.rng.randint(args.qty_min, args.qty_max),
+                             price=self.rng.randint(args.price_min, args.price_max) / 100,
+                             time_in_force=0, open_close=0, client_account=args.account,
+                             customer_info="", exchange_info="", display_qty=0,
+                             client_category=1, off_hours=0)
+        elif kind == "replace":
+            existing = self.rng.choice(self._live)
+            self._live_remove(existing)
+            token = self._token()
+            msg = ReplaceOrder(existing_order_token=existing, replacement_order_token=token,
+                               qty=self.rng.randint(args.qty_min, args.qty_max),
+                               price=self.rng.randint(args.price_min, args.price_max),
+                               open_close=0, client_account=args.account, customer_info="",
+                               exchange_info="", display_qty=0, client_category=1)
+        else:
+            token = self.rng.choice(self._live)
+            self._live_remove(token)
+            msg = CancelOrder(order_token=token)
+
+        self._inflight[token] = (kind, time.perf_counter_ns())
+        self.sent[kind] += 1
+        self.client.send_ouch_msg(msg)
+        if self.outstanding >= self.args.window:
+            self._window_open.clear()
+
+    def on_ouch_outbound(self, msg, size=None):
+        pass
+
+    def on_ouch_inbound(self, msg, size=None):
+        now = time.perf_counter_ns()
+        if isinstance(msg, OrderExecuted):
+            self.fills += 1
+            return
+        if isinstance(msg, OrderReplaceAck):
+            token = msg.replacement_order_token
+        elif isinstance(msg, (OrderAck, OrderReject, OrderCancelAck)):
+            token = msg.order_token
+        else:
+            return
+
+        self.responses += 1
+        pending = self._inflight.pop(token, None)
+        if pending is not None:
+            kind, sent_ns = pending
+            self.latencies_us[kind].append((now - sent_ns) / 1e3)
+        if isinstance(msg, (OrderAck, OrderReplaceAck)):
+            self._live_add(token)
+        else:
+            if isinstance(msg, OrderReject):
+                self.rejects += 1
+            self._live_remove(token)
+
+        if not self._window_open.is_set() and self.outstanding < self.args.window:
+            self._window_open.set()
+
+    def on_disconnect(self, exc):
+        self._window_open.set()
+
+    # ── driver ──────────────────────────────────────────────────────────
+
+    async def _sample(self, start_ns: int):
+        transport = self.client.transport
+        while True:
+            self.timeline.append({
+                "t_ms": (time.perf_counter_ns() - start_ns) / 1e6,
+                "send_q": self.client.send_q.qsize(),
+                "write_buffer": transport.get_write_buffer_size() if transport else 0,
+                "outstanding": self.outstanding,
+                "sent": sum(self.sent.values()),
+                "responses": self.responses,
+            })
+            await asyncio.sleep(self.args.sample_ms / 1000)
+
+    async def run(self) -> dict:
+        args = self.args
+        total = args.count or float("inf")
+        start = time.perf_counter_ns()
+        deadline = start + int(args.duration * 1e9) if args.duration else None
+        cpu_start = time.process_time()
+        sampler = asyncio.create_task(self._sample(start))
+
+        sent = 0
+        while sent < total and self.client.transport is not None:
+            now = time.perf_counter_ns()
+            if deadline and now >= deadline:
+                break
+            if args.rate:
+                due = min(total, int((now - start) / 1e9 * args.rate)) - sent
+                for _ in range(due):
+                    self.send_one()
+                sent += max(due, 0)
+                await asyncio.sleep(0.0005)
+            else:
+                for _ in range(min(args.burst, total - sent)):
+                    self.send_one()
+                    sent += 1
+                    if not self._window_open.is_set():
+                        break
+                await self._window_open.wait()
+                await asyncio.sleep(0)
+        send_end = time.perf_counter_ns()
+
+        # let in-flight responses arrive
+        drain_until = time.perf_counter() + args.drain
+        while self.outstanding and time.perf_counter() < drain_until:
+            await asyncio.sleep(0.01)
+        end = time.perf_counter_ns()
+        cpu = time.process_time() - cpu_start
+        sampler.cancel()
+
+        send_s = (send_end - start) / 1e9
+        total_s = (end - start) / 1e9
+        messages = sent + self.responses + self.fills
+        return {
+            "config": vars(args),
+            "sent": dict(self.sent, total=sent),
+            "responses": self.responses,
+            "rejects": self.rejects,
+            "fills": self.fills,
+            "unanswered": self.outstanding,
+            "send_seconds": send_s,
+            "total_seconds": total_s,
+            "sent_per_sec": sent / send_s if send_s else 0.0,
+            "responses_per_sec": self.responses / total_s if total_s else 0.0,
+            "cpu_seconds": cpu,
+            "cpu_us_per_msg": cpu / messages * 1e6 if messages else 0.0,
+            "ack_latency_us": {kind: percentiles(v) for kind, v in self.latencies_us.items() if v},
+            "timeline": self.timeline,
+        }
+
+
+def print_report(result: dict):
+    print("\n=== OUCH load test ===")
+    print(f"sent         {result['sent']}")
+    print(f"responses    {result['responses']} (rejects {result['rejects']}, fills {result['fills']}, "
+          f"unanswered {result['unanswered']})")
+    print(f"throughput   {result['sent_per_sec']:.0f} orders/s sent, {result['responses_per_sec']:.0f} responses/s")
+    print(f"cpu          {result['cpu_seconds']:.2f} s, {result['cpu_us_per_msg']:.1f} us/msg")
+    for kind, p in result["ack_latency_us"].items():
+        print(f"{kind:<12} " + "  ".join(f"{k}={v:.0f}us" for k, v in p.items()))
+    peak = max(result["timeline"], key=lambda s: s["send_q"], default=None)
+    if peak:
+        print(f"peak send_q  {peak['send_q']} at {peak['t_ms']:.0f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="OUCH client load generator. Drives one session at a target rate or full throttle with an "
+                    "enter/replace/cancel mix, then reports msgs/sec, ack latency percentiles, CPU time per "
+                    "message and a timeline of queue depths.",
+        epilog="example: python load_gen.py --rate 20000 --duration 10 "
+               "--mix enter=0.8,replace=0.1,cancel=0.1 --out run.json")
+    parser.add_argument("--host", default=os.getenv("HOST_ADDR", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("HOST_PORT", "9999")))
+    parser.add_argument("--username", default=os.getenv("TEST_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.getenv("TEST_PASSWORD", "admin"))
+    parser.add_argument("--rate", type=float, default=0, help="orders/sec, 0 for full throttle")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to send for, 0 for no limit")
+    parser.add_argument("--count", type=int, default=0, help="stop after this many orders, 0 for no limit")
+    parser.add_argument("--mix", default="enter=1", help="e.g. enter=0.8,replace=0.1,cancel=0.1")
+    parser.add_argument("--books", default="1", help="comma separated order_book_ids")
+    parser.add_argument("--qty-min", type=int, default=1)
+    parser.add_argument("--qty-max", type=int, default=1000)
+    parser.add_argument("--price-min", type=int, default=1000, help="price in cents")
+    parser.add_argument("--price-max", type=int, default=1100, help="price in cents")
+    parser.add_argument("--account", default="LOADGEN")
+    parser.add_argument("--token-prefix", default="LG")
+    parser.add_argument("--window", type=int, default=10_000, help="max unanswered orders at full throttle")
+    parser.add_argument("--burst", type=int, default=500, help="orders per loop turn at full throttle")
+    parser.add_argument("--drain", type=float, default=5, help="seconds to wait for late responses")
+    parser.add_argument("--sample-ms", type=float, default=100, help="queue depth sampling interval")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", help="write the result as JSON to this path")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(name)s %(levelname)-8s │ %(message)s", datefmt="%H:%M:%S")
+    if not args.verbose:
+        # transport's per-message DEBUG logs would dominate the measurement
+        os.environ["DEBUG"] = "false"
+
+    session = await OuchSession.connect(args.host, args.port, args.username, args.password)
+    result = await LoadGenerator(session, args).run()
+    await session.close()
+
+    print_report(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Event-loop lag and GC pause monitoring, with an opt-in gc.freeze() after warm-up."""
+
+import asyncio
+import gc
+import logging
+import time
+from typing import Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PAUSE_BUCKETS = (1e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+LOOP_LAG = REGISTRY.histogram("event_loop_lag_seconds", "How late a timed wakeup ran on the event loop",
+                              PAUSE_BUCKETS)
+GC_PAUSE = REGISTRY.histogram("gc_pause_seconds", "Duration of garbage collections", PAUSE_BUCKETS,
+                              ("generation",))
+GC_COLLECTED = REGISTRY.counter("gc_collected_total", "Objects freed by the garbage collector", ("generation",))
+
+# thresholds for freeze mode, the default is (700, 10, 10); message bursts otherwise trigger gen0 passes mid-burst
+FROZEN_THRESHOLDS = (50_000, 20, 100)
+
+
+class LoopMonitor:
+
+    def __init__(self, interval: float = 0.05, stall_warning: float = 0.1):
+        self.interval = interval
+        self.stall_warning = stall_warning
+        self._gc_start = 0.0
+        self._pause = [GC_PAUSE.labels(g) for g in range(3)]
+        self._collected = [GC_COLLECTED.labels(g) for g in range(3)]
+        self._tasks = []
+
+    def start(self, freeze: bool = False, warmup: float = 10.0, thresholds: Optional[Tuple[int, ...]] = None):
+        if self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+        if self.interval > 0:
+            self._tasks.append(asyncio.create_task(self._sample_lag()))
+        if freeze:
+            self._tasks.append(asyncio.create_task(self._freeze_after(warmup, thresholds or FROZEN_THRESHOLDS)))
+
+    def stop(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+            return
+        pause = time.perf_counter() - self._gc_start
+        generation = info["generation"]
+        self._pause[generation].observe(pause)
+        self._collected[generation].value += info["collected"]
+        if pause >= self.stall_warning:
+            logger.warning(f"🗑️ GC gen{generation} pause {pause * 1000:.1f} ms ({info['collected']} freed)")
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        interval = self.interval
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = loop.time() - expected
+            if lag < 0:
+                lag = 0.0
+            LOOP_LAG.observe(lag)
+            if lag >= self.stall_warning:
+                logger.warning(f"🐢 Event loop stalled for {lag * 1000:.1f} ms")
+
+    async def _freeze_after(self, warmup: float, thresholds: Tuple[int, ...]):
+        await asyncio.sleep(warmup)
+        start = time.perf_counter()
+        gc.collect()
+        gc.freeze()
+        gc.set_threshold(*thresholds)
+        logger.info(f"🧊 GC: froze {gc.get_freeze_count()} objects in {(time.perf_counter() - start) * 1000:.1f} ms, "
+                    f"thresholds {gc.get_threshold()}")
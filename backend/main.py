@@ -1,4 +1,4 @@
-import zmq, json, os
+import zmq, json, os, time
 import zmq.asyncio
 import asyncio
 from dotenv import load_dotenv
@@ -6,13 +6,29 @@ from heartbeat_controller import HeartbeatController
 import logging
 from transport import OuchClient
 import sys
-from util import create_ouch_message_from_json
+from util import create_ouch_message_from_json, parse_ouch_message, parse_basket, parse_template_order, \
+    encode_ouch_messages
 from soupbin_msgs import UnsequencedData, LogoutRequest
+from store import MessageStore
+from positions import PositionAggregator
+from ipc_codec import negotiate, decode_any
+from strategy import StrategyRunner
+from lag_monitor import InboundLagMonitor
+from loop_monitor import LoopMonitor
+from profiler import Profiler
+from history import MessageHistory
+from message_index import MessageIndex
+from risk import RiskEngine, RiskRejected
+from tokens import TokenAllocator, checkpoint_periodically
+from order_templates import OrderTemplate
+import metrics
+from transport import DECODE_ERRORS
 
 
 async def handle_conn(data, client, root):
     """
-    Handle connection messages from the frontend.
+    Handle connection messages from the frontend. Query commands return a
+    dict that the command channel sends back in its reply.
     """
     logging.info(f"Handling connection message: {data}")
     
@@ -47,6 +63,9 @@ async def handle_conn(data, client, root):
             
         if client.hb is None:
             HeartbeatController(client)
+
+        client.username = username
+        client.password = password
         
         loop = asyncio.get_running_loop()
         
@@ -68,31 +87,291 @@ async def handle_conn(data, client, root):
 
         return
 
+    elif data.get("command") == "positions":
+        client.positions.publish_snapshot()
+
+    elif data.get("command") == "strategies":
+        client.send_event("Strategies", {"strategies": client.strategies.stats()})
+
+    elif data.get("command") == "kill_strategy":
+        # Kill switch: a named strategy, or every strategy when no name is given
+        name = data.get("name")
+        cancel_orders = data.get("cancel_orders", True)
+        if name:
+            client.strategies.kill(name, cancel_orders)
+        else:
+            client.strategies.kill_all(cancel_orders)
+        client.send_event("Strategies", {"strategies": client.strategies.stats()})
+
+    elif data.get("command") == "profile":
+        # Profile the running backend for N seconds, reports go to PROFILE_DIR
+        try:
+            client.profiler.start(
+                mode=data.get("mode", "sampling"),
+                seconds=data.get("seconds", 10),
+                trace_malloc=bool(data.get("tracemalloc", False)),
+                interval=float(data.get("interval", 0.001)),
+            )
+        except (RuntimeError, ValueError) as e:
+            logging.error(f"Could not start profiler: {e}")
+            client.send_event("Profile", {"state": "error", "reason": str(e)})
+
+    elif data.get("command") == "profile_stop":
+        client.profiler.stop()
+
+    elif data.get("command") == "history":
+        # One page of the message history, the UI fetches only the rows it shows
+        return client.history.query(
+            offset=data.get("offset", 0),
+            limit=data.get("limit", 100),
+            types=data.get("types"),
+            direction=data.get("direction"),
+            since_ns=data.get("since_ns"),
+            until_ns=data.get("until_ns"),
+            newest_first=data.get("newest_first", True),
+        )
+
+    elif data.get("command") == "lookup":
+        # Every message about one order_token / order_id / order_book_id / client_account / match_id
+        return client.index.lookup(
+            data.get("field", "order_token"),
+            data.get("value"),
+            offset=data.get("offset", 0),
+            limit=data.get("limit", 100),
+            newest_first=data.get("newest_first", True),
+        )
+
+    elif data.get("command") == "risk":
+        # Pre-trade limits, open orders and reject count per account and book
+        return client.risk.snapshot()
+
+    elif data.get("command") == "tokens":
+        # Hand out fresh order tokens, for callers that want to know them before sending
+        count = max(1, min(int(data.get("count", 1)), 1000))
+        return {"tokens": [client.tokens.next() for _ in range(count)]}
+
+    elif data.get("command") == "template":
+        # Pre-encode an EnterOrder prefill once; TemplateOrder requests then send it by name
+        name = data.get("name")
+        if not name:
+            raise ValueError("Order template requires a name")
+        template = OrderTemplate.from_dict(data, name)
+        client.templates[name] = template
+        logging.info(f"📐 Order template {name}: book {template.prefill.order_book_id} {template.prefill.side}")
+        return template.to_dict()
+
+    elif data.get("command") == "hello":
+        # Frontend offers its IPC encodings in preference order, we answer with the one we'll publish in
+        client.codec = negotiate(data.get("encodings"))
+        logging.info(f"IPC encoding negotiated: {client.codec.name}")
+        client.send_event("Encoding", {"encoding": client.codec.name})
+
+async def publish_heartbeats(client, interval: float):
+    """Publish a "Heartbeat" event every interval seconds, the UI's proof the backend is alive whatever it filters"""
+    while True:
+        await asyncio.sleep(interval)
+        client.send_event("Heartbeat", {"ts": time.time(), "connected": client.transport is not None})
+
+def decode_ipc(msg: bytes):
+    """decode_any, counting frames that fail in the decode_errors_total metric"""
+    try:
+        return decode_any(msg)
+    except Exception:
+        DECODE_ERRORS.labels("ipc").inc()
+        raise
+
+# Upper bound on messages taken per wakeup so one burst can't starve the loop
+DRAIN_MAX = 10_000
+
+async def recv_pending(recv):
+    """Await one message, then take everything already queued without blocking."""
+    msgs = [await recv()]
+    try:
+        while len(msgs) < DRAIN_MAX:
+            msgs.append(await recv(zmq.NOBLOCK))
+    except zmq.Again:
+        pass
+    return msgs
+
 async def handle_front_to_back(sub, client: OuchClient, root):
     while True:
+        # Orders drained in one wakeup go out as one coalesced write
+        batch, payloads = [], []
         try:
-            msg = await sub.recv_string()
-            data = json.loads(msg)
-
-            # divide between ouch and client-specific messages
-            if data.get("type") == "CONN":
-                await handle_conn(data, client, root)
-                continue
-
-            ouch_msg = create_ouch_message_from_json(data)
-            if ouch_msg is None:
-                logging.error(f"Received invalid ouch message: {data}")
-                continue
-            
-            ouch_payload = ouch_msg.TYPE_ID + ouch_msg.to_soupbin()
-            
-            sequenced_packet = UnsequencedData(message=ouch_payload)
-            
-            client.send_outgoing_msg(sequenced_packet)
+            for msg in await recv_pending(sub.recv):
+                try:
+                    data = decode_ipc(msg)
+
+                    # divide between ouch and client-specific messages
+                    if data.get("type") == "CONN":
+                        if batch:
+                            client.send_ouch_batch(batch, payloads)
+                            batch, payloads = [], []
+                        result = await handle_conn(data, client, root)
+                        if result is not None:
+                            # no reply channel here, publish the result instead
+                            client.send_event("CommandResult", {"command": data.get("command"), **result})
+                        continue
+
+                    if data.get("type") == "Basket":
+                        # the basket is encoded and risk checked as a unit before it joins the batch
+                        try:
+                            legs = parse_basket(data)
+                            client.tokens.assign(legs)
+                            encoded = encode_ouch_messages(legs)
+                            client.pretrade(legs)
+                            batch.extend(legs)
+                            payloads.extend(encoded)
+                        except (TypeError, ValueError) as e:
+                            logging.error(f"Dropped invalid basket: {e}")
+                        except RiskRejected:
+                            pass  # logged and published by pretrade
+                        continue
+
+                    if data.get("type") == "TemplateOrder":
+                        # written straight from the template's buffer, behind anything batched so far
+                        if batch:
+                            client.send_ouch_batch(batch, payloads)
+                            batch, payloads = [], []
+                        try:
+                            template, qty, price, token = parse_template_order(data, client.templates)
+                        except ValueError as e:
+                            logging.error(f"Dropped invalid template order: {e}")
+                            continue
+                        written = client.send_template(template, qty, price, token)
+                        exc = written.exception() if written.done() else None
+                        if exc is not None and not isinstance(exc, RiskRejected):
+                            logging.error(f"Dropped invalid template order: {exc}")
+                        continue
+
+                    ouch_msg = create_ouch_message_from_json(data)
+                    if ouch_msg is None:
+                        logging.error(f"Received invalid ouch message: {data}")
+                        continue
+
+                    try:
+                        client.tokens.assign((ouch_msg,))
+                        encoded = encode_ouch_messages((ouch_msg,))
+                        client.pretrade((ouch_msg,))
+                    except ValueError as e:
+                        logging.error(f"Dropped invalid ouch message: {e}")
+                        continue
+                    except RiskRejected:
+                        continue
+                    batch.append(ouch_msg)
+                    payloads.extend(encoded)
+                except Exception as e:
+                    logging.error(f"Error handling frontend message: {e}")
+
+            if batch:
+                client.send_ouch_batch(batch, payloads)
             
         except Exception as e:
             logging.error(f"Error handling frontend message: {e}")
 
+def _reply(router, identity, client, corr_id, status, **extra):
+    reply = {"corr_id": corr_id, "status": status, **extra}
+    router.send_multipart([identity, client.codec.encode(reply)])
+
+def _reply_when_written(router, client, written, requests):
+    """Reply "sent" (or "rejected") to every (identity, corr_id, tokens) once the batch write completes."""
+    def on_written(fut):
+        exc = None if fut.cancelled() else fut.exception()
+        if fut.cancelled() or exc is not None:
+            reason = "Cancelled" if exc is None else str(exc)
+            extra = {"code": exc.code} if isinstance(exc, RiskRejected) else {}
+            for identity, corr_id, _ in requests:
+                _reply(router, identity, client, corr_id, "rejected", reason=reason, **extra)
+        else:
+            for identity, corr_id, tokens in requests:
+                _reply(router, identity, client, corr_id, "sent", count=len(tokens), tokens=tokens)
+    written.add_done_callback(on_written)
+
+async def handle_commands(router, client: OuchClient, root):
+    """
+    Request/reply command channel (ROUTER). Each request carries a corr_id
+    that is echoed back in exactly one reply: "sent" once the order frame is
+    written to the wire, "rejected" with a reason if it fails locally, or
+    "ok" for CONN commands. Replies are sent from write callbacks, so callers
+    can pipeline any number of requests without waiting.
+
+    Orders that breach a pre-trade risk limit are "rejected" with the
+    limit's reason code. A Basket request carries an "orders" list that is
+    validated and risk checked as a whole and written in one coalesced
+    write. Orders from all requests drained in one wakeup are coalesced the
+    same way. A TemplateOrder names a template registered with the
+    "template" CONN command and is written straight from its pre-encoded
+    frame.
+    """
+    while True:
+        batch, payloads, requests = [], [], []
+        try:
+            for identity, msg in await recv_pending(router.recv_multipart):
+                corr_id = None
+                try:
+                    data = decode_ipc(msg)
+                    corr_id = data.pop("corr_id", None)
+
+                    if data.get("type") == "CONN":
+                        if batch:
+                            _reply_when_written(router, client, client.send_ouch_batch(batch, payloads), requests)
+                            batch, payloads, requests = [], [], []
+                        result = await handle_conn(data, client, root)
+                        _reply(router, identity, client, corr_id, "ok", **(result or {}))
+                        continue
+
+                    if client.transport is None or client.transport.is_closing():
+                        _reply(router, identity, client, corr_id, "rejected", reason="Not connected")
+                        continue
+
+                    if data.get("type") == "TemplateOrder":
+                        try:
+                            template, qty, price, token = parse_template_order(data, client.templates)
+                        except ValueError as e:
+                            _reply(router, identity, client, corr_id, "rejected", reason=str(e))
+                            continue
+                        token = token or client.tokens.next()
+                        if batch:
+                            _reply_when_written(router, client, client.send_ouch_batch(batch, payloads), requests)
+                            batch, payloads, requests = [], [], []
+                        written = client.send_template(template, qty, price, token)
+                        _reply_when_written(router, client, written, [(identity, corr_id, [token])])
+                        continue
+
+                    try:
+                        if data.get("type") == "Basket":
+                            ouch_msgs = parse_basket(data)
+                        else:
+                            ouch_msgs = [parse_ouch_message(data)]
+                        # orders sent without a token get one here, the reply tells the caller which
+                        tokens = client.tokens.assign(ouch_msgs)
+                        # encoded before the risk checks charge for it, so a bad field can't sink the batch
+                        encoded = encode_ouch_messages(ouch_msgs)
+                    except (TypeError, ValueError) as e:
+                        logging.error(f"Rejected invalid ouch message {corr_id}: {e}")
+                        _reply(router, identity, client, corr_id, "rejected", reason=str(e))
+                        continue
+
+                    try:
+                        client.pretrade(ouch_msgs)
+                    except RiskRejected as e:
+                        _reply(router, identity, client, corr_id, "rejected", reason=str(e), code=e.code)
+                        continue
+
+                    batch.extend(ouch_msgs)
+                    payloads.extend(encoded)
+                    requests.append((identity, corr_id, tokens))
+
+                except Exception as e:
+                    logging.error(f"Error handling command: {e}")
+                    _reply(router, identity, client, corr_id, "rejected", reason=str(e))
+
+            if batch:
+                _reply_when_written(router, client, client.send_ouch_batch(batch, payloads), requests)
+
+        except Exception as e:
+            logging.error(f"Error handling command: {e}")
+
 async def main():
 
     # Load environment variables
@@ -113,6 +392,8 @@ async def main():
 
     # Publisher socket so multiclient possible for single backend scaling in the future
     pub = ctx.socket(zmq.PUB)
+    # Deep queues absorb bursts (fill storms, basket acks) instead of silently dropping events
+    pub.setsockopt(zmq.SNDHWM, int(os.getenv("IPC_SNDHWM", "100000")))
     ipc_path = "/tmp/ouch-ipc.sock"
     try:
         os.remove(ipc_path)
@@ -122,20 +403,118 @@ async def main():
 
     # SUB socket for frontend → backend
     sub = ctx.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, int(os.getenv("IPC_RCVHWM", "100000")))
     sub.connect("ipc:///tmp/ouch-ipc-orders.sock")
     sub.setsockopt_string(zmq.SUBSCRIBE, "") 
 
+    # ROUTER socket for request/reply commands with correlation ids
+    router = ctx.socket(zmq.ROUTER)
+    router.setsockopt(zmq.SNDHWM, int(os.getenv("IPC_SNDHWM", "100000")))
+    router.setsockopt(zmq.RCVHWM, int(os.getenv("IPC_RCVHWM", "100000")))
+    cmd_path = "/tmp/ouch-ipc-cmd.sock"
+    try:
+        os.remove(cmd_path)
+    except FileNotFoundError:
+        pass
+    router.bind(f"ipc://{cmd_path}")
+
     client = OuchClient(pub=pub)
 
+    # Journal orders/executions/messages to SQLite, set STORE_PATH="" to disable
+    store_path = os.getenv("STORE_PATH", "ouch_store.sqlite3")
+    store = None
+    if store_path:
+        store = MessageStore(store_path)
+        client.add_observer(store)
+
+    # Order tokens for orders sent without one, and the day's used tokens for the duplicate check.
+    # The counter is checkpointed to TOKEN_STATE (empty to keep it in memory), TOKEN_PREFIX overrides the day prefix
+    token_state = os.getenv("TOKEN_STATE", "tokens.json")
+    client.tokens = TokenAllocator(token_state or None, prefix=os.getenv("TOKEN_PREFIX") or None)
+    if token_state:
+        asyncio.create_task(checkpoint_periodically(client.tokens, float(os.getenv("TOKEN_CHECKPOINT_INTERVAL", "5"))))
+
+    # Pre-trade risk limits from RISK_LIMITS (JSON or YAML); without a file only duplicate tokens are stopped
+    risk_limits = os.getenv("RISK_LIMITS")
+    client.risk = RiskEngine.load(risk_limits, client.tokens) if risk_limits else RiskEngine(tokens=client.tokens)
+    client.add_observer(client.risk)
+
+    client.positions = PositionAggregator(publish=client.send_event)
+    client.add_observer(client.positions)
+
+    # Prometheus endpoint on METRICS_PORT (empty to disable) and a Metrics event every METRICS_INTERVAL seconds
+    metrics.REGISTRY.gauge("ouch_send_queue_depth", "Messages waiting in OuchClient.send_q").set_function(
+        client.send_q.qsize)
+    metrics_port = os.getenv("METRICS_PORT", "9108")
+    if metrics_port:
+        try:
+            await metrics.serve(host=os.getenv("METRICS_HOST", "127.0.0.1"), port=int(metrics_port))
+        except OSError as e:
+            logging.error(f"Could not start metrics endpoint on port {metrics_port}: {e}")
+    # Heartbeat events keep the UI's backend-alive timer running when its topic filter drops everything else
+    heartbeat_interval = float(os.getenv("IPC_HEARTBEAT_INTERVAL", "1"))
+    if heartbeat_interval > 0:
+        asyncio.create_task(publish_heartbeats(client, heartbeat_interval))
+    metrics_interval = float(os.getenv("METRICS_INTERVAL", "5"))
+    if metrics_interval > 0:
+        asyncio.create_task(metrics.publish_periodically(client.send_event, metrics_interval))
+
+    # Bounded message history for the UI's paged views: HISTORY_SIZE messages in memory,
+    # older ones appended to HISTORY_SPILL.dat/.meta when set
+    client.history = MessageHistory(
+        capacity=int(os.getenv("HISTORY_SIZE", "100000")),
+        spill_path=os.getenv("HISTORY_SPILL") or None,
+    )
+    history_gauge = metrics.REGISTRY.gauge("history_messages", "Messages held by the message history", ("where",))
+    history_gauge.set_function(client.history.__len__, "memory")
+    history_gauge.set_function(lambda: client.history.spilled, "spill")
+    client.index = MessageIndex(client.history)
+    client.add_observer(client.index)
+    metrics.REGISTRY.gauge("index_keys", "Distinct values in the message indexes").set_function(
+        client.index.__len__)
+
+    client.profiler = Profiler(os.getenv("PROFILE_DIR", "profiles"), publish=client.send_event)
+
+    # Event-loop lag and GC pause histograms. GC_FREEZE=1 freezes startup objects after GC_WARMUP
+    # seconds and raises the GC thresholds (GC_THRESHOLDS="gen0,gen1,gen2" to override)
+    loop_monitor = LoopMonitor(interval=float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05")))
+    thresholds = os.getenv("GC_THRESHOLDS")
+    loop_monitor.start(
+        freeze=os.getenv("GC_FREEZE", "").lower() in ("1", "true", "yes"),
+        warmup=float(os.getenv("GC_WARMUP", "10")),
+        thresholds=tuple(int(t) for t in thresholds.split(",")) if thresholds else None,
+    )
+
+    # Receive rate and how far behind the server's timestamps we read, LAG_INTERVAL=0 to disable
+    lag_interval = float(os.getenv("LAG_INTERVAL", "1"))
+    if lag_interval > 0:
+        lag_monitor = InboundLagMonitor(publish=client.send_event, interval=lag_interval)
+        client.add_observer(lag_monitor)
+        lag_monitor.start()
+
+    # In-process strategies, STRATEGIES="module:Class,other_module:Class"
+    client.strategies = StrategyRunner(client)
+    for spec in filter(None, os.getenv("STRATEGIES", "").split(",")):
+        try:
+            client.strategies.load(spec.strip())
+        except Exception as e:
+            logging.error(f"Could not load strategy {spec}: {e}")
+
     logging.info("Ouch client is running. Press Ctrl+C to exit.")
 
     asyncio.create_task(handle_front_to_back(sub=sub, client=client, root=root)) # start handling
+    asyncio.create_task(handle_commands(router=router, client=client, root=root))
     
 
     ## Separate this part for frontend based connection mgmt
-    await asyncio.Event().wait()  
-
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # rows still queued for the journal are written before exit
+        if store is not None:
+            store.close()
 
 
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
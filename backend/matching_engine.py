@@ -0,0 +1,354 @@
+"""Price-time priority matching engine for the OUCH test server, one OrderBook per order_book_id."""
+
+import time
+from bisect import bisect_left, insort
+from collections import deque
+
+from ouch_msgs import *
+
+# time_in_force
+TIF_DAY = 0
+TIF_IOC = 3
+TIF_FOK = 4
+
+# OrderAck / OrderReplaceAck order_state
+STATE_ON_BOOK = 1
+STATE_NOT_ON_BOOK = 2
+
+# OrderCancelAck reason
+CANCEL_BY_USER = 1
+CANCEL_UNFILLED = 3          # IOC remainder or FOK that could not fill
+
+# OrderReject reject_code (test server values)
+REJECT_UNKNOWN_ORDER = 1
+REJECT_DUPLICATE_TOKEN = 2
+REJECT_INVALID_QTY = 3
+REJECT_INVALID_PRICE = 4
+REJECT_INVALID_SIDE = 5
+
+
+class Order:
+    __slots__ = ("owner", "token", "order_id", "book_id", "side", "is_buy", "price", "qty", "filled",
+                 "time_in_force", "open_close", "client_account", "customer_info",
+                 "exchange_info", "display_qty", "client_category", "off_hours")
+
+    def __init__(self, owner, token, order_id, book_id, side, price, qty, msg):
+        self.owner = owner
+        self.token = token
+        self.order_id = order_id
+        self.book_id = book_id
+        self.side = side            # as entered, so acks echo a short sell as "T"
+        self.is_buy = side == "B"   # a short sell rests and matches as a sell
+        self.price = price
+        self.qty = qty              # open quantity, 0 once filled or cancelled
+        self.filled = 0
+        self.time_in_force = msg.time_in_force
+        self.open_close = msg.open_close
+        self.client_account = msg.client_account
+        self.customer_info = msg.customer_info
+        self.exchange_info = msg.exchange_info
+        self.display_qty = msg.display_qty
+        self.client_category = msg.client_category
+        self.off_hours = msg.off_hours
+
+    def copy(self) -> "Order":
+        new = Order.__new__(Order)
+        for name in Order.__slots__:
+            setattr(new, name, getattr(self, name))
+        return new
+
+
+class _Side:
+    """
+    One side of a book: price levels in priority order. Matching and
+    cancelling are O(1) per order, bisect only runs when a level is created
+    or emptied.
+    """
+
+    __slots__ = ("sign", "prices", "levels", "live")
+
+    def __init__(self, sign: int):
+        self.sign = sign            # -1 for bids so prices[0] is always the best level
+        self.prices = []            # sorted level keys (sign * price)
+        self.levels = {}            # key -> deque of Order, dead orders have qty == 0
+        self.live = {}              # key -> number of live orders at the level
+
+    def add(self, order: Order):
+        key = self.sign * order.price
+        level = self.levels.get(key)
+        if level is None:
+            level = self.levels[key] = deque()
+            self.live[key] = 0
+            insort(self.prices, key)
+        level.append(order)
+        self.live[key] += 1
+
+    def remove(self, order: Order):
+        """
+        Unlink a live order. The caller zeroes its qty, so it stays in the deque
+        as a dead entry until it reaches the front of the level.
+        """
+        key = self.sign * order.price
+        self.live[key] -= 1
+        if self.live[key] == 0:
+            self._drop_level(key)
+
+    def _drop_level(self, key):
+        del self.levels[key]
+        del self.live[key]
+        if self.prices[0] == key:
+            self.prices.pop(0)
+        else:
+            del self.prices[bisect_left(self.prices, key)]
+
+    def depth(self, n: int) -> list:
+        return [(self.sign * key, sum(o.qty for o in self.levels[key]), self.live[key])
+                for key in self.prices[:n]]
+
+
+class OrderBook:
+
+    def __init__(self, book_id: int):
+        self.book_id = book_id
+        self.bids = _Side(-1)
+        self.asks = _Side(1)
+        self.last_price = None
+
+    def side_of(self, order: Order) -> _Side:
+        return self.bids if order.is_buy else self.asks
+
+    def opposite(self, order: Order) -> _Side:
+        return self.asks if order.is_buy else self.bids
+
+    def crossable_qty(self, order: Order, limit: int) -> int:
+        """Open quantity on the other side at prices `order` can trade with, up to `limit`."""
+        opp = self.opposite(order)
+        total = 0
+        for key in opp.prices:
+            if (opp.sign * key > order.price) if order.is_buy else (opp.sign * key < order.price):
+                break
+            total += sum(o.qty for o in opp.levels[key])
+            if total >= limit:
+                break
+        return total
+
+    def depth(self, n: int = 5) -> dict:
+        return {"bids": self.bids.depth(n), "asks": self.asks.depth(n), "last_price": self.last_price}
+
+
+class MatchingEngine:
+    """
+    Prices are integer ticks (cents), as OrderAck and OrderExecuted carry
+    them. Every call returns a list of (owner, ouch_msg) to deliver, owner
+    being whatever key the server passed in for the sending session.
+    """
+
+    def __init__(self, clock=time.time_ns):
+        self.clock = clock
+        self.books = {}             # order_book_id -> OrderBook
+        self.orders = {}            # (owner, token) -> live Order
+        self.by_id = {}             # order_id -> live Order
+        self.next_order_id = 10000
+        self.next_match_id = 1
+        self.trades = 0
+
+    def book(self, book_id: int) -> OrderBook:
+        book = self.books.get(book_id)
+        if book is None:
+            book = self.books[book_id] = OrderBook(book_id)
+        return book
+
+    def depth(self, book_id: int, n: int = 5) -> dict:
+        return self.book(book_id).depth(n)
+
+    # ── order entry ─────────────────────────────────────────────────────
+
+    def enter(self, msg: EnterOrder, owner) -> list:
+        token = msg.order_token
+        price = round(msg.price * 100)
+        if (owner, token) in self.orders:
+            return [self._reject(owner, token, REJECT_DUPLICATE_TOKEN)]
+        if msg.side not in ("B", "S", "T"):
+            return [self._reject(owner, token, REJECT_INVALID_SIDE)]
+        if msg.qty <= 0:
+            return [self._reject(owner, token, REJECT_INVALID_QTY)]
+        if price <= 0:
+            return [self._reject(owner, token, REJECT_INVALID_PRICE)]
+
+        order = Order(owner, token, self.next_order_id, msg.order_book_id, msg.side, price, msg.qty, msg)
+        self.next_order_id += 1
+        book = self.book(msg.order_book_id)
+        now = self.clock()
+
+        if order.time_in_force == TIF_FOK and book.crossable_qty(order, order.qty) < order.qty:
+            return [(owner, self._ack(order, now, STATE_NOT_ON_BOOK)),
+                    (owner, self._cancel_ack(order, now, CANCEL_UNFILLED))]
+
+        ack = self._ack(order, now, STATE_ON_BOOK)
+        events = [(owner, ack)]
+        self._match(book, order, events, now)
+        if order.qty:
+            if order.time_in_force in (TIF_IOC, TIF_FOK):
+                events.append((owner, self._cancel_ack(order, now, CANCEL_UNFILLED)))
+            else:
+                self._rest(book, order)
+        if not self._resting(order):
+            ack.order_state = STATE_NOT_ON_BOOK
+        return events
+
+    def replace(self, msg: ReplaceOrder, owner) -> list:
+        """
+        Replace qty (new total including what has already traded) and/or price
+        (0 keeps the current one). Priority is kept for a pure qty decrease and
+        lost for a price change or qty increase.
+        """
+        new_token = msg.replacement_order_token
+        order = self.orders.get((owner, msg.existing_order_token))
+        if order is None:
+            return [self._reject(owner, new_token, REJECT_UNKNOWN_ORDER)]
+        if new_token != order.token and (owner, new_token) in self.orders:
+            return [self._reject(owner, new_token, REJECT_DUPLICATE_TOKEN)]
+        new_open = msg.qty - order.filled
+        if new_open <= 0:
+            return [self._reject(owner, new_token, REJECT_INVALID_QTY)]
+        new_price = msg.price or order.price
+        if new_price <= 0:
+            return [self._reject(owner, new_token, REJECT_INVALID_PRICE)]
+
+        book = self.book(order.book_id)
+        keeps_priority = new_price == order.price and new_open <= order.qty
+        if not keeps_priority:
+            # the old entry dies in place, a copy joins the back of its (new) level
+            book.side_of(order).remove(order)
+            order, old = order.copy(), order
+            old.qty = 0
+            self.by_id[order.order_id] = order
+
+        previous = order.token
+        del self.orders[(owner, previous)]
+        order.token = new_token
+        self.orders[(owner, new_token)] = order
+        order.price = new_price
+        order.qty = new_open
+        order.open_close = msg.open_close
+        order.client_account = msg.client_account
+        order.customer_info = msg.customer_info
+        order.exchange_info = msg.exchange_info
+        order.display_qty = msg.display_qty or order.display_qty
+        order.client_category = msg.client_category
+
+        now = self.clock()
+        ack = OrderReplaceAck(
+            ts_ns=now, replacement_order_token=new_token, previous_order_token=previous,
+            order_book_id=order.book_id, side=order.side, order_id=order.order_id, qty=msg.qty,
+            price=new_price, time_in_force=order.time_in_force, open_close=order.open_close,
+            client_account=order.client_account, order_state=STATE_ON_BOOK,
+            customer_info=order.customer_info, exchange_info=order.exchange_info,
+            pretrade_qty=new_open, display_qty=order.display_qty,
+            client_category=order.client_category)
+        events = [(owner, ack)]
+        if not keeps_priority:
+            self._match(book, order, events, now)
+            if order.qty:
+                book.side_of(order).add(order)
+            else:
+                self._forget(order)
+                ack.order_state = STATE_NOT_ON_BOOK
+        return events
+
+    def cancel(self, token: str, owner) -> list:
+        order = self.orders.get((owner, token))
+        if order is None:
+            return [self._reject(owner, token, REJECT_UNKNOWN_ORDER)]
+        return [(owner, self._cancel(order, CANCEL_BY_USER))]
+
+    def cancel_by_id(self, msg: CancelOrderByID, owner) -> list:
+        order = self.by_id.get(msg.order_id)
+        if order is None or order.owner != owner or order.book_id != msg.order_book_id:
+            return [self._reject(owner, "", REJECT_UNKNOWN_ORDER)]
+        return [(owner, self._cancel(order, CANCEL_BY_USER))]
+
+    def execute_resting(self, order: Order, qty: int = 0) -> list:
+        """Fill a resting order against an outside counterparty at its own price."""
+        qty = min(qty or order.qty, order.qty)
+        book = self.book(order.book_id)
+        now = self.clock()
+        events = [(order.owner, self._fill(book, order, qty, order.price, self.next_match_id, now))]
+        self.next_match_id += 1
+        if order.qty == 0:
+            book.side_of(order).remove(order)
+            self._forget(order)
+        return events
+
+    # ── internals ───────────────────────────────────────────────────────
+
+    def _match(self, book: OrderBook, order: Order, events: list, now: int):
+        opp = book.opposite(order)
+        prices, levels = opp.prices, opp.levels
+        buy = order.is_buy
+        while order.qty and prices:
+            key = prices[0]
+            price = opp.sign * key
+            if (price > order.price) if buy else (price < order.price):
+                break
+            level = levels[key]
+            while order.qty and level:
+                resting = level[0]
+                if resting.qty == 0:
+                    level.popleft()
+                    continue
+                qty = min(order.qty, resting.qty)
+                match_id = self.next_match_id
+                self.next_match_id += 1
+                events.append((resting.owner, self._fill(book, resting, qty, price, match_id, now)))
+                events.append((order.owner, self._fill(book, order, qty, price, match_id, now)))
+                if resting.qty == 0:
+                    level.popleft()
+                    opp.live[key] -= 1
+                    self._forget(resting)
+            if opp.live[key] == 0:
+                opp._drop_level(key)
+
+    def _fill(self, book: OrderBook, order: Order, qty: int, price: int, match_id: int, now: int) -> OrderExecuted:
+        order.qty -= qty
+        order.filled += qty
+        book.last_price = price
+        self.trades += 1
+        return OrderExecuted(ts_ns=now, order_token=order.token, order_book_id=order.book_id,
+                             traded_qty=qty, trade_price=price, match_id=match_id,
+                             client_category=order.client_category, reserved_bits=b"\x00" * 16)
+
+    def _rest(self, book: OrderBook, order: Order):
+        book.side_of(order).add(order)
+        self.orders[(order.owner, order.token)] = order
+        self.by_id[order.order_id] = order
+
+    def _resting(self, order: Order) -> bool:
+        return self.orders.get((order.owner, order.token)) is order
+
+    def _forget(self, order: Order):
+        self.orders.pop((order.owner, order.token), None)
+        self.by_id.pop(order.order_id, None)
+
+    def _cancel(self, order: Order, reason: int) -> OrderCancelAck:
+        self.book(order.book_id).side_of(order).remove(order)
+        self._forget(order)
+        order.qty = 0
+        return self._cancel_ack(order, self.clock(), reason)
+
+    def _ack(self, order: Order, now: int, state: int) -> OrderAck:
+        return OrderAck(ts_ns=now, order_token=order.token, order_book_id=order.book_id,
+                        side=order.side, order_id=order.order_id, qty=order.qty, price=order.price,
+                        time_in_force=order.time_in_force, open_close=order.open_close,
+                        client_account=order.client_account, order_state=state,
+                        customer_info=order.customer_info, exchange_info=order.exchange_info,
+                        pretrade_qty=order.qty, display_qty=order.display_qty,
+                        client_category=order.client_category, off_hours=order.off_hours,
+                        reserved_bits=b"\x00" * 3)
+
+    def _cancel_ack(self, order: Order, now: int, reason: int) -> OrderCancelAck:
+        return OrderCancelAck(ts_ns=now, order_token=order.token, order_book_id=order.book_id,
+                              side=order.side, order_id=order.order_id, reason=reason)
+
+    def _reject(self, owner, token: str, code: int):
+        return owner, OrderReject(ts_ns=self.clock(), order_token=token, reject_code=code)
@@ -0,0 +1,122 @@
+"""Secondary indexes from order_token, order_id, book, account and match_id to message history positions."""
+
+from array import array
+
+from history import MAX_PAGE
+from ouch_msgs import *
+
+# index -> how a lookup value from the UI is coerced to the stored key
+FIELDS = {
+    "order_token": str,
+    "order_id": int,
+    "order_book_id": int,
+    "client_account": str,
+    "match_id": int,
+}
+
+# message class -> (index, attribute) pairs to index it under
+_INDEXED = {
+    EnterOrder: (("order_token", "order_token"), ("order_book_id", "order_book_id"),
+                 ("client_account", "client_account")),
+    ReplaceOrder: (("order_token", "existing_order_token"), ("order_token", "replacement_order_token"),
+                   ("client_account", "client_account")),
+    CancelOrder: (("order_token", "order_token"),),
+    CancelOrderByID: (("order_book_id", "order_book_id"), ("order_id", "order_id")),
+    MassQuote: (("order_token", "order_token"), ("order_book_id", "order_book_id"),
+                ("client_account", "client_account")),
+    OrderAck: (("order_token", "order_token"), ("order_book_id", "order_book_id"), ("order_id", "order_id"),
+               ("client_account", "client_account")),
+    OrderReject: (("order_token", "order_token"),),
+    OrderReplaceAck: (("order_token", "replacement_order_token"), ("order_token", "previous_order_token"),
+                      ("order_book_id", "order_book_id"), ("order_id", "order_id"),
+                      ("client_account", "client_account")),
+    OrderCancelAck: (("order_token", "order_token"), ("order_book_id", "order_book_id"), ("order_id", "order_id")),
+    OrderExecuted: (("order_token", "order_token"), ("order_book_id", "order_book_id"), ("match_id", "match_id")),
+    MassQuoteAck: (("order_token", "order_token"), ("order_book_id", "order_book_id")),
+    MassQuoteReject: (("order_token", "order_token"), ("order_book_id", "order_book_id")),
+}
+
+
+class MessageIndex:
+
+    def __init__(self, history: "MessageHistory"):
+        self.history = history
+        # value -> its one position, or from the second hit on an array('q') of positions, so a day of
+        # mostly single-use tokens costs one dict entry each and a lookup is a get plus a slice
+        self.indexes = {field: {} for field in FIELDS}
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self.indexes.values())
+
+    # ── observer hooks ──────────────────────────────────────────────────
+    # OuchClient records a message in the history right before notifying
+    # observers, so the message being observed is the newest position
+
+    def on_ouch_inbound(self, msg, size=None):
+        self._add(msg, self.history.next - 1)
+
+    def on_ouch_outbound(self, msg, size=None):
+        self._add(msg, self.history.next - 1)
+
+    def _add(self, msg, pos: int):
+        fields = _INDEXED.get(type(msg))
+        if fields is None or pos < 0:
+            return
+        indexes = self.indexes
+        for field, attr in fields:
+            key = getattr(msg, attr)
+            if key is None or key == "":
+                continue
+            index = indexes[field]
+            hit = index.get(key)
+            if hit is None:
+                index[key] = pos
+            elif type(hit) is int:
+                # a replace names the same token twice, count it once
+                if hit != pos:
+                    index[key] = array("q", (hit, pos))
+            elif hit[-1] != pos:
+                hit.append(pos)
+
+    def positions(self, field: str, value) -> array:
+        """History positions of every message carrying field == value, oldest first"""
+        try:
+            coerce = FIELDS[field]
+        except KeyError:
+            raise ValueError(f"Unknown index {field!r}, expected one of {tuple(FIELDS)}") from None
+        try:
+            key = coerce(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {field} {value!r}") from None
+        hit = self.indexes[field].get(key)
+        if hit is None:
+            return array("q")
+        return array("q", (hit,)) if type(hit) is int else hit
+
+    def lookup(self, field: str, value, offset: int = 0, limit: int = 100, newest_first: bool = True) -> dict:
+        """
+        One page of the messages carrying field == value, decoded from the
+        history. Positions the history no longer holds are listed under
+        `evicted` instead.
+        """
+        positions = self.positions(field, value)
+        total = len(positions)
+        offset, limit = max(int(offset), 0), max(min(int(limit), MAX_PAGE), 0)
+        if newest_first:
+            end = max(total - offset, 0)
+            page = positions[max(end - limit, 0):end][::-1]
+        else:
+            page = positions[offset:offset + limit]
+
+        messages, evicted = [], []
+        for pos in page:
+            row = self.history.describe(pos)
+            if row is None:
+                evicted.append(pos)
+            else:
+                messages.append(row)
+        return {"field": field, "value": value, "total": total, "offset": offset, "limit": limit,
+                "messages": messages, "evicted": evicted}
+
+    def stats(self) -> dict:
+        return {field: len(index) for field, index in self.indexes.items()}
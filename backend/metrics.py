@@ -0,0 +1,216 @@
+"""In-process metrics (counters, gauges and histograms) with a Prometheus endpoint."""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def dec(self, n=1):
+        self.value -= n
+
+    def set(self, value):
+        self.value = value
+
+
+class _CallbackValue:
+    """Gauge child whose value is read from a function at collection time."""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], float]):
+        self.fn = fn
+
+    @property
+    def value(self):
+        return self.fn()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the last finite bound for +Inf)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+
+class Metric:
+
+    def __init__(self, kind: str, name: str, help: str, labelnames: Sequence[str] = (), factory=_Value):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}    # label values tuple -> child
+        # unlabelled metrics are their own single child
+        self._default = None if self.labelnames else self.labels()
+
+    def labels(self, *values):
+        """The child for one label set. Per-frame callers keep it (e.g. keyed by packet type), an update is one attribute add"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._factory()
+        return child
+
+    # unlabelled shortcuts
+    def inc(self, n=1):
+        self._default.inc(n)
+
+    def dec(self, n=1):
+        self._default.dec(n)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def set_function(self, fn: Callable[[], float], *values):
+        """Make a gauge (child) report fn() whenever it is collected."""
+        key = tuple(str(v) for v in values)
+        self._children[key] = _CallbackValue(fn)
+        if not self.labelnames:
+            self._default = self._children[key]
+
+    def _label_str(self, values, extra: str = "") -> str:
+        pairs = [f'{k}="{v}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{self._label_str(values)} {child.value}")
+                continue
+            cumulative = 0
+            for bound, n in zip(list(child.bounds) + ["+Inf"], child.counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_str(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {child.sum}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {child.count}")
+        return lines
+
+    def snapshot(self) -> dict:
+        out = {}
+        for values, child in self._children.items():
+            key = ",".join(values)
+            if self.kind == "histogram":
+                out[key] = {"count": child.count, "sum": child.sum,
+                            "p50": child.quantile(0.5), "p99": child.quantile(0.99)}
+            else:
+                out[key] = child.value
+        return out
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._add(Metric("counter", name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._add(Metric("gauge", name, help, labelnames))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float],
+                  labelnames: Sequence[str] = ()) -> Metric:
+        bounds = tuple(sorted(buckets))
+        return self._add(Metric("histogram", name, help, labelnames, lambda: _HistogramValue(bounds)))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Plain dict of every metric, for the periodic "Metrics" event on the PUB socket"""
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+# metrics are declared once at import time against this registry
+REGISTRY = Registry()
+
+# Bucket bounds in seconds
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 1e-2)
+GAP_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+async def serve(registry: Registry = REGISTRY, host: str = "127.0.0.1", port: int = 9108):
+    """Serve GET /metrics in the Prometheus text format"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+            if path.split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found, try /metrics\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"📈 Metrics on http://{host}:{port}/metrics")
+    return server
+
+
+async def publish_periodically(publish: Callable[[str, dict], None], interval: float,
+                               registry: Registry = REGISTRY):
+    """Publish a "Metrics" event with a registry snapshot every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            publish("Metrics", {"ts": time.time(), "metrics": registry.snapshot()})
+        except Exception as e:
+            logger.error(f"Could not publish metrics: {e}")
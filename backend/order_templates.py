@@ -0,0 +1,90 @@
+"""Pre-encoded EnterOrder frames for repeated order shapes, only token, qty and price are patched in per order."""
+
+import struct
+from typing import Optional
+
+from ouch_msgs import EnterOrder
+from soupbin_msgs import SoupPacketFactory, UnsequencedData
+
+# frame offset 4: token, book, side, qty, price (cents) are contiguous, one pack_into covers them
+_VARIABLE = struct.Struct(">14sIcQi")
+_VARIABLE_OFFSET = 4
+_QTY_PRICE = struct.Struct(">Qi")
+_SCRATCH = bytearray(_QTY_PRICE.size)
+
+# EnterOrder fields a template fixes, with the defaults sdk.OuchSession.enter_order uses
+PREFILL_DEFAULTS = {
+    "time_in_force": 0,
+    "open_close": 0,
+    "client_account": "",
+    "customer_info": "",
+    "exchange_info": "",
+    "display_qty": 0,
+    "client_category": 1,
+    "off_hours": 0,
+}
+
+
+class OrderTemplate:
+
+    def __init__(self, prefill: EnterOrder, name: Optional[str] = None):
+        self.name = name
+        # the prefill's own token, qty and price are placeholders
+        self.prefill = prefill
+        self.detach(bytearray(SoupPacketFactory.serialize(
+            UnsequencedData(message=EnterOrder.TYPE_ID + prefill.to_soupbin()))))
+        self.size = len(self.payload)
+        self._book = prefill.order_book_id
+        self._side = prefill.side.encode()[:1]
+        # patched and handed out by message(), like the frame by render()
+        self._msg = EnterOrder(**prefill.__dict__)
+
+    @classmethod
+    def from_dict(cls, fields: dict, name: Optional[str] = None) -> "OrderTemplate":
+        """Template from a frontend prefill; order_book_id and side are required"""
+        try:
+            prefill = {"order_book_id": int(fields["order_book_id"]), "side": str(fields["side"])}
+        except KeyError as e:
+            raise ValueError(f"Order template requires {e.args[0]!r}") from None
+        for key, default in PREFILL_DEFAULTS.items():
+            prefill[key] = type(default)(fields.get(key, default))
+        if prefill["side"] not in ("B", "S", "T"):
+            raise ValueError(f"Invalid side {prefill['side']!r}")
+        return cls(EnterOrder(order_token="", qty=0, price=0, **prefill), name)
+
+    def check(self, qty: int, price: float):
+        """Raise ValueError if render() could not encode this qty and price"""
+        try:
+            _QTY_PRICE.pack_into(_SCRATCH, 0, qty, int(price * 100))
+        except (struct.error, TypeError, OverflowError) as e:
+            raise ValueError(f"Invalid qty {qty!r} or price {price!r}: {e}") from None
+
+    def render(self, order_token: str, qty: int, price: float) -> bytearray:
+        """Patch one order into the template's frame and return it (the same buffer every call, copy it to keep)"""
+        token = order_token.encode()
+        if len(token) > 14:
+            raise ValueError(f"Order token {order_token!r} is longer than 14 bytes")
+        try:
+            _VARIABLE.pack_into(self.frame, _VARIABLE_OFFSET, token, self._book, self._side, qty, int(price * 100))
+        except (struct.error, TypeError, OverflowError) as e:
+            raise ValueError(f"Invalid qty {qty!r} or price {price!r}: {e}") from None
+        return self.frame
+
+    def detach(self, frame: Optional[bytearray] = None):
+        """Render into a new buffer from now on, for when something kept a reference to the current one"""
+        self.frame = frame if frame is not None else bytearray(self.frame)
+        # the OUCH payload inside the frame, for the message history
+        self.payload = memoryview(self.frame)[3:]
+
+    def message(self, order_token: str, qty: int, price: float) -> EnterOrder:
+        """The EnterOrder render() encodes, for risk checks and observers (the same object every call)"""
+        msg = self._msg
+        msg.order_token = order_token
+        msg.qty = qty
+        msg.price = price
+        return msg
+
+    def to_dict(self) -> dict:
+        fields = {k: v for k, v in self.prefill.__dict__.items()
+                  if k not in ("order_token", "qty", "price", "reserved_bits")}
+        return {"name": self.name, "size": len(self.frame), **fields}
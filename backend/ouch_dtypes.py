@@ -0,0 +1,156 @@
+"""NumPy structured dtypes for the inbound OUCH layouts and bulk decoders built on them."""
+
+import numpy as np
+
+from ouch_msgs import OUCH_INBOUND_MSG_TYPE
+from soupbin_msgs import PacketType, SoupPacketFactory
+
+# Each dtype mirrors a from_soupbin layout byte for byte (big-endian integers, fixed-length byte
+# strings), so same-type payloads become a structured array in one np.frombuffer call. Byte-string
+# fields come back as bytes with trailing NULs dropped, like the .strip('\x00') in from_soupbin.
+ORDER_ACK = np.dtype([
+    ("ts_ns", ">u8"),
+    ("order_token", "S14"),
+    ("order_book_id", ">u4"),
+    ("side", "S1"),
+    ("order_id", ">u8"),
+    ("qty", ">u8"),
+    ("price", ">i4"),
+    ("time_in_force", "u1"),
+    ("open_close", "u1"),
+    ("client_account", "S16"),
+    ("order_state", "u1"),
+    ("customer_info", "S15"),
+    ("exchange_info", "S32"),
+    ("pretrade_qty", ">u8"),
+    ("display_qty", ">u8"),
+    ("client_category", "u1"),
+    ("off_hours", "u1"),
+    ("reserved_bits", "V3"),
+])
+
+ORDER_REJECT = np.dtype([
+    ("ts_ns", ">u8"),
+    ("order_token", "S14"),
+    ("reject_code", ">i4"),
+])
+
+ORDER_REPLACE_ACK = np.dtype([
+    ("ts_ns", ">u8"),
+    ("replacement_order_token", "S14"),
+    ("previous_order_token", "S14"),
+    ("order_book_id", ">u4"),
+    ("side", "S1"),
+    ("order_id", ">u8"),
+    ("qty", ">u8"),
+    ("price", ">i4"),
+    ("time_in_force", "u1"),
+    ("open_close", "u1"),
+    ("client_account", "S16"),
+    ("order_state", "u1"),
+    ("customer_info", "S15"),
+    ("exchange_info", "S32"),
+    ("pretrade_qty", ">u8"),
+    ("display_qty", ">u8"),
+    ("client_category", "u1"),
+    ("reserved_bits", "V3"),
+])
+
+ORDER_CANCEL_ACK = np.dtype([
+    ("ts_ns", ">u8"),
+    ("order_token", "S14"),
+    ("order_book_id", ">u4"),
+    ("side", "S1"),
+    ("order_id", ">u8"),
+    ("reason", "u1"),
+])
+
+ORDER_EXECUTED = np.dtype([
+    ("ts_ns", ">u8"),
+    ("order_token", "S14"),
+    ("order_book_id", ">u4"),
+    ("traded_qty", ">u8"),
+    ("trade_price", ">i4"),
+    ("match_id", ">u8"),
+    ("client_category", "u1"),
+    ("reserved_bits", "V16"),
+])
+
+MASS_QUOTE_ACK = np.dtype([
+    ("ts_ns", ">u8"),
+    ("order_token", "S14"),
+    ("order_book_id", ">u4"),
+    ("side", "S1"),
+    ("quote_status", ">u4"),
+    ("quantity", ">u8"),
+    ("traded_quantity", ">u8"),
+    ("price", ">i4"),
+])
+
+MASS_QUOTE_REJECT = np.dtype([
+    ("ts_ns", ">u8"),
+    ("order_token", "S14"),
+    ("order_book_id", ">u4"),
+    ("reject_code", ">i4"),
+])
+
+# inbound OUCH type byte -> payload dtype (type byte excluded)
+INBOUND_DTYPES = {
+    OUCH_INBOUND_MSG_TYPE.ORDER_ACK.value: ORDER_ACK,
+    OUCH_INBOUND_MSG_TYPE.ORDER_REJECT.value: ORDER_REJECT,
+    OUCH_INBOUND_MSG_TYPE.ORDER_REPLACE_ACK.value: ORDER_REPLACE_ACK,
+    OUCH_INBOUND_MSG_TYPE.ORDER_CANCEL_ACK.value: ORDER_CANCEL_ACK,
+    OUCH_INBOUND_MSG_TYPE.ORDER_EXECUTED.value: ORDER_EXECUTED,
+    OUCH_INBOUND_MSG_TYPE.MASS_QUOTE_ACK.value: MASS_QUOTE_ACK,
+    OUCH_INBOUND_MSG_TYPE.MASS_QUOTE_REJECT.value: MASS_QUOTE_REJECT,
+}
+
+
+def decode_payloads(buf, type_id: bytes, with_type_byte: bool = False) -> np.ndarray:
+    """
+    Decode a contiguous run of same-type payloads into a structured array
+    without copying. With with_type_byte each record starts with the OUCH
+    type byte, as in SequencedData.message.
+
+        arr = decode_payloads(buf, b"E")        # contiguous OrderExecuted payloads
+        vwap = (arr["traded_qty"] * arr["trade_price"]).sum() / arr["traded_qty"].sum()
+    """
+    dtype = INBOUND_DTYPES[type_id]
+    if with_type_byte:
+        dtype = np.dtype([("type", "S1")] + [(name, dtype.fields[name][0]) for name in dtype.names])
+    if len(buf) % dtype.itemsize:
+        raise ValueError(f"Buffer of {len(buf)} bytes is not a whole number of {dtype.itemsize} byte records")
+    return np.frombuffer(buf, dtype=dtype)
+
+
+def decode_frames(buf) -> dict:
+    """
+    Decode the OUCH messages in a stream of SoupBinTCP frames (a session log
+    or capture) into {type byte: structured array}, in stream order per type.
+    Other packet types and trailing partial frames are skipped.
+
+    Frames are located in one pass, then each type's records are gathered
+    out of the stream with a single fancy-indexing copy.
+    """
+    frames, _ = SoupPacketFactory.split_frames(buf)
+    data = np.frombuffer(buf, dtype=np.uint8)
+    sequenced = PacketType.SEQUENCED_DATA.value[0]
+
+    sizes = {t[0]: dtype.itemsize for t, dtype in INBOUND_DTYPES.items()}
+    starts = {}
+    for packet_type, start, end in frames:
+        # records shorter than the layout (or of unknown types) can't be viewed, skip them
+        if packet_type == sequenced and end > start and end - start - 1 >= sizes.get(buf[start], end):
+            starts.setdefault(buf[start], []).append(start + 1)
+
+    out = {}
+    for type_byte, offsets in starts.items():
+        dtype = INBOUND_DTYPES[bytes([type_byte])]
+        rows = np.asarray(offsets, dtype=np.int64)[:, None] + np.arange(dtype.itemsize)
+        out[bytes([type_byte])] = data[rows].view(dtype).ravel()
+    return out
+
+
+def to_native(arr: np.ndarray) -> np.ndarray:
+    """Copy with native byte order, which NumPy arithmetic on large arrays runs faster on"""
+    return arr.astype(arr.dtype.newbyteorder("="))
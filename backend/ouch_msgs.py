@@ -4,6 +4,11 @@ from typing import ClassVar, Optional
 from soupbin_msgs import *
 import struct
 
+# outbound layouts, unpack_from decodes them from bytes or straight from a memoryview of the read buffer
+_ENTER_ORDER = struct.Struct(">14sIcQiBB16s15s32sQBB7s")
+_REPLACE_ORDER = struct.Struct(">14s14s8s4s1s16s15s32s8s1s8s")
+_CANCEL_ORDER_BY_ID = struct.Struct(">4s1s8s")
+
 
 class OUCH_OUTBOUND_MSG_TYPE(Enum):
     ENTER_ORDER = b'O'
@@ -62,20 +67,15 @@ class EnterOrder:
     @classmethod
     def from_soupbin(cls, data: bytes) -> "EnterOrder":
         """Create from SoupBin format using struct.unpack."""
-        order_token = data[0:14].decode().strip('\x00')
-        order_book_id = struct.unpack(">I", data[14:18])[0]
-        side = data[18:19].decode()
-        qty = struct.unpack(">Q", data[19:27])[0]
-        price = struct.unpack(">i", data[27:31])[0] / 100.0
-        time_in_force = struct.unpack(">B", data[31:32])[0]
-        open_close = struct.unpack(">B", data[32:33])[0]
-        client_account = data[33:49].decode().strip('\x00')
-        customer_info = data[49:64].decode().strip('\x00')
-        exchange_info = data[64:96].decode().strip('\x00')
-        display_qty = struct.unpack(">Q", data[96:104])[0]
-        client_category = struct.unpack(">B", data[104:105])[0]
-        off_hours = struct.unpack(">B", data[105:106])[0]
-        reserved_bits = data[106:113]
+        (order_token, order_book_id, side, qty, price, time_in_force, open_close, client_account,
+         customer_info, exchange_info, display_qty, client_category, off_hours,
+         reserved_bits) = _ENTER_ORDER.unpack_from(data)
+        order_token = order_token.decode().strip('\x00')
+        side = side.decode()
+        price = price / 100.0
+        client_account = client_account.decode().strip('\x00')
+        customer_info = customer_info.decode().strip('\x00')
+        exchange_info = exchange_info.decode().strip('\x00')
 
         return cls(order_token=order_token, order_book_id=order_book_id, side=side,
                    qty=qty, price=price, time_in_force=time_in_force,
@@ -118,17 +118,19 @@ class ReplaceOrder:
     @classmethod
     def from_soupbin(cls, data: bytes) -> "ReplaceOrder":
         """Create from SoupBin format."""
-        existing_order_token = data[0:14].decode().strip('\x00')
-        replacement_order_token = data[14:28].decode().strip('\x00')
-        qty = int(data[28:36].decode().strip('\x00'))
-        price = int(data[36:40].decode().strip('\x00'))
-        open_close = int(data[40:41].decode().strip('\x00'))
-        client_account = data[41:57].decode().strip('\x00')
-        customer_info = data[57:72].decode().strip('\x00')
-        exchange_info = data[72:104].decode().strip('\x00')
-        display_qty = int(data[104:112].decode().strip('\x00'))
-        client_category = int(data[112:113].decode().strip('\x00'))
-        reserved_bits = data[113:121]
+        (existing_order_token, replacement_order_token, qty, price, open_close, client_account,
+         customer_info, exchange_info, display_qty, client_category,
+         reserved_bits) = _REPLACE_ORDER.unpack_from(data)
+        existing_order_token = existing_order_token.decode().strip('\x00')
+        replacement_order_token = replacement_order_token.decode().strip('\x00')
+        qty = int(qty.decode().strip('\x00'))
+        price = int(price.decode().strip('\x00'))
+        open_close = int(open_close.decode().strip('\x00'))
+        client_account = client_account.decode().strip('\x00')
+        customer_info = customer_info.decode().strip('\x00')
+        exchange_info = exchange_info.decode().strip('\x00')
+        display_qty = int(display_qty.decode().strip('\x00'))
+        client_category = int(client_category.decode().strip('\x00'))
 
         return cls(existing_order_token=existing_order_token, 
                    replacement_order_token=replacement_order_token, 
@@ -150,7 +152,7 @@ class CancelOrder:
     @classmethod
     def from_soupbin(cls, data: bytes) -> "CancelOrder":
         """Create from SoupBin format."""
-        order_token = data.decode().strip('\x00')
+        order_token = str(data, "utf-8").strip('\x00')
         return cls(order_token=order_token)
 
 @dataclass
@@ -171,9 +173,10 @@ class CancelOrderByID:
     @classmethod
     def from_soupbin(cls, data: bytes) -> "CancelOrderByID":
         """Create from SoupBin format."""
-        order_book_id = int(data[0:4].decode().strip('\x00'))
-        side = data[4:5].decode().strip('\x00')
-        order_id = int(data[5:13].decode().strip('\x00'))
+        order_book_id, side, order_id = _CANCEL_ORDER_BY_ID.unpack_from(data)
+        order_book_id = int(order_book_id.decode().strip('\x00'))
+        side = side.decode().strip('\x00')
+        order_id = int(order_id.decode().strip('\x00'))
 
         return cls(order_book_id=order_book_id, side=side, order_id=order_id)
 
@@ -564,6 +567,28 @@ class OUCH_MessageFactory:
         OUCH_INBOUND_MSG_TYPE.MASS_QUOTE_REJECT.value: MassQuoteReject,
     }
 
+    # 'U' is both ReplaceOrder (outbound) and OrderReplaceAck (inbound), so a
+    # receiver has to decode with the table for its own direction
+    INBOUND_TYPES: ClassVar[dict] = {
+        OUCH_INBOUND_MSG_TYPE.ORDER_ACK.value: OrderAck,
+        OUCH_INBOUND_MSG_TYPE.ORDER_REJECT.value: OrderReject,
+        OUCH_INBOUND_MSG_TYPE.ORDER_REPLACE_ACK.value: OrderReplaceAck,
+        OUCH_INBOUND_MSG_TYPE.ORDER_CANCEL_ACK.value: OrderCancelAck,
+        OUCH_INBOUND_MSG_TYPE.ORDER_EXECUTED.value: OrderExecuted,
+        OUCH_INBOUND_MSG_TYPE.MASS_QUOTE_ACK.value: MassQuoteAck,
+        OUCH_INBOUND_MSG_TYPE.MASS_QUOTE_REJECT.value: MassQuoteReject,
+    }
+
+    @classmethod
+    def create_inbound_message(cls, data: bytes):
+        """Decode an exchange → client message."""
+        if not data:
+            return None
+        msg_cls = cls.INBOUND_TYPES.get(data[0:1])
+        if msg_cls is None:
+            raise ValueError(f"Unknown inbound OUCH message type: {data[0:1]}")
+        return msg_cls.from_soupbin(data[1:])
+
     @staticmethod
     def create_message(data: bytes):
         if not data:
@@ -0,0 +1,152 @@
+"""Incremental positions and P&L per account and book."""
+
+import logging
+from array import array
+from typing import Callable, Optional
+
+from ouch_msgs import *
+
+logger = logging.getLogger(__name__)
+
+
+class PositionAggregator:
+    """
+    Net position, traded volume, VWAP, realized P&L and fill count per
+    (client_account, order_book_id), updated in O(1) on every OrderExecuted.
+
+    Each key owns a slot in a set of parallel typed arrays instead of a
+    per-key object, so a full day of books stays compact. Prices are kept in
+    the integer units they arrive in on the wire.
+    """
+
+    def __init__(self, publish: Optional[Callable[[str, dict], None]] = None):
+        self.publish = publish
+        self._slots = {}        # (client_account, order_book_id) -> slot
+        self._keys = []         # slot -> (client_account, order_book_id)
+        self._tokens = {}       # order_token -> [client_account, order_book_id, sign, open qty], until done
+        self._unknown = set()   # tokens already warned about, so a replay doesn't flood the log
+
+        self.net_qty = array("q")
+        self.bought_qty = array("q")
+        self.sold_qty = array("q")
+        self.notional = array("d")       # sum(qty * price) over all fills, for VWAP
+        self.avg_cost = array("d")       # average open price of net_qty
+        self.realized_pnl = array("d")
+        self.fills = array("q")
+
+    def _slot(self, account: str, book: int) -> int:
+        key = (account, book)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            self._slots[key] = slot
+            self._keys.append(key)
+            for col in (self.net_qty, self.bought_qty, self.sold_qty, self.fills):
+                col.append(0)
+            for col in (self.notional, self.avg_cost, self.realized_pnl):
+                col.append(0.0)
+        return slot
+
+    # ── observer hooks ──────────────────────────────────────────────────
+
+    def on_ouch_outbound(self, msg, size=None):
+        if isinstance(msg, EnterOrder):
+            sign = 1 if msg.side == "B" else -1
+            self._tokens[msg.order_token] = [msg.client_account, msg.order_book_id, sign, msg.qty]
+        elif isinstance(msg, ReplaceOrder):
+            prev = self._tokens.get(msg.existing_order_token)
+            if prev is not None:
+                # the old token stays until the replace is acked, fills can still arrive on it
+                self._tokens[msg.replacement_order_token] = [*prev[:3], msg.qty]
+
+    def on_ouch_inbound(self, msg, size=None):
+        if isinstance(msg, OrderExecuted):
+            self.on_execution(msg)
+        elif isinstance(msg, OrderAck):
+            sign = 1 if msg.side == "B" else -1
+            self._tokens[msg.order_token] = [msg.client_account, msg.order_book_id, sign, msg.qty]
+        elif isinstance(msg, OrderReplaceAck):
+            sign = 1 if msg.side == "B" else -1
+            self._tokens[msg.replacement_order_token] = [msg.client_account, msg.order_book_id, sign, msg.qty]
+            self._tokens.pop(msg.previous_order_token, None)
+        elif isinstance(msg, (OrderReject, OrderCancelAck)):
+            self._tokens.pop(msg.order_token, None)
+
+    # ── aggregation ─────────────────────────────────────────────────────
+
+    def on_execution(self, msg: OrderExecuted):
+        meta = self._tokens.get(msg.order_token)
+        if meta is None:
+            if msg.order_token not in self._unknown:
+                if len(self._unknown) >= 100_000:
+                    self._unknown.clear()
+                self._unknown.add(msg.order_token)
+                logger.warning(f"Execution for unknown token {msg.order_token}, position not updated")
+            return
+        account, book, sign, open_qty = meta
+        meta[3] = open_qty - msg.traded_qty
+        if meta[3] <= 0:
+            # fully filled, nothing more can arrive for it
+            del self._tokens[msg.order_token]
+        slot = self._slot(account, msg.order_book_id or book)
+
+        qty = msg.traded_qty
+        price = msg.trade_price
+        pos = self.net_qty[slot]
+        avg = self.avg_cost[slot]
+
+        if pos == 0 or (pos > 0) == (sign > 0):
+            # opening or adding to the position
+            new_pos = pos + sign * qty
+            avg = (avg * abs(pos) + price * qty) / abs(new_pos)
+        else:
+            # reducing, closing or flipping the position
+            closing = min(qty, abs(pos))
+            self.realized_pnl[slot] += closing * (price - avg) * (1 if pos > 0 else -1)
+            new_pos = pos + sign * qty
+            if new_pos == 0:
+                avg = 0.0
+            elif (new_pos > 0) != (pos > 0):
+                avg = float(price)
+
+        self.net_qty[slot] = new_pos
+        self.avg_cost[slot] = avg
+        self.notional[slot] += qty * price
+        self.fills[slot] += 1
+        if sign > 0:
+            self.bought_qty[slot] += qty
+        else:
+            self.sold_qty[slot] += qty
+
+        if self.publish:
+            self.publish("Position", self.row(slot))
+
+    # ── snapshots ───────────────────────────────────────────────────────
+
+    def row(self, slot: int) -> dict:
+        account, book = self._keys[slot]
+        volume = self.bought_qty[slot] + self.sold_qty[slot]
+        return {
+            "client_account": account,
+            "order_book_id": book,
+            "net_qty": self.net_qty[slot],
+            "bought_qty": self.bought_qty[slot],
+            "sold_qty": self.sold_qty[slot],
+            "traded_volume": volume,
+            "vwap": self.notional[slot] / volume if volume else 0.0,
+            "avg_cost": self.avg_cost[slot],
+            "realized_pnl": self.realized_pnl[slot],
+            "fills": self.fills[slot],
+        }
+
+    def get(self, client_account: str, order_book_id: int) -> Optional[dict]:
+        slot = self._slots.get((client_account, order_book_id))
+        return None if slot is None else self.row(slot)
+
+    def snapshot(self) -> list:
+        """All positions, one row per (client_account, order_book_id)."""
+        return [self.row(slot) for slot in range(len(self._keys))]
+
+    def publish_snapshot(self):
+        if self.publish:
+            self.publish("Positions", {"positions": self.snapshot()})
@@ -0,0 +1,162 @@
+"""On-demand profiling of the running backend (stack sampling or cProfile), started by the "profile" CONN command."""
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# sampling writes collapsed stacks for flamegraph.pl/speedscope, cprofile a .prof file plus a text report
+MODES = ("sampling", "cprofile")
+MAX_SECONDS = 600
+
+
+class _Sampler(threading.Thread):
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        frames_of = sys._current_frames
+        names = {}  # code object -> "func (file:line)", stacks repeat so this saves most of the work
+        while not self._stop_event.wait(self.interval):
+            frame = frames_of().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                name = names.get(code)
+                if name is None:
+                    name = names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                stack.append(name)
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[";".join(stack)] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+
+    def __init__(self, out_dir: str = "profiles", publish: Optional[Callable[[str, dict], None]] = None):
+        self.out_dir = out_dir
+        self.publish = publish
+        self.mode = None
+        self._sampler: Optional[_Sampler] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._trace_start = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._started = 0.0
+        self._stamp = ""
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str = "sampling", seconds: float = 10.0, trace_malloc: bool = False,
+              interval: float = 0.001, nframes: int = 10) -> dict:
+        """Profile for `seconds` (stop() ends it early); returns the status that is also published"""
+        if self.running:
+            raise RuntimeError(f"A {self.mode} profile is already running")
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode {mode!r}, expected one of {MODES}")
+        seconds = min(float(seconds), MAX_SECONDS)
+
+        self.mode = mode
+        self._stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._started = time.perf_counter()
+        if trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+            self._trace_start = tracemalloc.take_snapshot()
+        if mode == "sampling":
+            self._sampler = _Sampler(threading.get_ident(), interval)
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        self._timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+        logger.warning(f"🔬 {mode} profile started for {seconds}s" + (" with tracemalloc" if trace_malloc else ""))
+        status = {"state": "running", "mode": mode, "seconds": seconds, "tracemalloc": self._trace_start is not None}
+        self._publish(status)
+        return status
+
+    def stop(self) -> Optional[dict]:
+        """Stop the current run and write its reports, None if nothing was running"""
+        if not self.running:
+            return None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        elapsed = time.perf_counter() - self._started
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self._stamp}-{self.mode}")
+        files = []
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            with open(base + ".folded", "w") as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            files.append(base + ".folded")
+            self._sampler = None
+
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(base + ".prof")
+            report = io.StringIO()
+            pstats.Stats(self._profile, stream=report).sort_stats("cumulative").print_stats(60)
+            with open(base + ".txt", "w") as f:
+                f.write(report.getvalue())
+            files += [base + ".prof", base + ".txt"]
+            self._profile = None
+
+        if self._trace_start is not None:
+            files.append(self._write_allocations(base + "-alloc.txt"))
+
+        logger.warning(f"🔬 {self.mode} profile finished after {elapsed:.1f}s: {', '.join(files)}")
+        status = {"state": "finished", "mode": self.mode, "seconds": elapsed, "files": files}
+        self.mode = None
+        self._publish(status)
+        return status
+
+    def _write_allocations(self, path: str, top: int = 30) -> str:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        snapshot = snapshot.filter_traces(filters)
+        start, self._trace_start = self._trace_start.filter_traces(filters), None
+
+        with open(path, "w") as f:
+            f.write(f"Top {top} allocation sites at the end of the run\n\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write(f"{stat}\n")
+            f.write(f"\nTop {top} allocation sites by growth during the run\n\n")
+            for stat in snapshot.compare_to(start, "lineno")[:top]:
+                f.write(f"{stat}\n")
+            f.write("\nTop 10 allocation tracebacks\n")
+            for stat in snapshot.statistics("traceback")[:10]:
+                f.write(f"\n{stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+                f.write("\n".join(stat.traceback.format()) + "\n")
+        return path
+
+    def _publish(self, status: dict):
+        if self.publish:
+            self.publish("Profile", status)
@@ -0,0 +1,334 @@
+"""Pre-trade limits per account and per book, checked by OuchClient.pretrade before an order is queued."""
+
+import json
+import logging
+import time
+from typing import Iterable, Optional
+
+from metrics import REGISTRY
+from ouch_msgs import *
+from tokens import TokenAllocator
+
+try:
+    import yaml
+except ImportError:  # YAML limit files need PyYAML, JSON ones don't
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+# reason codes
+MAX_QTY = "MAX_QTY"
+MAX_NOTIONAL = "MAX_NOTIONAL"
+MAX_OPEN_ORDERS = "MAX_OPEN_ORDERS"
+PRICE_COLLAR = "PRICE_COLLAR"
+MSG_RATE = "MSG_RATE"
+DUPLICATE_TOKEN = "DUPLICATE_TOKEN"
+
+LIMIT_KEYS = ("max_qty", "max_notional", "max_open_orders", "collar_pct", "max_msgs_per_sec")
+
+# EnterOrder prices are in price units, ReplaceOrder and OrderExecuted carry them on the wire scaled by 100
+WIRE_PRICE_SCALE = 100
+
+RISK_CHECKS = REGISTRY.counter("risk_checks_total", "Outbound OUCH messages run through the pre-trade checks")
+RISK_REJECTS = REGISTRY.counter("risk_rejects_total", "Outbound OUCH messages rejected locally by the pre-trade checks",
+                                ("code",))
+
+
+class RiskRejected(Exception):
+
+    def __init__(self, code: str, reason: str, order_token: str = ""):
+        super().__init__(reason)
+        self.code = code
+        self.order_token = order_token
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "reason": str(self), "order_token": self.order_token}
+
+
+class _Scope:
+    """Limits and counters of one account or one order book."""
+
+    __slots__ = ("name", "max_qty", "max_notional", "max_open_orders", "collar", "rate",
+                 "open_orders", "tokens", "stamp")
+
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.max_qty = spec.get("max_qty")
+        self.max_notional = spec.get("max_notional")
+        self.max_open_orders = spec.get("max_open_orders")
+        collar = spec.get("collar_pct")
+        self.collar = None if collar is None else float(collar) / 100
+        self.rate = spec.get("max_msgs_per_sec")
+        self.open_orders = 0
+        self.tokens = float(self.rate or 0)
+        self.stamp = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        """Spend one message from the token bucket, False when the rate is exceeded"""
+        rate = self.rate
+        if rate is None:
+            return True
+        tokens = self.tokens + (now - self.stamp) * rate
+        if tokens > rate:
+            tokens = rate
+        self.stamp = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+    def refund(self):
+        if self.rate is not None:
+            self.tokens = min(self.tokens + 1, self.rate)
+
+    def snapshot(self) -> dict:
+        return {"open_orders": self.open_orders, "max_qty": self.max_qty, "max_notional": self.max_notional,
+                "max_open_orders": self.max_open_orders,
+                "collar_pct": None if self.collar is None else self.collar * 100,
+                "max_msgs_per_sec": self.rate}
+
+
+class _Order:
+    __slots__ = ("account", "book", "book_id", "qty", "price", "filled", "live")
+
+    def __init__(self, account: _Scope, book: Optional[_Scope], book_id: Optional[int], qty: int, price: float,
+                 live: bool):
+        self.account = account
+        self.book = book
+        self.book_id = book_id
+        self.qty = qty
+        self.price = price
+        self.filled = 0
+        self.live = live        # counted in open_orders; a replacement becomes live on its OrderReplaceAck
+
+
+def _tighter(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _check_limits(spec: dict, where: str):
+    unknown = set(spec) - set(LIMIT_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown keys in {where}: {sorted(unknown)}")
+
+
+class RiskEngine:
+
+    def __init__(self, spec: Optional[dict] = None, tokens: Optional[TokenAllocator] = None):
+        spec = spec or {}
+        self.default = spec.get("default") or {}
+        _check_limits(self.default, "default")
+        self.account_specs = {str(k): dict(self.default, **(v or {})) for k, v in (spec.get("accounts") or {}).items()}
+        self.book_specs = {int(k): dict(v or {}) for k, v in (spec.get("books") or {}).items()}
+        for name, limits in self.account_specs.items():
+            _check_limits(limits, f"accounts.{name}")
+        for book_id, limits in self.book_specs.items():
+            _check_limits(limits, f"books.{book_id}")
+
+        self.accounts = {}      # client_account -> _Scope
+        self.books = {}         # order_book_id -> _Scope
+        self._order_limits = {}  # (client_account, order_book_id) -> (max_qty, max_notional, collar)
+        self.orders = {}        # order_token -> _Order, until it is rejected, cancelled or fully filled
+        self.tokens = tokens or TokenAllocator()     # which order tokens were sent
+        self.last_price = {}    # order_book_id -> last fill price
+        self.rejects = 0
+
+    @classmethod
+    def load(cls, path: str, tokens: Optional[TokenAllocator] = None) -> "RiskEngine":
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise RuntimeError("PyYAML is required for YAML risk limits (pip install pyyaml)")
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+        return cls(spec or {}, tokens)
+
+    def _account(self, name: str) -> _Scope:
+        scope = self.accounts.get(name)
+        if scope is None:
+            scope = self.accounts[name] = _Scope(name, self.account_specs.get(name, self.default))
+        return scope
+
+    def _book(self, book_id: int) -> _Scope:
+        scope = self.books.get(book_id)
+        if scope is None:
+            scope = self.books[book_id] = _Scope(str(book_id), self.book_specs.get(book_id, {}))
+        return scope
+
+    def _limits(self, account: _Scope, book: Optional[_Scope]) -> tuple:
+        # per-order limits are the tighter of the account's and the book's, resolved once per pair
+        key = (account.name, book.name if book is not None else None)
+        limits = self._order_limits.get(key)
+        if limits is None:
+            if book is None:
+                limits = (account.max_qty, account.max_notional, account.collar)
+            else:
+                limits = (_tighter(account.max_qty, book.max_qty), _tighter(account.max_notional, book.max_notional),
+                          _tighter(account.collar, book.collar))
+            self._order_limits[key] = limits
+        return limits
+
+    # ── checks ──────────────────────────────────────────────────────────
+
+    def check(self, msgs: Iterable) -> None:
+        """
+        Check and account for messages about to be sent, raising RiskRejected
+        on the first breach. All or nothing: when one message of a basket
+        breaches, what the earlier ones took is given back.
+        """
+        now = time.monotonic()
+        done = []
+        try:
+            for msg in msgs:
+                RISK_CHECKS.inc()
+                done.append((msg, self._check(msg, now)))
+        except RiskRejected as e:
+            for msg, charged in reversed(done):
+                self._undo(msg, charged)
+            self.rejects += 1
+            RISK_REJECTS.labels(e.code).inc()
+            raise
+
+    def _check(self, msg, now: float) -> tuple:
+        """Check one message and commit it, returning the scopes whose rate it was charged to"""
+        if isinstance(msg, EnterOrder):
+            account, book = self._account(msg.client_account), self._book(msg.order_book_id)
+            return self._check_order(msg.order_token, account, book, msg.order_book_id, msg.qty, msg.price, now,
+                                     live=True)
+        if isinstance(msg, ReplaceOrder):
+            prev = self.orders.get(msg.existing_order_token)
+            if prev is not None:
+                account, book, book_id = prev.account, prev.book, prev.book_id
+            else:
+                account, book, book_id = self._account(msg.client_account), None, None
+            price = msg.price / WIRE_PRICE_SCALE if msg.price else (prev.price if prev is not None else 0)
+            return self._check_order(msg.replacement_order_token, account, book, book_id, msg.qty, price, now,
+                                     live=False)
+        if isinstance(msg, MassQuote):
+            self._check_token(msg.order_token)
+            account = self._account(msg.client_account)
+            charged = self._take(now, msg.order_token, account)
+            self.tokens.add(msg.order_token)
+            return charged
+        # cancels: counted, never rejected
+        order = self.orders.get(getattr(msg, "order_token", None))
+        if order is None:
+            return ()
+        charged = []
+        for scope in (order.account, order.book):
+            if scope is not None and scope.take(now):
+                charged.append(scope)
+        return tuple(charged)
+
+    def _check_token(self, token: str):
+        if self.tokens.seen(token):
+            raise RiskRejected(DUPLICATE_TOKEN, f"Order token {token} was already used", token)
+
+    def _check_order(self, token: str, account: _Scope, book: Optional[_Scope], book_id: Optional[int], qty: int,
+                     price: float, now: float, live: bool) -> tuple:
+        self._check_token(token)
+        max_qty, max_notional, collar = self._limits(account, book)
+        if max_qty is not None and qty > max_qty:
+            raise RiskRejected(MAX_QTY, f"Quantity {qty} exceeds {max_qty}", token)
+        if max_notional is not None and qty * price > max_notional:
+            raise RiskRejected(MAX_NOTIONAL, f"Notional {qty * price:g} exceeds {max_notional}", token)
+        if collar is not None:
+            last = self.last_price.get(book_id)
+            if last and abs(price - last) > collar * last:
+                raise RiskRejected(PRICE_COLLAR, f"Price {price:g} is more than {collar * 100:g}% "
+                                                 f"away from the last fill at {last:g}", token)
+        if live:
+            for scope in (account, book):
+                if scope.max_open_orders is not None and scope.open_orders >= scope.max_open_orders:
+                    raise RiskRejected(MAX_OPEN_ORDERS, f"{scope.max_open_orders} orders already open "
+                                                        f"for {scope.name}", token)
+        charged = self._take(now, token, account, book)
+
+        self.tokens.add(token)
+        self.orders[token] = _Order(account, book, book_id, qty, price, live)
+        if live:
+            account.open_orders += 1
+            book.open_orders += 1
+        return charged
+
+    def _take(self, now: float, token: str, *scopes) -> tuple:
+        charged = []
+        for scope in scopes:
+            if scope is None:
+                continue
+            if not scope.take(now):
+                for taken in charged:
+                    taken.refund()
+                raise RiskRejected(MSG_RATE, f"More than {scope.rate} messages/s for {scope.name}", token)
+            charged.append(scope)
+        return tuple(charged)
+
+    def _undo(self, msg, charged: tuple):
+        for scope in charged:
+            scope.refund()
+        if isinstance(msg, EnterOrder):
+            token = msg.order_token
+        elif isinstance(msg, ReplaceOrder):
+            token = msg.replacement_order_token
+        elif isinstance(msg, MassQuote):
+            self.tokens.discard(msg.order_token)
+            return
+        else:
+            return
+        self.tokens.discard(token)
+        order = self.orders.pop(token, None)
+        if order is not None:
+            self._close(order)
+
+    @staticmethod
+    def _close(order: _Order):
+        if order.live:
+            order.live = False
+            order.account.open_orders -= 1
+            if order.book is not None:
+                order.book.open_orders -= 1
+
+    # ── observer hooks ──────────────────────────────────────────────────
+
+    def on_ouch_outbound(self, msg, size=None):
+        pass
+
+    def on_ouch_inbound(self, msg, size=None):
+        if isinstance(msg, OrderExecuted):
+            order = self.orders.get(msg.order_token)
+            book_id = msg.order_book_id or (order.book_id if order is not None else None)
+            if book_id is not None:
+                self.last_price[book_id] = msg.trade_price / WIRE_PRICE_SCALE
+            if order is not None:
+                order.filled += msg.traded_qty
+                if order.filled >= order.qty:
+                    self._close(self.orders.pop(msg.order_token))
+        elif isinstance(msg, (OrderReject, OrderCancelAck)):
+            order = self.orders.pop(msg.order_token, None)
+            if order is not None:
+                self._close(order)
+        elif isinstance(msg, OrderReplaceAck):
+            prev = self.orders.pop(msg.previous_order_token, None)
+            if prev is None:
+                return
+            order = self.orders.get(msg.replacement_order_token)
+            if order is None:
+                self.orders[msg.replacement_order_token] = prev
+            else:
+                # the open-order slot moves over to the replacement
+                order.live, prev.live = prev.live, False
+                order.filled = prev.filled
+
+    def snapshot(self) -> dict:
+        return {
+            "open_orders": sum(1 for order in self.orders.values() if order.live),
+            "rejects": self.rejects,
+            "accounts": {name: scope.snapshot() for name, scope in self.accounts.items()},
+            "books": {name: scope.snapshot() for name, scope in self.books.items()},
+        }
@@ -0,0 +1,161 @@
+"""Seeded, scriptable response scenarios for the test server."""
+
+import json
+import math
+import random
+from typing import Optional
+
+try:
+    import yaml
+except ImportError:  # YAML scenarios need PyYAML, JSON ones don't
+    yaml = None
+
+POLICY_KEYS = {"reject_rate", "reject_codes", "latency_ms", "partial_fills"}
+EVENT_ACTIONS = {"disconnect"}
+
+
+class Policy:
+    """Resolved response policy for one (order_book_id, client_account)."""
+
+    __slots__ = ("reject_rate", "reject_codes", "latency", "fill_probability", "fill_slices", "fill_interval")
+
+    def __init__(self, spec: dict):
+        self.reject_rate = float(spec.get("reject_rate", 0.0))
+        self.reject_codes = list(spec.get("reject_codes", [1]))
+        self.latency = _latency_sampler(spec.get("latency_ms"))
+        fills = spec.get("partial_fills") or {}
+        self.fill_probability = float(fills.get("probability", 0.0))
+        self.fill_slices = [float(s) for s in fills.get("slices", [1.0])]
+        self.fill_interval = float(fills.get("interval_ms", 0.0)) / 1000
+
+
+def _latency_sampler(spec):
+    """
+    Build a function rng -> delay in seconds, or None for no injected latency.
+    spec is a number of ms (fixed) or {dist: fixed|uniform|normal|lognormal|exponential, ...}.
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, (int, float)):
+        return (lambda rng: spec / 1000) if spec > 0 else None
+
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        ms = float(spec["ms"])
+        return lambda rng: ms / 1000
+    if dist == "uniform":
+        low, high = float(spec["low"]), float(spec["high"])
+        return lambda rng: rng.uniform(low, high) / 1000
+    if dist == "normal":
+        mean, sd = float(spec["mean"]), float(spec["sd"])
+        return lambda rng: max(0.0, rng.gauss(mean, sd)) / 1000
+    if dist == "lognormal":
+        # parametrised by the median in ms, which is easier to reason about than mu
+        mu, sigma = math.log(float(spec["median"])), float(spec["sigma"])
+        return lambda rng: rng.lognormvariate(mu, sigma) / 1000
+    if dist == "exponential":
+        mean = float(spec["mean"])
+        return lambda rng: rng.expovariate(1 / mean) / 1000
+    raise ValueError(f"Unknown latency distribution: {dist}")
+
+
+def _check_policy(spec: dict, where: str):
+    unknown = set(spec) - POLICY_KEYS
+    if unknown:
+        raise ValueError(f"Unknown keys in {where}: {sorted(unknown)}")
+    _latency_sampler(spec.get("latency_ms"))
+
+
+class Scenario:
+    """
+    Response policies per order book and/or client account, plus timed
+    events, from a JSON (or, with PyYAML, YAML) file:
+
+        seed: 42
+        duration: 60                  # seconds, the server exits afterwards
+        default:
+          reject_rate: 0.01
+          reject_codes: [1, 5]
+          latency_ms: {dist: lognormal, median: 0.3, sigma: 0.5}
+        policies:                     # applied in order, later matches override earlier ones
+          - match: {order_book_id: 7}
+            reject_rate: 0.2
+          - match: {client_account: "ACC1"}
+            latency_ms: {dist: uniform, low: 2, high: 10}
+            partial_fills: {probability: 0.5, slices: [0.3, 0.3, 0.4], interval_ms: 20}
+        events:
+          - {at: 10, action: disconnect}                  # every session
+          - {at: 25, action: disconnect, username: "bob"}
+    """
+
+    def __init__(self, spec: dict, seed: Optional[int] = None):
+        # every random decision comes from this one generator, so the same scenario,
+        # seed and order flow give the same responses
+        self.seed = seed if seed is not None else spec.get("seed")
+        self.rng = random.Random(self.seed)
+        self.duration = spec.get("duration")
+
+        self.default = spec.get("default", {})
+        _check_policy(self.default, "default")
+        self.rules = []
+        for i, rule in enumerate(spec.get("policies", [])):
+            rule = dict(rule)
+            match = rule.pop("match", {})
+            if set(match) - {"order_book_id", "client_account"}:
+                raise ValueError(f"policies[{i}].match can only use order_book_id and client_account")
+            _check_policy(rule, f"policies[{i}]")
+            self.rules.append((match, rule))
+
+        self.events = sorted(spec.get("events", []), key=lambda e: e["at"])
+        for event in self.events:
+            if event.get("action") not in EVENT_ACTIONS:
+                raise ValueError(f"Unknown scenario action: {event.get('action')}")
+
+        self._policies = {}      # (order_book_id, client_account) -> Policy
+
+    @classmethod
+    def load(cls, path: str, seed: Optional[int] = None) -> "Scenario":
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise RuntimeError("PyYAML is required for YAML scenarios (pip install pyyaml)")
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+        return cls(spec or {}, seed)
+
+    def policy(self, order_book_id: int, client_account: str) -> Policy:
+        key = (order_book_id, client_account)
+        policy = self._policies.get(key)
+        if policy is None:
+            merged = dict(self.default)
+            for match, rule in self.rules:
+                if all((order_book_id if k == "order_book_id" else client_account) == v for k, v in match.items()):
+                    merged.update(rule)
+            policy = self._policies[key] = Policy(merged)
+        return policy
+
+    # ── decisions ───────────────────────────────────────────────────────
+
+    def reject_code(self, policy: Policy) -> Optional[int]:
+        """A reject code to inject, or None to let the order through."""
+        if policy.reject_rate and self.rng.random() < policy.reject_rate:
+            return self.rng.choice(policy.reject_codes)
+        return None
+
+    def latency(self, policy: Policy) -> float:
+        return policy.latency(self.rng) if policy.latency else 0.0
+
+    def fill_plan(self, policy: Policy, qty: int) -> list:
+        """[(delay seconds, qty), ...] of synthetic partial fills for a resting order."""
+        if not policy.fill_probability or self.rng.random() >= policy.fill_probability:
+            return []
+        plan = []
+        remaining = qty
+        for i, fraction in enumerate(policy.fill_slices):
+            piece = min(remaining, max(1, round(qty * fraction)))
+            if piece <= 0:
+                break
+            plan.append((policy.fill_interval * (i + 1), piece))
+            remaining -= piece
+        return plan
@@ -0,0 +1,150 @@
+"""Headless asyncio API for driving the OUCH client in-process, with no ZMQ or JSON in the path."""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+from heartbeat_controller import HeartbeatController
+from ouch_msgs import *
+from soupbin_msgs import LogoutRequest
+from transport import OuchClient
+
+logger = logging.getLogger(__name__)
+
+
+class OuchSession:
+    """
+    A logged-in OUCH session whose order calls resolve with the matching ack or reject.
+
+        session = await OuchSession.connect("127.0.0.1", 9999, "user", "pass")
+        ack = await (await session.enter_order("TOK1", 12, "B", 100, 22.5, client_account="ACC"))
+        async for fill in session.executions():
+            ...
+    """
+
+    def __init__(self, client: Optional[OuchClient] = None):
+        self.client = client or OuchClient()
+        self.client.add_observer(self)
+        self._pending = {}          # order_token -> Future for the matching ack / reject
+        self._exec_queues = []      # one asyncio.Queue per executions() iterator
+
+    @classmethod
+    async def connect(cls, host: str, port: int, username: str, password: str,
+                      client: Optional[OuchClient] = None, timeout: float = 10.0) -> "OuchSession":
+        """Open the TCP session, log in and start heartbeating."""
+        session = cls(client)
+        session.client.username = username
+        session.client.password = password
+        loop = asyncio.get_running_loop()
+        await loop.create_connection(lambda: session.client, host=host, port=port)
+        if session.client.hb is None:
+            HeartbeatController(session.client)
+        await asyncio.wait_for(asyncio.shield(session.client.logged_in), timeout)
+        return session
+
+    async def close(self):
+        """Log out and close the connection."""
+        if self.client.transport is not None:
+            written = asyncio.get_running_loop().create_future()
+            self.client.send_outgoing_msg(LogoutRequest(), written)
+            try:
+                await written
+            except ConnectionError:
+                pass
+            if self.client.transport is not None:
+                self.client.transport.close()
+        if self.client.hb is not None:
+            self.client.hb._task.cancel()
+            self.client.hb = None
+
+    # ── order entry ─────────────────────────────────────────────────────
+
+    async def _submit(self, ouch_msg, token: str) -> asyncio.Future:
+        # straight onto the OuchClient send queue, the response is matched back by order token
+        if token in self._pending:
+            raise ValueError(f"Order token {token} already has a request in flight")
+        response = asyncio.get_running_loop().create_future()
+        self._pending[token] = response
+        try:
+            await self.client.send_ouch_msg(ouch_msg)
+        except Exception:
+            self._pending.pop(token, None)
+            raise
+        return response
+
+    async def enter_order(self, order_token: str, order_book_id: int, side: str, qty: int, price: float,
+                          time_in_force: int = 0, open_close: int = 0, client_account: str = "",
+                          customer_info: str = "", exchange_info: str = "", display_qty: int = 0,
+                          client_category: int = 1, off_hours: int = 0) -> asyncio.Future:
+        """
+        Send an EnterOrder. Returns once it is on the wire with a future that
+        resolves to the OrderAck or OrderReject for `order_token`.
+        """
+        msg = EnterOrder(order_token=order_token, order_book_id=order_book_id, side=side, qty=qty,
+                         price=price, time_in_force=time_in_force, open_close=open_close,
+                         client_account=client_account, customer_info=customer_info,
+                         exchange_info=exchange_info, display_qty=display_qty,
+                         client_category=client_category, off_hours=off_hours)
+        return await self._submit(msg, order_token)
+
+    async def replace_order(self, existing_order_token: str, replacement_order_token: str, qty: int,
+                            price: int, open_close: int = 0, client_account: str = "",
+                            customer_info: str = "", exchange_info: str = "", display_qty: int = 0,
+                            client_category: int = 1) -> asyncio.Future:
+        """Send a ReplaceOrder; the future resolves to the OrderReplaceAck or OrderReject."""
+        msg = ReplaceOrder(existing_order_token=existing_order_token,
+                           replacement_order_token=replacement_order_token, qty=qty, price=price,
+                           open_close=open_close, client_account=client_account,
+                           customer_info=customer_info, exchange_info=exchange_info,
+                           display_qty=display_qty, client_category=client_category)
+        return await self._submit(msg, replacement_order_token)
+
+    async def cancel_order(self, order_token: str) -> asyncio.Future:
+        """Send a CancelOrder; the future resolves to the OrderCancelAck or OrderReject."""
+        return await self._submit(CancelOrder(order_token=order_token), order_token)
+
+    # ── fills ───────────────────────────────────────────────────────────
+
+    async def executions(self) -> AsyncIterator[OrderExecuted]:
+        """Yield every OrderExecuted received from now on. Each iterator gets its own queue."""
+        q = asyncio.Queue()
+        self._exec_queues.append(q)
+        try:
+            while True:
+                fill = await q.get()
+                if fill is None:
+                    return
+                yield fill
+        finally:
+            self._exec_queues.remove(q)
+
+    # ── OuchClient observer hooks ───────────────────────────────────────
+
+    def on_ouch_outbound(self, msg, size=None):
+        pass
+
+    def on_ouch_inbound(self, msg, size=None):
+        if isinstance(msg, OrderExecuted):
+            for q in self._exec_queues:
+                q.put_nowait(msg)
+            return
+
+        if isinstance(msg, OrderReplaceAck):
+            token = msg.replacement_order_token
+        elif isinstance(msg, (OrderAck, OrderReject, OrderCancelAck)):
+            token = msg.order_token
+        else:
+            return
+
+        fut = self._pending.pop(token, None)
+        if fut is not None and not fut.done():
+            fut.set_result(msg)
+
+    def on_disconnect(self, exc):
+        err = ConnectionError(f"Disconnected: {exc}")
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(err)
+        self._pending.clear()
+        for q in self._exec_queues:
+            q.put_nowait(None)
@@ -3,6 +3,8 @@ from enum import Enum
 from typing import ClassVar, Optional
 import struct
 
+_FRAME_LEN = struct.Struct(">H")
+
 
 class PacketType(Enum):
     LOGIN_REQUEST = b'L'
@@ -12,6 +14,7 @@ class PacketType(Enum):
     UNSEQUENCED_DATA = b'U'
     CLIENT_HEARTBEAT = b'R'
     SERVER_HEARTBEAT = b'H'
+    LOGOUT_REQUEST = b'O'
 
 
 @dataclass
@@ -34,8 +37,10 @@ class LoginRequest:
     def from_bytes(cls, data: bytes) -> "LoginRequest":
         u = data[0:6].rstrip(b" ").decode()
         p = data[6:16].rstrip(b" ").decode()
-        s = data[16:20].rstrip(b"\x00").decode()
-        return cls(username=u, password=p, requested_session=s)
+        s = data[16:26].rstrip(b"\x00 ").decode()
+        seq = data[26:46].strip(b"\x00 ")
+        return cls(username=u, password=p, requested_session=s,
+                   requested_sequence_number=int(seq) if seq else 0)
 
 
 @dataclass  
@@ -71,14 +76,15 @@ class LoginRejected:
 
 @dataclass
 class LogoutRequest:
-    TYPE_ID: ClassVar[bytes] = b'O'
+    TYPE_ID: ClassVar[bytes] = PacketType.LOGOUT_REQUEST.value
 
     def to_bytes(self) -> bytes:
-        return self.TYPE_ID
+        # the type byte is the whole message
+        return b""
     
     @classmethod
     def from_bytes(cls, data: bytes) -> "LogoutRequest":
-        if data != cls.TYPE_ID:
+        if data:
             raise ValueError("Invalid LogoutRequest data")
         return cls()
 
@@ -140,8 +146,12 @@ class SoupPacketFactory:
         PacketType.UNSEQUENCED_DATA.value: UnsequencedData,
         PacketType.CLIENT_HEARTBEAT.value: ClientHeartbeat,
         PacketType.SERVER_HEARTBEAT.value: ServerHeartbeat,
+        PacketType.LOGOUT_REQUEST.value: LogoutRequest,
     }
 
+    # same classes keyed by the type byte's int value, as split_frames reports it
+    PACKET_TYPES_BY_BYTE = {k[0]: v for k, v in PACKET_TYPES.items()}
+
     @classmethod
     def parse(cls, data: bytes):
 
@@ -186,4 +196,22 @@ class SoupPacketFactory:
         buf = buf[total:]
 
         msg = pkt_cls.from_bytes(bytes(payload))
-        return msg, total
\ No newline at end of file
+        return msg, total
+
+    @classmethod
+    def split_frames(cls, buf) -> tuple:
+        """
+        Locate every complete frame in buf without copying anything.
+        Returns ([(type_byte_int, payload_start, payload_end), ...], bytes_consumed);
+        the caller slices payloads out of buf and drops the consumed prefix once.
+        """
+        frames = []
+        pos, size = 0, len(buf)
+        unpack = _FRAME_LEN.unpack_from
+        while size - pos >= 3:
+            end = pos + 2 + unpack(buf, pos)[0]
+            if end > size:
+                break
+            frames.append((buf[pos + 2], pos + 3, end))
+            pos = end
+        return frames, pos
\ No newline at end of file
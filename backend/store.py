@@ -0,0 +1,297 @@
+"""SQLite journal of orders, executions and raw messages, written in batches by a background thread."""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ouch_msgs import *
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    ts_ns INTEGER NOT NULL,
+    direction TEXT NOT NULL,        -- 'I' inbound / 'O' outbound
+    msg_type TEXT NOT NULL,         -- OUCH type byte
+    order_token TEXT,
+    order_book_id INTEGER,
+    client_account TEXT,
+    order_id INTEGER,
+    match_id INTEGER,
+    qty INTEGER,
+    price INTEGER,
+    code INTEGER,                   -- reject code / cancel reason
+    size INTEGER NOT NULL           -- encoded payload length in bytes
+);
+CREATE INDEX IF NOT EXISTS ix_messages_ts ON messages(ts_ns);
+CREATE INDEX IF NOT EXISTS ix_messages_token ON messages(order_token);
+CREATE INDEX IF NOT EXISTS ix_messages_book_ts ON messages(order_book_id, ts_ns);
+CREATE INDEX IF NOT EXISTS ix_messages_account_ts ON messages(client_account, ts_ns);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_token TEXT PRIMARY KEY,
+    ts_ns INTEGER NOT NULL,
+    prev_token TEXT,
+    order_book_id INTEGER,
+    client_account TEXT,
+    side TEXT,
+    qty INTEGER,
+    price INTEGER,
+    order_id INTEGER,
+    filled_qty INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,            -- sent / ack / rejected / cancelled / replaced
+    updated_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_orders_book_ts ON orders(order_book_id, ts_ns);
+CREATE INDEX IF NOT EXISTS ix_orders_account_ts ON orders(client_account, ts_ns);
+CREATE INDEX IF NOT EXISTS ix_orders_ts ON orders(ts_ns);
+
+CREATE TABLE IF NOT EXISTS executions (
+    id INTEGER PRIMARY KEY,
+    ts_ns INTEGER NOT NULL,
+    order_token TEXT NOT NULL,
+    order_book_id INTEGER,
+    client_account TEXT,
+    side TEXT,
+    qty INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    match_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_exec_token ON executions(order_token);
+CREATE INDEX IF NOT EXISTS ix_exec_book_ts ON executions(order_book_id, ts_ns);
+CREATE INDEX IF NOT EXISTS ix_exec_account_ts ON executions(client_account, ts_ns);
+CREATE INDEX IF NOT EXISTS ix_exec_ts ON executions(ts_ns);
+"""
+
+# Statements are referenced by key from the write queue so the writer thread
+# can group each batch into one executemany call per statement.
+SQL = {
+    # a token sent again keeps its fills, state and order id, only the order columns are updated
+    "order_new": "INSERT INTO orders (order_token, ts_ns, prev_token, order_book_id, client_account, "
+                 "side, qty, price, state, updated_ns) VALUES (?,?,?,?,?,?,?,?,'sent',?) "
+                 "ON CONFLICT(order_token) DO UPDATE SET prev_token = excluded.prev_token, "
+                 "order_book_id = excluded.order_book_id, client_account = excluded.client_account, "
+                 "side = excluded.side, qty = excluded.qty, price = excluded.price, "
+                 "updated_ns = excluded.updated_ns",
+    "order_ack": "UPDATE orders SET state = 'ack', order_id = ?, qty = ?, price = ?, updated_ns = ? "
+                 "WHERE order_token = ?",
+    "order_fill": "UPDATE orders SET filled_qty = filled_qty + ?, updated_ns = ? WHERE order_token = ?",
+    "order_state": "UPDATE orders SET state = ?, updated_ns = ? WHERE order_token = ?",
+    "exec": "INSERT INTO executions (ts_ns, order_token, order_book_id, client_account, side, qty, price, match_id) "
+            "VALUES (?,?,?,?,?,?,?,?)",
+    "msg": "INSERT INTO messages (ts_ns, direction, msg_type, order_token, order_book_id, client_account, "
+           "order_id, match_id, qty, price, code, size) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+}
+
+_STOP = object()
+
+
+class MessageStore:
+    """
+    SQLite journal of orders, executions and OUCH message metadata.
+
+    Recording only builds a tuple and puts it on a queue; a background thread
+    drains the queue and commits it in batched transactions on a WAL database,
+    so the event loop never waits on disk.
+    """
+
+    def __init__(self, path: str, batch_size: int = 10_000, flush_interval: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._q = queue.SimpleQueue()
+        # order_token -> (order_book_id, client_account, side); executions carry only the token
+        self._orders = {}
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name="ouch-store", daemon=True)
+        self._thread.start()
+        logger.info(f"💾 Message store opened at {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MiB keeps index pages hot during bulk ingest
+        return conn
+
+    # ── ingest (event loop side) ────────────────────────────────────────
+
+    def on_ouch_outbound(self, msg, size: Optional[int] = None):
+        now = time.time_ns()
+        put = self._q.put
+        if size is None:
+            size = len(msg.to_soupbin()) + 1
+
+        if isinstance(msg, EnterOrder):
+            price = int(msg.price * 100)
+            self._orders[msg.order_token] = (msg.order_book_id, msg.client_account, msg.side)
+            put(("order_new", (msg.order_token, now, None, msg.order_book_id, msg.client_account,
+                               msg.side, msg.qty, price, now)))
+            put(("msg", (now, "O", "O", msg.order_token, msg.order_book_id, msg.client_account,
+                         None, None, msg.qty, price, None, size)))
+        elif isinstance(msg, ReplaceOrder):
+            book, account, side = self._orders.get(msg.existing_order_token, (None, msg.client_account, None))
+            self._orders[msg.replacement_order_token] = (book, account, side)
+            put(("order_new", (msg.replacement_order_token, now, msg.existing_order_token, book,
+                               account, side, msg.qty, msg.price, now)))
+            put(("msg", (now, "O", "U", msg.replacement_order_token, book, account,
+                         None, None, msg.qty, msg.price, None, size)))
+        elif isinstance(msg, CancelOrder):
+            book, account, _ = self._orders.get(msg.order_token, (None, None, None))
+            put(("msg", (now, "O", "X", msg.order_token, book, account,
+                         None, None, None, None, None, size)))
+        elif isinstance(msg, CancelOrderByID):
+            put(("msg", (now, "O", "Y", None, msg.order_book_id, None,
+                         msg.order_id, None, None, None, None, size)))
+        else:
+            put(("msg", (now, "O", msg.TYPE_ID.decode(), getattr(msg, "order_token", None),
+                         None, None, None, None, None, None, None, size)))
+
+    def on_ouch_inbound(self, msg, size: Optional[int] = None):
+        put = self._q.put
+        now = time.time_ns()
+        ts = getattr(msg, "ts_ns", None) or now
+        type_id = msg.TYPE_ID.decode()
+        if size is None:
+            size = len(msg.to_soupbin()) + 1
+
+        if isinstance(msg, OrderAck):
+            self._orders[msg.order_token] = (msg.order_book_id, msg.client_account, msg.side)
+            put(("order_ack", (msg.order_id, msg.qty, msg.price, now, msg.order_token)))
+            put(("msg", (ts, "I", type_id, msg.order_token, msg.order_book_id, msg.client_account,
+                         msg.order_id, None, msg.qty, msg.price, None, size)))
+        elif isinstance(msg, OrderReplaceAck):
+            self._orders[msg.replacement_order_token] = (msg.order_book_id, msg.client_account, msg.side)
+            put(("order_state", ("replaced", now, msg.previous_order_token)))
+            put(("order_ack", (msg.order_id, msg.qty, msg.price, now, msg.replacement_order_token)))
+            put(("msg", (ts, "I", type_id, msg.replacement_order_token, msg.order_book_id,
+                         msg.client_account, msg.order_id, None, msg.qty, msg.price, None, size)))
+        elif isinstance(msg, OrderReject):
+            book, account, _ = self._orders.get(msg.order_token, (None, None, None))
+            put(("order_state", ("rejected", now, msg.order_token)))
+            put(("msg", (ts, "I", type_id, msg.order_token, book, account,
+                         None, None, None, None, msg.reject_code, size)))
+        elif isinstance(msg, OrderCancelAck):
+            _, account, _ = self._orders.get(msg.order_token, (None, None, None))
+            put(("order_state", ("cancelled", now, msg.order_token)))
+            put(("msg", (ts, "I", type_id, msg.order_token, msg.order_book_id, account,
+                         msg.order_id, None, None, None, msg.reason, size)))
+        elif isinstance(msg, OrderExecuted):
+            book, account, side = self._orders.get(msg.order_token, (None, None, None))
+            book = msg.order_book_id or book
+            put(("exec", (ts, msg.order_token, book, account, side, msg.traded_qty,
+                          msg.trade_price, msg.match_id)))
+            put(("order_fill", (msg.traded_qty, now, msg.order_token)))
+            put(("msg", (ts, "I", type_id, msg.order_token, book, account,
+                         None, msg.match_id, msg.traded_qty, msg.trade_price, None, size)))
+        else:
+            put(("msg", (ts, "I", type_id, getattr(msg, "order_token", None),
+                         getattr(msg, "order_book_id", None), None, None, None, None, None,
+                         getattr(msg, "reject_code", None), size)))
+
+    # ── writer thread ───────────────────────────────────────────────────
+
+    def _run(self):
+        conn = self._connect()
+        q = self._q
+        while True:
+            try:
+                item = q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [item]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(q.get_nowait())
+            except queue.Empty:
+                pass
+
+            stop = _STOP in batch
+            if stop:
+                batch = [b for b in batch if b is not _STOP]
+            if batch:
+                try:
+                    self._write_batch(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Store write of {len(batch)} rows failed: {e}")
+            if stop:
+                break
+        conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch):
+        # One executemany per statement. Row order is kept within a statement and
+        # the statements run in lifecycle order (insert, ack, fill, final state),
+        # which is all the orders table needs.
+        rows = {key: [] for key in SQL}
+        for key, row in batch:
+            rows[key].append(row)
+
+        conn.execute("BEGIN")
+        try:
+            for key, key_rows in rows.items():
+                if key_rows:
+                    conn.executemany(SQL[key], key_rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending rows and stop the writer thread."""
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    # ── queries (run off the event loop, e.g. via asyncio.to_thread) ────
+
+    def _query(self, table: str, order_token=None, order_book_id=None, client_account=None,
+               since_ns=None, until_ns=None, limit: int = 1000, offset: int = 0):
+        clauses, params = [], []
+        if order_token is not None:
+            clauses.append("order_token = ?")
+            params.append(order_token)
+        if order_book_id is not None:
+            clauses.append("order_book_id = ?")
+            params.append(order_book_id)
+        if client_account is not None:
+            clauses.append("client_account = ?")
+            params.append(client_account)
+        if since_ns is not None:
+            clauses.append("ts_ns >= ?")
+            params.append(since_ns)
+        if until_ns is not None:
+            clauses.append("ts_ns < ?")
+            params.append(until_ns)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM {table} {where} ORDER BY ts_ns LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(r) for r in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def query_messages(self, **filters):
+        """Message metadata filtered by order_token, order_book_id, client_account and ts_ns range."""
+        return self._query("messages", **filters)
+
+    def query_orders(self, **filters):
+        """Orders filtered by order_token, order_book_id, client_account and ts_ns range."""
+        return self._query("orders", **filters)
+
+    def query_executions(self, **filters):
+        """Executions filtered by order_token, order_book_id, client_account and ts_ns range."""
+        return self._query("executions", **filters)
@@ -0,0 +1,314 @@
+"""In-process strategy hosting with CPU accounting and a kill switch."""
+
+import asyncio
+import importlib
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from ouch_msgs import *
+
+logger = logging.getLogger(__name__)
+
+_TIMER = object()
+
+
+class StrategyKilled(Exception):
+    pass
+
+
+class Strategy:
+    """Base class for in-process strategies. Override the hooks you need."""
+
+    name: Optional[str] = None
+    # seconds between on_timer calls, None disables the timer
+    timer_interval: Optional[float] = None
+    # receive messages for all tokens, not just the ones this strategy sent
+    see_all = False
+
+    def __init__(self, runner: "StrategyRunner"):
+        self.runner = runner
+        self.name = self.name or type(self).__name__
+
+    def send(self, ouch_msg) -> asyncio.Future:
+        """Send an OUCH message; its responses are routed back to this strategy."""
+        return self.runner.send(self, ouch_msg)
+
+    def send_template(self, template: "OrderTemplate", qty: int, price: float,
+                      order_token: str = "") -> asyncio.Future:
+        """Send an EnterOrder from a pre-encoded template, see OuchClient.send_template."""
+        if not order_token:
+            # raises ValueError before an order that can't be encoded burns a token
+            template.check(qty, price)
+            order_token = self.new_token()
+        return self.runner.send_template(self, template, qty, price, order_token)
+
+    def new_token(self) -> str:
+        """A fresh order token from the backend's allocator"""
+        return self.runner.client.tokens.next()
+
+    def on_start(self):
+        pass
+
+    def on_ack(self, msg):
+        """OrderAck, OrderReplaceAck or OrderCancelAck."""
+
+    def on_reject(self, msg: OrderReject):
+        pass
+
+    def on_execution(self, msg: OrderExecuted):
+        pass
+
+    def on_timer(self):
+        pass
+
+    def on_stop(self):
+        pass
+
+
+class _Slot:
+    """Runner-side state of one hosted strategy."""
+
+    def __init__(self, strategy: Strategy):
+        self.strategy = strategy
+        self.inbox = deque()
+        self.active = True
+        self.tokens = set()      # tokens sent by this strategy
+        self.cpu_ns = 0
+        self.calls = 0
+        self.max_call_ns = 0
+        self.overruns = 0
+        self.errors = 0
+        self.timer = None
+
+    def stats(self) -> dict:
+        return {
+            "name": self.strategy.name,
+            "active": self.active,
+            "calls": self.calls,
+            "cpu_ms": self.cpu_ns / 1e6,
+            "avg_call_us": self.cpu_ns / self.calls / 1e3 if self.calls else 0.0,
+            "max_call_us": self.max_call_ns / 1e3,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "backlog": len(self.inbox),
+            "open_tokens": len(self.tokens),
+        }
+
+
+class StrategyRunner:
+    """Feeds strategies the OUCH messages of the orders they sent, straight from the OuchClient with no IPC."""
+
+    def __init__(self, client, slice_ms: float = 1.0, max_call_ms: float = 50.0, max_overruns: int = 3,
+                 hard_call_ms: float = 250.0, max_errors: int = 10, max_backlog: int = 100_000):
+        self.client = client
+        self.slice_ns = int(slice_ms * 1e6)
+        self.max_call_ns = int(max_call_ms * 1e6)
+        self.max_overruns = max_overruns
+        # a single callback over this is killed at once, it held the socket reader that long
+        self.hard_call_ns = int(hard_call_ms * 1e6)
+        self.max_errors = max_errors
+        self.max_backlog = max_backlog
+        self._slots = {}         # name -> _Slot
+        self._owners = {}        # order_token -> _Slot
+        self._open_qty = {}      # order_token -> qty still open, from acks and executions
+        self._watchers = []      # slots with see_all
+        self._drain_scheduled = False
+        client.add_observer(self)
+
+    # ── lifecycle ───────────────────────────────────────────────────────
+
+    def add(self, strategy_cls, **kwargs) -> Strategy:
+        strategy = strategy_cls(self, **kwargs)
+        if strategy.name in self._slots:
+            raise ValueError(f"Strategy {strategy.name} is already loaded")
+        slot = _Slot(strategy)
+        self._slots[strategy.name] = slot
+        if strategy.see_all:
+            self._watchers.append(slot)
+
+        self._call(slot, strategy.on_start)
+        if strategy.timer_interval:
+            self._arm_timer(slot)
+        logger.info(f"🤖 Strategy {strategy.name} started")
+        return strategy
+
+    def load(self, spec: str) -> Strategy:
+        """Load a strategy from a "module:ClassName" spec."""
+        module_name, _, cls_name = spec.partition(":")
+        cls = getattr(importlib.import_module(module_name), cls_name)
+        return self.add(cls)
+
+    def kill(self, name: str, cancel_orders: bool = True, reason: str = "kill switch"):
+        """Stop dispatching to a strategy and optionally cancel the orders it has out."""
+        slot = self._slots.get(name)
+        if slot is None or not slot.active:
+            return
+        slot.active = False
+        slot.inbox.clear()
+        if slot.timer is not None:
+            slot.timer.cancel()
+        if slot in self._watchers:
+            self._watchers.remove(slot)
+        logger.warning(f"🛑 Strategy {name} killed: {reason}")
+
+        if cancel_orders and self.client.transport is not None:
+            cancels = [CancelOrder(order_token=token) for token in slot.tokens]
+            if cancels:
+                self.client.send_ouch_batch(cancels)
+        try:
+            slot.strategy.on_stop()
+        except Exception as e:
+            logger.error(f"Strategy {name} on_stop failed: {e}")
+
+    def kill_all(self, cancel_orders: bool = True):
+        for name in list(self._slots):
+            self.kill(name, cancel_orders)
+
+    def stats(self) -> list:
+        return [slot.stats() for slot in self._slots.values()]
+
+    # ── order routing ───────────────────────────────────────────────────
+
+    def send(self, strategy: Strategy, ouch_msg) -> asyncio.Future:
+        if isinstance(ouch_msg, ReplaceOrder):
+            token = ouch_msg.replacement_order_token
+        else:
+            token = getattr(ouch_msg, "order_token", None)
+        self._claim(strategy, token)
+        return self.client.send_ouch_msg(ouch_msg)
+
+    def send_template(self, strategy: Strategy, template, qty: int, price: float,
+                      order_token: str) -> asyncio.Future:
+        self._claim(strategy, order_token)
+        return self.client.send_template(template, qty, price, order_token)
+
+    def _claim(self, strategy: Strategy, token: Optional[str]):
+        """Route the responses for `token` to the strategy sending it"""
+        slot = self._slots[strategy.name]
+        if not slot.active:
+            raise StrategyKilled(strategy.name)
+        if token:
+            self._owners[token] = slot
+            slot.tokens.add(token)
+
+    # ── OuchClient observer hooks ───────────────────────────────────────
+
+    def on_ouch_outbound(self, msg, size=None):
+        pass
+
+    def on_ouch_inbound(self, msg, size=None):
+        if isinstance(msg, OrderReplaceAck):
+            token = msg.replacement_order_token
+            prev = self._owners.get(msg.previous_order_token)
+            if prev is not None:
+                self._release(prev, msg.previous_order_token)
+        else:
+            token = getattr(msg, "order_token", None)
+
+        owner = self._owners.get(token)
+        if owner is not None:
+            if isinstance(msg, (OrderAck, OrderReplaceAck)):
+                self._open_qty[token] = msg.qty
+            elif isinstance(msg, OrderExecuted):
+                open_qty = self._open_qty.get(token)
+                if open_qty is not None:
+                    open_qty -= msg.traded_qty
+                    self._open_qty[token] = open_qty
+                    if open_qty <= 0:
+                        self._release(owner, token)
+            elif isinstance(msg, (OrderReject, OrderCancelAck)):
+                self._release(owner, token)
+
+        for slot in self._watchers:
+            if slot is not owner:
+                self._enqueue(slot, msg)
+        if owner is not None and owner.active:
+            self._enqueue(owner, msg)
+
+    def _release(self, slot: _Slot, token: str):
+        """The token is done (filled, cancelled, rejected or replaced), stop tracking it for cancel-on-kill"""
+        del self._owners[token]
+        slot.tokens.discard(token)
+        self._open_qty.pop(token, None)
+
+    def on_disconnect(self, exc):
+        pass
+
+    # ── dispatch ────────────────────────────────────────────────────────
+
+    def _enqueue(self, slot: _Slot, item):
+        slot.inbox.append(item)
+        if len(slot.inbox) > self.max_backlog:
+            self.kill(slot.strategy.name, reason=f"backlog over {self.max_backlog}")
+            return
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            asyncio.get_running_loop().call_soon(self._drain)
+
+    def _drain(self):
+        """Run queued callbacks until each strategy's time slice is used, then yield to the loop."""
+        # The reader only appends to inboxes, but callbacks still run on the loop: the slice bounds
+        # a backlog, not a single slow callback, which stalls the reader and every strategy while
+        # it runs. _call kills strategies that do that, it can't preempt them.
+        self._drain_scheduled = False
+        pending = False
+        for slot in list(self._slots.values()):
+            deadline = time.perf_counter_ns() + self.slice_ns
+            inbox = slot.inbox
+            while inbox and slot.active:
+                self._dispatch(slot, inbox.popleft())
+                if time.perf_counter_ns() >= deadline:
+                    break
+            if inbox and slot.active:
+                pending = True
+        if pending and not self._drain_scheduled:
+            self._drain_scheduled = True
+            asyncio.get_running_loop().call_soon(self._drain)
+
+    def _dispatch(self, slot: _Slot, item):
+        strategy = slot.strategy
+        if item is _TIMER:
+            self._call(slot, strategy.on_timer)
+        elif isinstance(item, OrderExecuted):
+            self._call(slot, strategy.on_execution, item)
+        elif isinstance(item, OrderReject):
+            self._call(slot, strategy.on_reject, item)
+        elif isinstance(item, (OrderAck, OrderReplaceAck, OrderCancelAck)):
+            self._call(slot, strategy.on_ack, item)
+
+    def _call(self, slot: _Slot, fn, *args):
+        # CPU time is what the strategy is billed for, wall time is how long it held the loop
+        start = time.thread_time_ns()
+        wall_start = time.perf_counter_ns()
+        try:
+            fn(*args)
+        except StrategyKilled:
+            pass
+        except Exception as e:
+            slot.errors += 1
+            logger.error(f"Strategy {slot.strategy.name} raised in {fn.__name__}: {e}", exc_info=True)
+            if slot.errors >= self.max_errors:
+                self.kill(slot.strategy.name, reason=f"{slot.errors} errors")
+        finally:
+            slot.cpu_ns += time.thread_time_ns() - start
+            slot.calls += 1
+            wall = time.perf_counter_ns() - wall_start
+            if wall > slot.max_call_ns:
+                slot.max_call_ns = wall
+            if wall > self.max_call_ns:
+                slot.overruns += 1
+                logger.warning(f"Strategy {slot.strategy.name} {fn.__name__} took {wall / 1e6:.1f} ms")
+                if wall > self.hard_call_ns:
+                    self.kill(slot.strategy.name, reason=f"a callback over {self.hard_call_ns / 1e6:.0f} ms")
+                elif slot.overruns >= self.max_overruns:
+                    self.kill(slot.strategy.name, reason=f"{slot.overruns} callbacks over {self.max_call_ns / 1e6:.0f} ms")
+
+    def _arm_timer(self, slot: _Slot):
+        def fire():
+            if not slot.active:
+                return
+            self._enqueue(slot, _TIMER)
+            self._arm_timer(slot)
+        slot.timer = asyncio.get_running_loop().call_later(slot.strategy.timer_interval, fire)
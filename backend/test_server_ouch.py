@@ -1,20 +1,40 @@
 #!/usr/bin/env python3
 """
 Enhanced SoupBinTCP server for OUCH client testing.
-Provides both automatic responses and manual message injection via keyboard.
+Orders are matched per order_book_id by a price-time priority engine
+(matching_engine.py), so crossing orders produce real executions on both
+sides. Manual message injection is available via keyboard.
+
+Responses produced while handling one socket read are written with a single
+write per connection. --perf turns per-message logging off, and --workers N
+runs N processes on the same port via SO_REUSEPORT (each with its own books).
+
+--scenario FILE applies a seeded response policy (rejects, latency, partial
+fills, disconnects) from scenario.py; --headless skips the keyboard loop.
+
+--flood RATE (or the 'f' command) pushes unsolicited OrderAck/OrderExecuted/
+OrderCancelAck messages to every logged in session at RATE msgs/sec, steady
+or in bursts, to find the client's inbound ceiling (see flood.py).
 """
 
 import asyncio
-import struct
 import random
 import argparse
 import logging
 import sys
 import signal
+import multiprocessing
+import time
+from array import array
+from collections import deque
+from itertools import accumulate
 from datetime import datetime, timezone
 
 from soupbin_msgs import *
 from ouch_msgs import *
+from matching_engine import MatchingEngine
+from scenario import Scenario
+from flood import Flood, MIX_TYPES
 
 # Configure logging
 logging.basicConfig(
@@ -32,13 +52,73 @@ active_connections = {}
 next_order_id = 10000
 
 
+# Read size per socket wakeup and the write buffer size before drain() blocks
+READ_SIZE = 256 * 1024
+WRITE_HIGH_WATER = 4 * 1024 * 1024
+# Steady floods are written in slices of this many seconds
+FLOOD_TICK = 0.001
+# one-byte type codes by value, so frames don't allocate one each
+_TYPE_BYTES = [bytes((i,)) for i in range(256)]
+
+
+class ServerSession:
+    """
+    A SoupBinTCP session: every SequencedData frame sent on it, kept so a
+    client can log in again and resume from any sequence number.
+
+    Frames are appended to one bytearray; offsets[n - 1] is where message n
+    starts, so a replay is a single slice from the requested message onwards.
+    """
+
+    def __init__(self, name: str, username: str):
+        self.name = name
+        self.username = username
+        self.log = bytearray()
+        self.offsets = array("Q")
+        self.writer: Optional[asyncio.StreamWriter] = None  # None while nobody is logged in
+
+    @property
+    def next_seq(self) -> int:
+        return len(self.offsets) + 1
+
+    def append(self, frame: bytes):
+        self.offsets.append(len(self.log))
+        self.log += frame
+
+    def extend(self, frames: bytes, sizes: list):
+        """Append several frames at once, sizes gives the length of each"""
+        self.offsets.extend(accumulate(sizes[:-1], initial=len(self.log)))
+        self.log += frames
+
+    def frames_from(self, seq: int) -> bytes:
+        """Framed messages seq, seq + 1, ... up to the newest"""
+        if seq >= self.next_seq:
+            return b""
+        return bytes(self.log[self.offsets[seq - 1]:])
+
+
 class OuchTestServer:
-    def __init__(self, host=HOST, port=PORT):
+    def __init__(self, host=HOST, port=PORT, perf=False, reuse_port=False, scenario=None, seed=None,
+                 heartbeat_interval=1.0):
         self.host = host
         self.port = port
         self.server = None
         self.next_order_id = 10000
         self.connections = {}
+        self.engine = MatchingEngine()
+        # per-message logs cost more than matching; --perf turns them off
+        self.verbose = not perf
+        self.reuse_port = reuse_port
+        self._pending = {}  # writer -> frames queued since the last flush
+        self._next_action = None
+        self.sessions = {}  # session name -> ServerSession, kept after disconnects for replay
+        self.client_sessions = {}  # client_id -> ServerSession it is logged in to
+        self.heartbeat_interval = heartbeat_interval
+        self._active = set()  # writers flushed to since the last heartbeat tick
+        self._delayed = {}  # session name -> deque of (release time, events) held back by scenario latency
+        # all random decisions share one seeded generator so runs can be reproduced
+        self.scenario = scenario
+        self.rng = scenario.rng if scenario else random.Random(seed)
         self.cmd_handlers = self._setup_commands()
         
     def _setup_commands(self):
@@ -46,8 +126,10 @@ class OuchTestServer:
         return {
             'h': (self._cmd_heartbeat, "Send heartbeat to all clients"),
             'r': (self._cmd_reject_order, "Reject next order"),
-            'a': (self._cmd_accept_order, "Accept next order with ACK"),
-            'e': (self._cmd_execute, "Execute an order"),
+            'a': (self._cmd_accept_order, "Send next order to the matching engine"),
+            'e': (self._cmd_execute, "Execute a random resting order"),
+            'b': (self._cmd_book, "Show book depth: b <order_book_id>"),
+            'f': (self._cmd_flood, "Flood sessions: f <msgs/sec> <seconds> [burst size] [mix, e.g. AEC]"),
             'c': (self._cmd_cancel, "Cancel an order"),
             'q': (self._cmd_quit, "Quit server"),
             '?': (self._cmd_help, "Show this help"),
@@ -56,10 +138,8 @@ class OuchTestServer:
     async def _cmd_heartbeat(self, *args):
         """Send heartbeat to all clients"""
         for writer in self.connections.values():
-            heartbeat = ServerHeartbeat()
-            frame = SoupPacketFactory.serialize(heartbeat)
-            writer.write(frame)
-            await writer.drain()
+            self.send(writer, SoupPacketFactory.serialize(ServerHeartbeat()))
+        await self.flush()
         logger.info("💓 Sent heartbeat to all clients")
         
     async def _cmd_reject_order(self, *args):
@@ -73,36 +153,37 @@ class OuchTestServer:
         self._next_action = "accept"
         
     async def _cmd_execute(self, *args):
-        """Execute an order"""
-        if not self.connections:
-            logger.info("No active connections")
+        """Fill a random resting order against an outside counterparty"""
+        if not self.engine.by_id:
+            logger.info("No resting orders")
             return
-            
-        # Generate an execution for a random client
-        client_id = random.choice(list(self.connections.keys()))
-        writer = self.connections[client_id]
-        
-        # Create a simulated execution
-        execution = OrderExecuted(
-            ts_ns=int(datetime.now().timestamp() * 1_000_000_000),
-            order_token="TOKEN" + str(random.randint(1000, 9999)),
-            order_book_id=random.randint(1, 100),
-            traded_qty=random.randint(1, 100) * 10,
-            trade_price=random.randint(100, 1000),
-            match_id=random.randint(10000, 99999),
-            client_category=1,
-            reserved_bits=b"\x00" * 16
-        )
-        
-        # Wrap in a SequencedData message
-        seq_data = SequencedData(
-            message=OUCH_INBOUND_MSG_TYPE.ORDER_EXECUTED.value + execution.to_soupbin()
-        )
-        frame = SoupPacketFactory.serialize(seq_data)
-        writer.write(frame)
-        await writer.drain()
-        logger.info(f"📊 Sent execution to client {client_id}")
+
+        order = self.rng.choice(list(self.engine.by_id.values()))
+        token, owner = order.token, order.owner
+        self.deliver(self.engine.execute_resting(order))
+        await self.flush()
+        logger.info(f"📊 Executed resting order {token} of client {owner}")
+
+    async def _cmd_book(self, *args):
+        """Print the top of book for an order book"""
+        book_id = int(args[0]) if args else 1
+        depth = self.engine.depth(book_id, 10)
+        print(f"\n--- Book {book_id} (last {depth['last_price']}) ---")
+        for price, qty, count in reversed(depth["asks"]):
+            print(f"          {price:>10} {qty:>10} ({count})")
+        for price, qty, count in depth["bids"]:
+            print(f"({count}) {qty:>10} {price:>10}")
+        print("-----------------------\n")
         
+    async def _cmd_flood(self, *args):
+        """Start an unsolicited inbound flood in the background"""
+        if len(args) < 2:
+            print("Usage: f <msgs/sec> <seconds> [burst size] [mix]")
+            return
+        burst = int(args[2]) if len(args) > 2 else 0
+        mix = args[3].upper() if len(args) > 3 else "AEC"
+        asyncio.create_task(self.run_flood(float(args[0]), float(args[1]), burst, mix))
+
     async def _cmd_cancel(self, *args):
         """Cancel an order"""
         logger.info("🗑️ Will send cancel acknowledgment on next order")
@@ -144,36 +225,38 @@ class OuchTestServer:
         self.connections[client_id] = writer
         
         logger.info(f"📡 New connection from {peer}")
+        writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
         buf = bytearray()
+        heartbeats = None
+        if self.heartbeat_interval > 0:
+            heartbeats = asyncio.create_task(self.heartbeat_loop(writer))
         
         try:
             while not reader.at_eof():
-                data = await reader.read(4096)
+                data = await reader.read(READ_SIZE)
                 if not data:
                     break
                 buf.extend(data)
                 
-                # Process complete frames
-                while True:
-                    if len(buf) < 2:
-                        break
-                    length = struct.unpack_from(">H", buf, 0)[0]
-                    frame_len = 2 + length
-                    if len(buf) < frame_len:
-                        break
-                        
-                    # Extract the complete frame
-                    frame = bytes(buf[:frame_len])
-                    del buf[:frame_len]
-                    
-                    # Parse the frame
-                    await self.process_frame(frame, writer, client_id)
+                # Locate complete frames in place (same codec as the client) and drop them in one go.
+                # Each payload is decoded from a view of the buffer, released before the buffer shrinks
+                frames, consumed = SoupPacketFactory.split_frames(buf)
+                with memoryview(buf) as view:
+                    for type_id, start, end in frames:
+                        with view[start:end] as payload:
+                            self.process_frame(_TYPE_BYTES[type_id], payload, writer, client_id)
+                del buf[:consumed]
+
+                # everything produced for this read goes out as one write per connection
+                await self.flush()
                     
         except asyncio.CancelledError:
             pass
         except Exception as exc:
             logger.error(f"Error handling client {client_id}: {exc}", exc_info=True)
         finally:
+            if heartbeats is not None:
+                heartbeats.cancel()
             writer.close()
             try:
                 await writer.wait_closed()
@@ -181,175 +264,338 @@ class OuchTestServer:
                 pass
             if client_id in self.connections:
                 del self.connections[client_id]
+            session = self.client_sessions.pop(client_id, None)
+            if session is not None and session.writer is writer:
+                session.writer = None
+            self._active.discard(writer)
             logger.info(f"👋 Connection from {peer} closed")
     
-    async def process_frame(self, frame: bytes, writer: asyncio.StreamWriter, client_id: str):
-        """Process a complete SoupBinTCP frame"""
-        if len(frame) < 3:
-            logger.warning(f"Received invalid frame (too short): {frame.hex()}")
-            return
-            
-        # Extract type byte and payload
-        type_byte = frame[2:3]
-        payload = frame[3:]
-        
+    def send(self, writer: asyncio.StreamWriter, frame: bytes):
+        """Queue a frame; it is written on the next flush()"""
+        pending = self._pending.get(writer)
+        if pending is None:
+            self._pending[writer] = [frame]
+        else:
+            pending.append(frame)
+
+    async def flush(self):
+        """Write queued frames with one write per connection, then wait for full buffers"""
+        pending, self._pending = self._pending, {}
+        for writer, frames in pending.items():
+            if writer.is_closing():
+                continue
+            writer.write(b"".join(frames))
+            self._active.add(writer)
+        for writer in pending:
+            if not writer.is_closing():
+                await writer.drain()
+
+    async def heartbeat_loop(self, writer: asyncio.StreamWriter):
+        """Send a ServerHeartbeat whenever a connection saw no other output for one interval"""
+        active = self._active
+        frame = SoupPacketFactory.serialize(ServerHeartbeat())
+        while not writer.is_closing():
+            await asyncio.sleep(self.heartbeat_interval)
+            if writer in active:
+                active.discard(writer)
+            elif not writer.is_closing():
+                writer.write(frame)
+
+    def process_frame(self, type_byte: bytes, payload: memoryview, writer: asyncio.StreamWriter, client_id: str):
+        """Process a complete SoupBinTCP frame, payload is only valid for the duration of the call"""
         try:
+            if type_byte == PacketType.UNSEQUENCED_DATA.value:
+                # Hot path: the OUCH message is the whole payload
+                self.handle_ouch_message(payload, writer, client_id)
+                return
+
+            # session frames are rare, their decoders take bytes
+            payload = bytes(payload)
             msg = SoupPacketFactory.PACKET_TYPES[type_byte].from_bytes(payload)
-            logger.info(f"📥 Received from {client_id}: {type_byte!r} - {msg.__class__.__name__}")
+            if self.verbose:
+                logger.info(f"📥 Received from {client_id}: {type_byte!r} - {msg.__class__.__name__}")
             
             # Handle specific message types
             if type_byte == PacketType.LOGIN_REQUEST.value:
-                await self.handle_login(msg, writer)
+                self.handle_login(msg, writer, client_id)
                 
             elif type_byte == PacketType.CLIENT_HEARTBEAT.value:
                 # Respond with server heartbeat
-                response = ServerHeartbeat()
-                resp_frame = SoupPacketFactory.serialize(response)
-                writer.write(resp_frame)
-                await writer.drain()
-                
-            elif type_byte == PacketType.UNSEQUENCED_DATA.value:
-                # Process OUCH message inside the unsequenced data
-                await self.handle_ouch_message(msg.message, writer)
+                self.send(writer, SoupPacketFactory.serialize(ServerHeartbeat()))
+
+            elif type_byte == PacketType.LOGOUT_REQUEST.value:
+                # the session and its log stay, the client may log in again and resume
+                logger.info(f"🚪 Logout from {client_id}")
+                writer.close()
                 
             # For any other message, we might want to echo it back for testing
             else:
-                writer.write(frame)
-                await writer.drain()
+                self.send(writer, (len(payload) + 1).to_bytes(2, "big") + type_byte + payload)
                 
         except Exception as e:
             logger.error(f"Error processing frame: {e}", exc_info=True)
     
-    async def handle_login(self, msg: LoginRequest, writer: asyncio.StreamWriter):
-        """Process a login request"""
-        logger.info(f"🔑 Login request: username={msg.username}, password={'*' * len(msg.password)}")
-        
-        # Accept all logins for testing purposes
-        response = LoginAccepted(
-            session="TEST" + str(random.randint(1000, 9999)),
-            sequence_number=1
-        )
-        
-        resp_frame = SoupPacketFactory.serialize(response)
-        writer.write(resp_frame)
-        await writer.drain()
-        logger.info(f"✅ Login accepted: {response.session}")
+    def handle_login(self, msg: LoginRequest, writer: asyncio.StreamWriter, client_id: str):
+        """Process a login request, resuming the requested session when there is one"""
+        logger.info(f"🔑 Login request: username={msg.username}, password={'*' * len(msg.password)}, "
+                    f"session={msg.requested_session!r}, seq={msg.requested_sequence_number}")
+
+        if client_id in self.client_sessions:
+            logger.warning(f"Ignoring second login on {client_id}")
+            return
+
+        # Any credentials are accepted; an existing session can only be resumed by its own user
+        if msg.requested_session:
+            session = self.sessions.get(msg.requested_session)
+            if session is None or session.username != msg.username or session.writer is not None:
+                self.send(writer, SoupPacketFactory.serialize(LoginRejected(reason="S")))
+                logger.warning(f"❌ Login rejected: session {msg.requested_session!r} not available")
+                return
+        else:
+            name = "TEST" + str(self.rng.randint(1000, 9999))
+            while name in self.sessions:
+                name = "TEST" + str(self.rng.randint(1000, 9999))
+            session = self.sessions[name] = ServerSession(name, msg.username)
+
+        # 0 (or anything past the end) means "only new messages"
+        seq = msg.requested_sequence_number
+        if seq <= 0 or seq > session.next_seq:
+            seq = session.next_seq
+
+        self.send(writer, SoupPacketFactory.serialize(LoginAccepted(session=session.name, sequence_number=seq)))
+        replay = session.frames_from(seq)
+        if replay:
+            self.send(writer, replay)
+        session.writer = writer
+        self.client_sessions[client_id] = session
+        logger.info(f"✅ Login accepted: {session.name}, replaying {session.next_seq - seq} message(s) from {seq}")
         
         # After login, send a welcome message
-        welcome_msg = f"Welcome to OUCH Test Server! Commands: type 'h' for heartbeat, '?' for help"
-        print(welcome_msg)
+        if self.verbose:
+            welcome_msg = f"Welcome to OUCH Test Server! Commands: type 'h' for heartbeat, '?' for help"
+            print(welcome_msg)
     
-    async def handle_ouch_message(self, data: bytes, writer: asyncio.StreamWriter):
+    def handle_ouch_message(self, data: memoryview, writer: asyncio.StreamWriter, client_id: str):
         """Process an OUCH message inside a SoupBinTCP message"""
         if not data:
             return
+        session = self.client_sessions.get(client_id)
+        if session is None:
+            logger.warning(f"Dropping OUCH message from {client_id} before login")
+            return
+        # orders belong to the SoupBinTCP session, so they survive reconnects
+        owner = session.name
             
         # First byte is the message type
-        type_byte = data[0:1]
+        type_byte = _TYPE_BYTES[data[0]]
         payload = data[1:]
+        verbose = self.verbose
         
-        logger.info(f"🔍 OUCH message: type={type_byte!r}")
+        if verbose:
+            logger.info(f"🔍 OUCH message: type={type_byte!r}")
         
         # Handle specific OUCH message types
         if type_byte == OUCH_OUTBOUND_MSG_TYPE.ENTER_ORDER.value:
             enter_order = EnterOrder.from_soupbin(payload)
-            logger.info(f"📝 Enter Order: token={enter_order.order_token}, "
-                        f"side={enter_order.side}, qty={enter_order.qty}, "
-                        f"price={enter_order.price}")
+            if verbose:
+                logger.info(f"📝 Enter Order: token={enter_order.order_token}, "
+                            f"side={enter_order.side}, qty={enter_order.qty}, "
+                            f"price={enter_order.price}")
                         
-            # Determine response based on server state or random choice
-            action = getattr(self, '_next_action', None)
-            if action is None:
-                # Default behavior: randomly accept or reject
-                action = random.choices(
-                    ['accept', 'reject', 'cancel'], 
-                    weights=[0.8, 0.1, 0.1]
-                )[0]
+            # Manual overrides from the command loop, otherwise the order goes to the book
+            action = self._next_action
+            if action is not None:
+                self._next_action = None
             
-            # Reset for next order
-            self._next_action = None
-            
-            if action == 'accept':
-                await self.send_order_ack(enter_order, writer)
-            elif action == 'reject':
-                await self.send_order_reject(enter_order, writer)
+            if action == 'reject':
+                self.send_order_reject(enter_order, owner)
             elif action == 'cancel':
-                await self.send_cancel_ack(enter_order, writer)
+                self.send_cancel_ack(enter_order, owner)
+            elif self.scenario is None:
+                self.deliver(self.engine.enter(enter_order, owner))
+            else:
+                self.enter_with_scenario(enter_order, owner)
                 
         elif type_byte == OUCH_OUTBOUND_MSG_TYPE.REPLACE_ORDER.value:
             replace_order = ReplaceOrder.from_soupbin(payload)
-            logger.info(f"🔄 Replace Order: old={replace_order.existing_order_token}, "
-                        f"new={replace_order.replacement_order_token}")
-                        
-            # Send a replace ack
-            await self.send_replace_ack(replace_order, writer)
+            if verbose:
+                logger.info(f"🔄 Replace Order: old={replace_order.existing_order_token}, "
+                            f"new={replace_order.replacement_order_token}")
+            if self.scenario is None:
+                self.deliver(self.engine.replace(replace_order, owner))
+            else:
+                self.scenario_respond(replace_order.existing_order_token, replace_order.replacement_order_token,
+                                      owner, lambda: self.engine.replace(replace_order, owner))
             
         elif type_byte == OUCH_OUTBOUND_MSG_TYPE.CANCEL_ORDER.value:
             cancel_order = CancelOrder.from_soupbin(payload)
-            logger.info(f"🗑️ Cancel Order: token={cancel_order.order_token}")
-            
-            # Send a cancel ack
-            await self.send_cancel_ack_by_token(cancel_order.order_token, writer)
+            if verbose:
+                logger.info(f"🗑️ Cancel Order: token={cancel_order.order_token}")
+            if self.scenario is None:
+                self.deliver(self.engine.cancel(cancel_order.order_token, owner))
+            else:
+                self.scenario_respond(cancel_order.order_token, cancel_order.order_token,
+                                      owner, lambda: self.engine.cancel(cancel_order.order_token, owner))
+
+        elif type_byte == OUCH_OUTBOUND_MSG_TYPE.CANCEL_ORDER_BY_ID.value:
+            cancel_order = CancelOrderByID.from_soupbin(payload)
+            if verbose:
+                logger.info(f"🗑️ Cancel Order By ID: book={cancel_order.order_book_id}, id={cancel_order.order_id}")
+            self.deliver(self.engine.cancel_by_id(cancel_order, owner))
             
         # Other OUCH message types could be handled here
+
+    # ── scenario ────────────────────────────────────────────────────────
+
+    def enter_with_scenario(self, enter_order: EnterOrder, owner: str):
+        """Run an EnterOrder through the scenario policy of its book and account"""
+        scenario = self.scenario
+        policy = scenario.policy(enter_order.order_book_id, enter_order.client_account)
+        code = scenario.reject_code(policy)
+        delay = scenario.latency(policy)
+        if code is not None:
+            self.respond([(owner, OrderReject(ts_ns=time.time_ns(), order_token=enter_order.order_token,
+                                                  reject_code=code))], delay, owner)
+            return
+
+        self.respond(self.engine.enter(enter_order, owner), delay, owner)
+        order = self.engine.orders.get((owner, enter_order.order_token))
+        if order is not None:
+            loop = asyncio.get_running_loop()
+            for fill_delay, qty in scenario.fill_plan(policy, order.qty):
+                loop.call_later(delay + fill_delay, self._partial_fill, order, qty)
+
+    def scenario_respond(self, existing_token: str, response_token: str, owner: str, run_engine):
+        """Replace/cancel: use the policy of the order being changed, maybe reject, else run the engine"""
+        scenario = self.scenario
+        order = self.engine.orders.get((owner, existing_token))
+        policy = scenario.policy(order.book_id, order.client_account) if order else scenario.policy(0, "")
+        code = scenario.reject_code(policy)
+        delay = scenario.latency(policy)
+        if code is not None:
+            events = [(owner, OrderReject(ts_ns=time.time_ns(), order_token=response_token, reject_code=code))]
+        else:
+            events = run_engine()
+        self.respond(events, delay, owner)
+
+    def respond(self, events, delay: float, owner: str):
+        """
+        Deliver engine output now or after an injected latency. Responses to
+        one session are never reordered: each is released no earlier than the
+        one before it, like a real gateway.
+        """
+        queue = self._delayed.get(owner)
+        if delay <= 0 and not queue:
+            self.deliver(events)
+            return
+        loop = asyncio.get_running_loop()
+        if queue is None:
+            queue = self._delayed[owner] = deque()
+        release = loop.time() + delay
+        if queue and queue[-1][0] > release:
+            release = queue[-1][0]
+        queue.append((release, events))
+        loop.call_at(release, self._release, owner)
+
+    def _release(self, owner: str):
+        queue = self._delayed.get(owner)
+        now = asyncio.get_running_loop().time()
+        while queue and queue[0][0] <= now:
+            self.deliver(queue.popleft()[1])
+        if not queue:
+            self._delayed.pop(owner, None)
+        asyncio.ensure_future(self.flush())
+
+    def _deliver_now(self, events):
+        self.deliver(events)
+        asyncio.ensure_future(self.flush())
+
+    def _partial_fill(self, order, qty: int):
+        if order.qty == 0:
+            # filled, cancelled or replaced in the meantime
+            return
+        self._deliver_now(self.engine.execute_resting(order, qty))
+
+    async def run_scenario_events(self):
+        """Fire timed scenario events, then stop the server once the scenario duration is up"""
+        start = time.monotonic()
+        for event in self.scenario.events:
+            await asyncio.sleep(max(0.0, start + event["at"] - time.monotonic()))
+            if event["action"] == "disconnect":
+                username = event.get("username")
+                for session in self.sessions.values():
+                    if session.writer is not None and username in (None, session.username):
+                        logger.warning(f"🔌 Scenario: dropping connection of session {session.name}")
+                        session.writer.transport.abort()
+
+        if self.scenario.duration is not None:
+            await asyncio.sleep(max(0.0, start + self.scenario.duration - time.monotonic()))
+            logger.warning("🏁 Scenario finished")
+            self.server.close()
+
+    async def run_flood(self, rate: float, duration: float, burst: int = 0, mix: str = "AEC"):
+        """
+        Push unsolicited messages to every logged in session at `rate` msgs/sec
+        for `duration` seconds, as a steady flow or `burst` messages at a time.
+        Writes wait on drain() like any other output, so a client that can't
+        keep up slows the flood down; the achieved rate is logged at the end.
+        """
+        flood = Flood(mix)
+        loop = asyncio.get_running_loop()
+        interval = burst / rate if burst else FLOOD_TICK
+        logger.warning(f"🌊 Flood: {rate:,.0f} msgs/sec for {duration}s"
+                       + (f" in bursts of {burst}" if burst else "") + f", mix {mix}")
+
+        start = loop.time()
+        sent = 0
+        tick = start
+        while True:
+            now = loop.time()
+            elapsed = now - start
+            if elapsed >= duration:
+                break
+            n = burst if burst else int(rate * elapsed) - sent
+            if n > 0:
+                data, sizes = flood.take(n, time.time_ns())
+                for session in self.sessions.values():
+                    if session.writer is not None:
+                        session.extend(data, sizes)
+                        self.send(session.writer, data)
+                await self.flush()
+                sent += n
+            tick += interval
+            await asyncio.sleep(max(0.0, tick - loop.time()))
+
+        elapsed = loop.time() - start
+        logger.warning(f"🌊 Flood done: {sent:,} msgs per session in {elapsed:.2f}s "
+                       f"({sent / elapsed:,.0f}/s, target {rate:,.0f}/s)")
+
+    def deliver(self, events):
+        """Sequence engine output [(session name, ouch_msg)] and queue it for connected sessions"""
+        sessions = self.sessions
+        for owner, ouch_msg in events:
+            session = sessions[owner]
+            body = ouch_msg.TYPE_ID + ouch_msg.to_soupbin()
+            frame = (len(body) + 1).to_bytes(2, "big") + b"S" + body
+            session.append(frame)
+            if session.writer is not None:
+                self.send(session.writer, frame)
+            if self.verbose:
+                logger.info(f"📤 Sent {type(ouch_msg).__name__} for token {getattr(ouch_msg, 'order_token', '')} "
+                            f"to {owner} seq {session.next_seq - 1}")
     
-    async def send_order_ack(self, enter_order: EnterOrder, writer: asyncio.StreamWriter):
-        """Send an OrderAck response for a received EnterOrder"""
-        order_id = self.next_order_id
-        self.next_order_id += 1
-        
-        ack = OrderAck(
-            ts_ns=int(datetime.now(timezone.utc).timestamp() * 1_000_000_000) & 0xFFFFFFFFFFFFFFFF,  # 8 bytes
-            order_token=enter_order.order_token,
-            order_book_id=enter_order.order_book_id,
-            side=enter_order.side,
-            order_id=order_id,
-            qty=enter_order.qty,
-            price=int(enter_order.price * 100),
-            time_in_force=enter_order.time_in_force,
-            open_close=enter_order.open_close,
-            client_account=enter_order.client_account,
-            order_state=1,  # 1=on book
-            customer_info=enter_order.customer_info,
-            exchange_info=enter_order.exchange_info,
-            pretrade_qty=enter_order.qty,
-            display_qty=enter_order.display_qty,
-            client_category=enter_order.client_category,
-            off_hours=enter_order.off_hours,
-            reserved_bits=b"\x00" * 3
-        )
-        
-        # Wrap in a SequencedData message
-        seq_data = SequencedData(
-            message=OUCH_INBOUND_MSG_TYPE.ORDER_ACK.value + ack.to_soupbin()
-        )
-        
-        frame = SoupPacketFactory.serialize(seq_data)
-        writer.write(frame)
-        await writer.drain()
-        
-        logger.info(f"✅ Sent OrderAck for token {enter_order.order_token}, order_id={order_id}")
-    
-    async def send_order_reject(self, enter_order: EnterOrder, writer: asyncio.StreamWriter):
+    def send_order_reject(self, enter_order: EnterOrder, owner: str):
         """Send an OrderReject response"""
         reject = OrderReject(
             ts_ns=int(datetime.now(timezone.utc).timestamp() * 1_000_000_000),
             order_token=enter_order.order_token,
-            reject_code=random.randint(1, 10)  # Random rejection code
-        )
-        
-        # Wrap in a SequencedData message
-        seq_data = SequencedData(
-            message=OUCH_INBOUND_MSG_TYPE.ORDER_REJECT.value + reject.to_soupbin()
+            reject_code=self.rng.randint(1, 10)  # Random rejection code
         )
         
-        frame = SoupPacketFactory.serialize(seq_data)
-        writer.write(frame)
-        await writer.drain()
-        
+        self.deliver([(owner, reject)])
         logger.info(f"❌ Sent OrderReject for token {enter_order.order_token}")
     
-    async def send_cancel_ack(self, enter_order: EnterOrder, writer: asyncio.StreamWriter):
+    def send_cancel_ack(self, enter_order: EnterOrder, owner: str):
         """Send a CancelAck response for simulation"""
         order_id = self.next_order_id
         self.next_order_id += 1
@@ -363,91 +609,43 @@ class OuchTestServer:
             reason=1  # User requested
         )
         
-        # Wrap in a SequencedData message
-        seq_data = SequencedData(
-            message=OUCH_INBOUND_MSG_TYPE.ORDER_CANCEL_ACK.value + cancel_ack.to_soupbin()
-        )
-        
-        frame = SoupPacketFactory.serialize(seq_data)
-        writer.write(frame)
-        await writer.drain()
-        
+        self.deliver([(owner, cancel_ack)])
         logger.info(f"🗑️ Sent OrderCancelAck for token {enter_order.order_token}")
         
-    async def send_cancel_ack_by_token(self, order_token: str, writer: asyncio.StreamWriter):
-        """Send a CancelAck response for an actual cancel request"""
-        cancel_ack = OrderCancelAck(
-            ts_ns=int(datetime.now(timezone.utc).timestamp() * 1_000_000_000),
-            order_token=order_token,
-            order_book_id=1,  # Default
-            side="B",  # Default 
-            order_id=self.next_order_id,
-            reason=1  # User requested
-        )
-        self.next_order_id += 1
-        
-        # Wrap in a SequencedData message
-        seq_data = SequencedData(
-            message=OUCH_INBOUND_MSG_TYPE.ORDER_CANCEL_ACK.value + cancel_ack.to_soupbin()
-        )
-        
-        frame = SoupPacketFactory.serialize(seq_data)
-        writer.write(frame)
-        await writer.drain()
-        
-        logger.info(f"🗑️ Sent OrderCancelAck for token {order_token}")
-    
-    async def send_replace_ack(self, replace_order: ReplaceOrder, writer: asyncio.StreamWriter):
-        """Send a ReplaceAck response"""
-        replace_ack = OrderReplaceAck(
-            ts_ns=int(datetime.now(timezone.utc).timestamp() * 1_000_000_000),
-            replacement_order_token=replace_order.replacement_order_token,
-            previous_order_token=replace_order.existing_order_token,
-            order_book_id=1,  # Default
-            side="B",  # Default
-            order_id=self.next_order_id,
-            qty=replace_order.qty,
-            price=replace_order.price,
-            time_in_force=0,  # Default
-            open_close=replace_order.open_close,
-            client_account=replace_order.client_account,
-            order_state=1,  # On book
-            customer_info=replace_order.customer_info,
-            exchange_info=replace_order.exchange_info,
-            pretrade_qty=replace_order.qty,
-            display_qty=replace_order.display_qty,
-            client_category=replace_order.client_category
-        )
-        self.next_order_id += 1
-        
-        # Wrap in a SequencedData message
-        seq_data = SequencedData(
-            message=OUCH_INBOUND_MSG_TYPE.ORDER_REPLACE_ACK.value + replace_ack.to_soupbin()
-        )
-        
-        frame = SoupPacketFactory.serialize(seq_data)
-        writer.write(frame)
-        await writer.drain()
-        
-        logger.info(f"🔄 Sent OrderReplaceAck for new token {replace_order.replacement_order_token}")
-    
-    async def start(self):
+    async def flood_when_ready(self, wait: float, **flood):
+        """Start the --flood run once a session is logged in"""
+        while not self.client_sessions:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(wait)
+        await self.run_flood(**flood)
+
+    async def start(self, interactive=True, flood=None):
         """Start the test server"""
         self.server = await asyncio.start_server(
-            self.handle_client, self.host, self.port
+            self.handle_client, self.host, self.port, reuse_port=self.reuse_port or None
         )
         
         addr = ", ".join(str(sock.getsockname()) for sock in self.server.sockets)
-        logger.info(f"🚀 OUCH Test Server started on {addr}")
-        print("\n=== OUCH Test Server ===")
-        print("Press '?' for available commands")
-        print("========================\n")
+        logger.log(logging.INFO if self.verbose else logging.WARNING, f"🚀 OUCH Test Server started on {addr}")
         
+        if self.scenario is not None:
+            asyncio.create_task(self.run_scenario_events())
+        if flood is not None:
+            asyncio.create_task(self.flood_when_ready(**flood))
+
         # Start command input handling
-        asyncio.create_task(self.command_loop())
+        if interactive:
+            print("\n=== OUCH Test Server ===")
+            print("Press '?' for available commands")
+            print("========================\n")
+            asyncio.create_task(self.command_loop())
         
         async with self.server:
-            await self.server.serve_forever()
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                # server.close() from a finished scenario
+                pass
     
     async def command_loop(self):
         """Handle keyboard commands"""
@@ -464,11 +662,51 @@ class OuchTestServer:
                 logger.error(f"Error handling command: {e}", exc_info=True)
 
 
+def run_worker(host, port, perf, scenario_path, seed, heartbeat_interval):
+    """Entry point of an extra --workers process: headless, shares the port via SO_REUSEPORT"""
+    if perf:
+        logger.setLevel(logging.WARNING)
+    scenario = Scenario.load(scenario_path, seed) if scenario_path else None
+    try:
+        asyncio.run(OuchTestServer(host, port, perf=perf, reuse_port=True, scenario=scenario,
+                                   seed=seed, heartbeat_interval=heartbeat_interval).start(interactive=False))
+    except KeyboardInterrupt:
+        pass
+
+
 async def main():
     parser = argparse.ArgumentParser(description="OUCH Test Server")
     parser.add_argument("--host", default=HOST, help=f"Host to bind to (default: {HOST})")
     parser.add_argument("--port", type=int, default=PORT, help=f"Port to listen on (default: {PORT})")
+    parser.add_argument("--perf", action="store_true", help="Turn off per-message logging for load tests")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes sharing the port via SO_REUSEPORT, each with its own order books")
+    parser.add_argument("--scenario", help="Scenario file (JSON or YAML) with response policies and timed events")
+    parser.add_argument("--seed", type=int, help="Seed for all random decisions, overrides the scenario's seed")
+    parser.add_argument("--headless", action="store_true", help="Don't read keyboard commands from stdin")
+    parser.add_argument("--flood", type=float, metavar="RATE",
+                        help="Flood logged in sessions with unsolicited messages at RATE msgs/sec")
+    parser.add_argument("--flood-duration", type=float, default=10.0, help="Seconds to flood (default: 10)")
+    parser.add_argument("--flood-burst", type=int, default=0,
+                        help="Send the flood in bursts of this many messages instead of a steady flow")
+    parser.add_argument("--flood-mix", default="AEC",
+                        help="Message types per flood order: " + ", ".join(f"{k}={v}" for k, v in MIX_TYPES.items()))
+    parser.add_argument("--flood-delay", type=float, default=1.0,
+                        help="Seconds to wait after the first login before flooding (default: 1)")
+    parser.add_argument("--heartbeat-interval", type=float, default=1.0,
+                        help="Seconds of silence before a server heartbeat is sent, 0 to disable (default: 1.0)")
     args = parser.parse_args()
+    scenario = Scenario.load(args.scenario, args.seed) if args.scenario else None
+
+    if args.perf:
+        logger.setLevel(logging.WARNING)
+
+    # Extra workers are spawned (not forked) so they don't inherit this event loop
+    ctx = multiprocessing.get_context("spawn")
+    for _ in range(args.workers - 1):
+        ctx.Process(target=run_worker, args=(args.host, args.port, args.perf, args.scenario, args.seed,
+                                                  args.heartbeat_interval),
+                    daemon=True).start()
     
     # Handle graceful shutdown
     loop = asyncio.get_event_loop()
@@ -477,8 +715,13 @@ async def main():
             OuchTestServer()._cmd_quit())
         )
     
-    server = OuchTestServer(args.host, args.port)
-    await server.start()
+    server = OuchTestServer(args.host, args.port, perf=args.perf, reuse_port=args.workers > 1,
+                            scenario=scenario, seed=args.seed, heartbeat_interval=args.heartbeat_interval)
+    flood = None
+    if args.flood:
+        flood = dict(rate=args.flood, duration=args.flood_duration, burst=args.flood_burst,
+                     mix=args.flood_mix.upper(), wait=args.flood_delay)
+    await server.start(interactive=not args.headless, flood=flood)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+import pytest
+
+from history import INBOUND, MAX_PAGE, OUTBOUND, MessageHistory
+from ouch_msgs import *
+
+
+def enter(n):
+    msg = EnterOrder(f"TOK{n}", 1, "B", n + 1, 10.0, 0, 0, "ACC", "", "", 0, 1, 0)
+    return msg.TYPE_ID + msg.to_soupbin()
+
+
+def cancel(n):
+    msg = CancelOrder(f"TOK{n}")
+    return msg.TYPE_ID + msg.to_soupbin()
+
+
+def reject(n):
+    msg = OrderReject(ts_ns=n, order_token=f"TOK{n}", reject_code=1)
+    return msg.TYPE_ID + msg.to_soupbin()
+
+
+def tokens(page):
+    return [m["order_token"] for m in page["messages"]]
+
+
+def test_append_and_read_back():
+    history = MessageHistory(capacity=8)
+    assert history.append(OUTBOUND, enter(0)) == 0
+    assert history.append(INBOUND, reject(0)) == 1
+    assert history.payload(0) == enter(0)
+    assert history.payload(1) == reject(0)
+    assert history.payload(2) is None
+    row = history.describe(0)
+    assert (row["direction"], row["type"], row["order_token"], row["qty"]) == ("O", "O", "TOK0", 1)
+    assert history.describe(1)["reject_code"] == 1
+
+
+def test_ring_evicts_oldest_at_capacity():
+    history = MessageHistory(capacity=4)
+    for n in range(6):
+        history.append(OUTBOUND, cancel(n))
+    assert (history.first, history.next, len(history)) == (2, 6, 4)
+    assert history.payload(1) is None
+    assert [history.payload(pos) for pos in range(2, 6)] == [cancel(n) for n in range(2, 6)]
+
+
+def test_arena_wraps_and_evicts_overwritten_messages():
+    size = len(enter(0))
+    history = MessageHistory(capacity=100, arena_bytes=size * 3 + size // 2)
+    for n in range(10):
+        history.append(OUTBOUND, enter(n))
+    # only three fit, the wrap drops the ones the new payloads overwrite
+    assert history.first == 7
+    assert [history.payload(pos) for pos in range(7, 10)] == [enter(n) for n in range(7, 10)]
+
+
+def test_mixed_sizes_stay_intact_across_wraps():
+    history = MessageHistory(capacity=100, arena_bytes=400)
+    payloads = [(enter if n % 3 else cancel)(n) for n in range(50)]
+    for payload in payloads:
+        history.append(OUTBOUND, payload)
+    assert history.next == 50
+    for pos in range(history.first, history.next):
+        assert history.payload(pos) == payloads[pos]
+
+
+def test_oversized_payload_is_not_recorded():
+    history = MessageHistory(capacity=4, arena_bytes=64)
+    assert history.append(OUTBOUND, enter(0)) == -1
+    assert history.next == 0
+
+
+def test_query_pages_newest_first():
+    history = MessageHistory(capacity=16)
+    for n in range(10):
+        history.append(OUTBOUND, enter(n))
+    page = history.query(offset=0, limit=3)
+    assert page["total"] == 10
+    assert tokens(page) == ["TOK9", "TOK8", "TOK7"]
+    assert tokens(history.query(offset=3, limit=3)) == ["TOK6", "TOK5", "TOK4"]
+    assert tokens(history.query(offset=8, limit=3)) == ["TOK1", "TOK0"]
+    assert tokens(history.query(offset=20, limit=3)) == []
+    assert tokens(history.query(offset=2, limit=3, newest_first=False)) == ["TOK2", "TOK3", "TOK4"]
+
+
+def test_query_filters():
+    history = MessageHistory(capacity=16)
+    for n in range(6):
+        history.append(OUTBOUND, enter(n))
+        history.append(INBOUND, reject(n))
+    page = history.query(types=["J"], limit=2)
+    assert page["total"] == 6
+    assert [m["type"] for m in page["messages"]] == ["J", "J"]
+    assert history.query(direction="O")["total"] == 6
+    assert history.query(types=["O", "J"], direction="I")["total"] == 6
+    assert history.query(until_ns=0)["total"] == 0
+
+
+def test_query_rejects_bad_arguments():
+    history = MessageHistory(capacity=4)
+    with pytest.raises(ValueError):
+        history.query(offset=-1)
+    with pytest.raises(ValueError):
+        history.query(direction="X")
+    assert history.query(limit=MAX_PAGE * 2)["limit"] == MAX_PAGE
+
+
+def test_spilled_messages_stay_readable(tmp_path):
+    history = MessageHistory(capacity=4, arena_bytes=4096, spill_path=str(tmp_path / "spill"))
+    try:
+        for n in range(10):
+            history.append(OUTBOUND, enter(n))
+        assert (history.spilled, history.first) == (6, 6)
+        assert [history.payload(pos) for pos in range(10)] == [enter(n) for n in range(10)]
+        assert history.describe(0)["order_token"] == "TOK0"
+    finally:
+        history.close()
+
+
+def test_pages_run_across_the_spill_boundary(tmp_path):
+    history = MessageHistory(capacity=4, arena_bytes=4096, spill_path=str(tmp_path / "spill"))
+    try:
+        for n in range(10):
+            history.append(OUTBOUND, enter(n))
+            history.append(INBOUND, reject(n))
+        page = history.query(offset=2, limit=4)
+        assert page["total"] == 20 and page["first"] == 0
+        assert [m["pos"] for m in page["messages"]] == [17, 16, 15, 14]
+        # positions 14 and 15 are on disk, 16 and 17 in memory
+        assert history.spilled == 16
+        page = history.query(offset=13, limit=4, newest_first=False)
+        assert [m["pos"] for m in page["messages"]] == [13, 14, 15, 16]
+
+        page = history.query(types=["O"], offset=0, limit=20, newest_first=False)
+        assert page["total"] == 10
+        assert tokens(page) == [f"TOK{n}" for n in range(10)]
+        assert tokens(history.query(types=["J"], offset=1, limit=3)) == ["TOK8", "TOK7", "TOK6"]
+    finally:
+        history.close()
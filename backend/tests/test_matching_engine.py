@@ -0,0 +1,206 @@
+import pytest
+
+from matching_engine import *
+from ouch_msgs import *
+
+
+def enter(token, side, qty, price, book=1, tif=TIF_DAY):
+    return EnterOrder(token, book, side, qty, price, tif, 0, "ACC", "", "", 0, 1, 0)
+
+
+def replace(existing, replacement, qty, price=0):
+    return ReplaceOrder(existing, replacement, qty, price, 0, "ACC", "", "", 0, 1)
+
+
+def fills(events):
+    return [(owner, msg.order_token, msg.traded_qty, msg.trade_price)
+            for owner, msg in events if isinstance(msg, OrderExecuted)]
+
+
+@pytest.fixture
+def engine():
+    return MatchingEngine(clock=lambda: 1)
+
+
+def test_order_without_counterparty_rests(engine):
+    [(owner, ack)] = engine.enter(enter("b1", "B", 10, 10.0), "s1")
+    assert owner == "s1"
+    assert isinstance(ack, OrderAck)
+    assert (ack.order_state, ack.qty, ack.price) == (STATE_ON_BOOK, 10, 1000)
+    assert engine.depth(1)["bids"] == [(1000, 10, 1)]
+
+
+def test_crossing_order_fills_at_resting_price(engine):
+    engine.enter(enter("s1", "S", 10, 10.0), "a")
+    events = engine.enter(enter("b1", "B", 4, 10.5), "b")
+    assert fills(events) == [("a", "s1", 4, 1000), ("b", "b1", 4, 1000)]
+    ack = events[0][1]
+    assert ack.order_state == STATE_NOT_ON_BOOK
+    assert engine.depth(1) == {"bids": [], "asks": [(1000, 6, 1)], "last_price": 1000}
+    # both sides of a trade share the match id
+    assert events[1][1].match_id == events[2][1].match_id
+
+
+def test_partial_fill_rests_remainder(engine):
+    engine.enter(enter("s1", "S", 10, 10.0), "a")
+    events = engine.enter(enter("b1", "B", 15, 10.0), "b")
+    assert fills(events) == [("a", "s1", 10, 1000), ("b", "b1", 10, 1000)]
+    assert events[0][1].order_state == STATE_ON_BOOK
+    assert engine.depth(1)["bids"] == [(1000, 5, 1)]
+    assert engine.depth(1)["asks"] == []
+    assert ("a", "s1") not in engine.orders
+
+
+def test_price_then_time_priority(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    engine.enter(enter("s2", "S", 5, 10.0), "a")
+    engine.enter(enter("s3", "S", 5, 9.99), "a")
+    events = engine.enter(enter("b1", "B", 12, 10.0), "b")
+    assert [(token, qty, price) for owner, token, qty, price in fills(events) if owner == "a"] == \
+        [("s3", 5, 999), ("s1", 5, 1000), ("s2", 2, 1000)]
+    assert engine.depth(1)["asks"] == [(1000, 3, 1)]
+
+
+def test_books_are_independent(engine):
+    engine.enter(enter("s1", "S", 5, 10.0, book=1), "a")
+    events = engine.enter(enter("b1", "B", 5, 10.0, book=2), "b")
+    assert fills(events) == []
+    assert engine.depth(2)["bids"] == [(1000, 5, 1)]
+
+
+def test_short_sell_is_echoed_as_short_sell(engine):
+    [(_, ack)] = engine.enter(enter("t1", "T", 5, 10.0), "a")
+    assert ack.side == "T"
+    assert engine.depth(1)["asks"] == [(1000, 5, 1)]
+    [(_, replace_ack)] = engine.replace(replace("t1", "t2", 4), "a")
+    assert replace_ack.side == "T"
+    [(_, cancel_ack)] = engine.cancel("t2", "a")
+    assert cancel_ack.side == "T"
+
+
+def test_short_sell_matches_as_a_sell(engine):
+    engine.enter(enter("t1", "T", 5, 10.0), "a")
+    events = engine.enter(enter("b1", "B", 5, 10.0), "b")
+    assert fills(events) == [("a", "t1", 5, 1000), ("b", "b1", 5, 1000)]
+
+
+def test_ioc_remainder_is_cancelled(engine):
+    engine.enter(enter("s1", "S", 3, 10.0), "a")
+    events = engine.enter(enter("b1", "B", 5, 10.0, tif=TIF_IOC), "b")
+    assert fills(events) == [("a", "s1", 3, 1000), ("b", "b1", 3, 1000)]
+    owner, cancel = events[-1]
+    assert isinstance(cancel, OrderCancelAck) and cancel.reason == CANCEL_UNFILLED
+    assert engine.depth(1)["bids"] == []
+
+
+def test_fok_without_enough_liquidity_does_not_trade(engine):
+    engine.enter(enter("s1", "S", 3, 10.0), "a")
+    events = engine.enter(enter("b1", "B", 5, 10.0, tif=TIF_FOK), "b")
+    assert fills(events) == []
+    assert events[0][1].order_state == STATE_NOT_ON_BOOK
+    assert events[1][1].reason == CANCEL_UNFILLED
+    assert engine.depth(1)["asks"] == [(1000, 3, 1)]
+
+
+def test_invalid_orders_are_rejected(engine):
+    engine.enter(enter("b1", "B", 5, 10.0), "a")
+    cases = [(enter("b1", "B", 5, 10.0), REJECT_DUPLICATE_TOKEN), (enter("x1", "Z", 5, 10.0), REJECT_INVALID_SIDE),
+             (enter("x2", "B", 0, 10.0), REJECT_INVALID_QTY), (enter("x3", "B", 5, 0), REJECT_INVALID_PRICE)]
+    for msg, code in cases:
+        [(_, reject)] = engine.enter(msg, "a")
+        assert isinstance(reject, OrderReject) and reject.reject_code == code
+
+
+def test_same_token_from_another_session_is_not_a_duplicate(engine):
+    engine.enter(enter("b1", "B", 5, 10.0), "a")
+    [(_, ack)] = engine.enter(enter("b1", "B", 5, 10.0), "b")
+    assert isinstance(ack, OrderAck)
+
+
+def test_replace_qty_down_keeps_priority(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    engine.enter(enter("s2", "S", 5, 10.0), "a")
+    [(_, ack)] = engine.replace(replace("s1", "s1b", 3), "a")
+    assert isinstance(ack, OrderReplaceAck)
+    assert (ack.previous_order_token, ack.replacement_order_token, ack.qty) == ("s1", "s1b", 3)
+    events = engine.enter(enter("b1", "B", 3, 10.0), "b")
+    assert fills(events)[0][:3] == ("a", "s1b", 3)
+
+
+def test_replace_qty_up_loses_priority(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    engine.enter(enter("s2", "S", 5, 10.0), "a")
+    engine.replace(replace("s1", "s1b", 8), "a")
+    events = engine.enter(enter("b1", "B", 5, 10.0), "b")
+    assert fills(events)[0][:3] == ("a", "s2", 5)
+    assert engine.depth(1)["asks"] == [(1000, 8, 1)]
+
+
+def test_replace_to_crossing_price_trades(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    engine.enter(enter("b1", "B", 5, 9.0), "b")
+    events = engine.replace(replace("b1", "b2", 5, 1000), "b")
+    assert events[0][1].order_state == STATE_NOT_ON_BOOK
+    assert fills(events) == [("a", "s1", 5, 1000), ("b", "b2", 5, 1000)]
+    assert engine.depth(1) == {"bids": [], "asks": [], "last_price": 1000}
+
+
+def test_replace_qty_counts_what_already_traded(engine):
+    engine.enter(enter("s1", "S", 10, 10.0), "a")
+    engine.enter(enter("b1", "B", 4, 10.0), "b")
+    # new total 4 with 4 filled leaves nothing open
+    [(_, reject)] = engine.replace(replace("s1", "s1b", 4), "a")
+    assert reject.reject_code == REJECT_INVALID_QTY
+    [(_, ack)] = engine.replace(replace("s1", "s1b", 7), "a")
+    assert ack.pretrade_qty == 3
+    assert engine.depth(1)["asks"] == [(1000, 3, 1)]
+
+
+def test_replace_rejects(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    engine.enter(enter("s2", "S", 5, 10.0), "a")
+    [(_, reject)] = engine.replace(replace("nope", "x", 5), "a")
+    assert reject.reject_code == REJECT_UNKNOWN_ORDER
+    [(_, reject)] = engine.replace(replace("s1", "s2", 5), "a")
+    assert reject.reject_code == REJECT_DUPLICATE_TOKEN
+    # only the owning session can replace
+    [(_, reject)] = engine.replace(replace("s1", "x", 5), "b")
+    assert reject.reject_code == REJECT_UNKNOWN_ORDER
+
+
+def test_cancel_takes_order_off_the_book(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    [(_, ack)] = engine.cancel("s1", "a")
+    assert isinstance(ack, OrderCancelAck) and ack.reason == CANCEL_BY_USER
+    assert engine.depth(1)["asks"] == []
+    [(_, reject)] = engine.cancel("s1", "a")
+    assert reject.reject_code == REJECT_UNKNOWN_ORDER
+    assert fills(engine.enter(enter("b1", "B", 5, 10.0), "b")) == []
+
+
+def test_cancelled_order_in_the_middle_of_a_level_is_skipped(engine):
+    for token in ("s1", "s2", "s3"):
+        engine.enter(enter(token, "S", 5, 10.0), "a")
+    engine.cancel("s2", "a")
+    events = engine.enter(enter("b1", "B", 10, 10.0), "b")
+    assert [token for owner, token, qty, price in fills(events) if owner == "a"] == ["s1", "s3"]
+    assert engine.depth(1)["asks"] == []
+
+
+def test_cancel_by_id(engine):
+    [(_, ack)] = engine.enter(enter("s1", "S", 5, 10.0), "a")
+    [(_, reject)] = engine.cancel_by_id(CancelOrderByID(1, "S", ack.order_id), "b")
+    assert reject.reject_code == REJECT_UNKNOWN_ORDER
+    [(_, cancel)] = engine.cancel_by_id(CancelOrderByID(1, "S", ack.order_id), "a")
+    assert cancel.order_token == "s1"
+    assert engine.depth(1)["asks"] == []
+
+
+def test_execute_resting(engine):
+    engine.enter(enter("s1", "S", 5, 10.0), "a")
+    order = engine.orders[("a", "s1")]
+    [(_, fill)] = engine.execute_resting(order, 2)
+    assert (fill.traded_qty, fill.trade_price) == (2, 1000)
+    engine.execute_resting(order)
+    assert ("a", "s1") not in engine.orders
+    assert engine.depth(1)["asks"] == []
@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from ouch_msgs import *
+from risk import *
+from transport import OuchClient
+
+
+def enter(token, qty=10, price=10.0, account="ACC", book=1):
+    return EnterOrder(token, book, "B", qty, price, 0, 0, account, "", "", 0, 1, 0)
+
+
+def replace(existing, replacement, qty=10, price=0, account="ACC"):
+    return ReplaceOrder(existing, replacement, qty, price, 0, account, "", "", 0, 1)
+
+
+def executed(token, qty, price=1000, book=1):
+    return OrderExecuted(ts_ns=0, order_token=token, order_book_id=book, traded_qty=qty, trade_price=price,
+                         match_id=1, client_category=1, reserved_bits=b"\x00" * 16)
+
+
+def rejected(engine, msgs) -> RiskRejected:
+    with pytest.raises(RiskRejected) as e:
+        engine.check(msgs)
+    return e.value
+
+
+def test_order_within_limits_is_accepted():
+    engine = RiskEngine({"default": {"max_qty": 100, "max_notional": 10_000, "max_open_orders": 5}})
+    engine.check([enter("T1")])
+    assert engine.accounts["ACC"].open_orders == 1
+    assert engine.tokens.seen("T1")
+
+
+def test_max_qty():
+    engine = RiskEngine({"default": {"max_qty": 100}})
+    e = rejected(engine, [enter("T1", qty=101)])
+    assert (e.code, e.order_token) == (MAX_QTY, "T1")
+    engine.check([enter("T2", qty=100)])
+
+
+def test_max_notional():
+    engine = RiskEngine({"default": {"max_notional": 1000}})
+    assert rejected(engine, [enter("T1", qty=11, price=100.0)]).code == MAX_NOTIONAL
+    engine.check([enter("T2", qty=10, price=100.0)])
+
+
+def test_book_limit_tightens_the_account_limit():
+    engine = RiskEngine({"default": {"max_qty": 100}, "books": {"2": {"max_qty": 10}}})
+    engine.check([enter("T1", qty=50, book=1)])
+    assert rejected(engine, [enter("T2", qty=50, book=2)]).code == MAX_QTY
+
+
+def test_account_overrides_default():
+    engine = RiskEngine({"default": {"max_qty": 10}, "accounts": {"BIG": {"max_qty": 1000}}})
+    engine.check([enter("T1", qty=500, account="BIG")])
+    assert rejected(engine, [enter("T2", qty=500)]).code == MAX_QTY
+
+
+def test_price_collar_around_last_fill():
+    engine = RiskEngine({"default": {"collar_pct": 5}})
+    # no fill yet, nothing to collar against
+    engine.check([enter("T1", price=50.0)])
+    engine.on_ouch_inbound(executed("T1", 1, price=1000))
+    assert rejected(engine, [enter("T2", price=10.6)]).code == PRICE_COLLAR
+    engine.check([enter("T3", price=10.4)])
+
+
+def test_max_open_orders_is_released_by_cancel_reject_and_fill():
+    engine = RiskEngine({"default": {"max_open_orders": 1}})
+    engine.check([enter("T1")])
+    assert rejected(engine, [enter("T2")]).code == MAX_OPEN_ORDERS
+    engine.on_ouch_inbound(OrderCancelAck(ts_ns=0, order_token="T1", order_book_id=1, side="B", order_id=1,
+                                          reason=1))
+    engine.check([enter("T3")])
+    engine.on_ouch_inbound(OrderReject(ts_ns=0, order_token="T3", reject_code=1))
+    engine.check([enter("T4", qty=10)])
+    engine.on_ouch_inbound(executed("T4", 4))
+    assert rejected(engine, [enter("T5")]).code == MAX_OPEN_ORDERS
+    engine.on_ouch_inbound(executed("T4", 6))
+    engine.check([enter("T6")])
+
+
+def test_book_open_orders_count_every_account():
+    engine = RiskEngine({"books": {"1": {"max_open_orders": 1}}})
+    engine.check([enter("T1", account="A")])
+    assert rejected(engine, [enter("T2", account="B")]).code == MAX_OPEN_ORDERS
+
+
+def test_msg_rate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("risk.time.monotonic", lambda: now[0])
+    engine = RiskEngine({"default": {"max_msgs_per_sec": 2}})
+    engine.check([enter("T1")])
+    engine.check([enter("T2")])
+    assert rejected(engine, [enter("T3")]).code == MSG_RATE
+    now[0] += 0.5
+    engine.check([enter("T4")])
+
+
+def test_duplicate_token():
+    engine = RiskEngine()
+    engine.check([enter("T1")])
+    e = rejected(engine, [enter("T1")])
+    assert (e.code, e.order_token) == (DUPLICATE_TOKEN, "T1")
+    # a replacement can't reuse a token either
+    assert rejected(engine, [replace("T1", "T1")]).code == DUPLICATE_TOKEN
+
+
+def test_rejected_basket_gives_back_what_its_legs_took():
+    engine = RiskEngine({"default": {"max_qty": 100, "max_open_orders": 2}})
+    e = rejected(engine, [enter("T1"), enter("T2", qty=1000)])
+    assert (e.code, e.order_token) == (MAX_QTY, "T2")
+    assert engine.accounts["ACC"].open_orders == 0
+    assert "T1" not in engine.orders
+    assert not engine.tokens.seen("T1")
+    # the first leg's token can be sent again
+    engine.check([enter("T1"), enter("T2")])
+    assert engine.accounts["ACC"].open_orders == 2
+
+
+def test_rejected_basket_refunds_the_rate(monkeypatch):
+    monkeypatch.setattr("risk.time.monotonic", lambda: 1000.0)
+    engine = RiskEngine({"default": {"max_msgs_per_sec": 2, "max_qty": 100}})
+    rejected(engine, [enter("T1"), enter("T2", qty=1000)])
+    engine.check([enter("T3"), enter("T4")])
+
+
+def test_replace_moves_the_open_order_slot():
+    engine = RiskEngine({"default": {"max_open_orders": 1, "max_qty": 100}})
+    engine.check([enter("T1")])
+    # a replace is checked against the same per-order limits
+    assert rejected(engine, [replace("T1", "T2", qty=1000)]).code == MAX_QTY
+    engine.check([replace("T1", "T2", qty=20)])
+    engine.on_ouch_inbound(OrderReplaceAck(
+        ts_ns=0, replacement_order_token="T2", previous_order_token="T1", order_book_id=1, side="B", order_id=1,
+        qty=20, price=1000, time_in_force=0, open_close=0, client_account="ACC", order_state=1, customer_info="",
+        exchange_info="", pretrade_qty=20, display_qty=0, client_category=1))
+    assert engine.accounts["ACC"].open_orders == 1
+    assert "T1" not in engine.orders
+    engine.on_ouch_inbound(executed("T2", 20))
+    assert engine.accounts["ACC"].open_orders == 0
+
+
+def test_cancels_are_never_rejected():
+    engine = RiskEngine({"default": {"max_open_orders": 0}})
+    engine.check([CancelOrder("T1")])
+
+
+def test_unknown_limit_key_is_an_error():
+    with pytest.raises(ValueError):
+        RiskEngine({"default": {"max_quantity": 1}})
+
+
+def test_reject_is_counted_and_serialised():
+    engine = RiskEngine({"default": {"max_qty": 1}})
+    e = rejected(engine, [enter("T1", qty=2)])
+    assert engine.rejects == 1
+    assert e.to_dict() == {"code": MAX_QTY, "reason": "Quantity 2 exceeds 1", "order_token": "T1"}
+
+
+def test_malformed_order_is_not_charged():
+    async def run():
+        client = OuchClient()
+        client.risk = RiskEngine()
+        with pytest.raises(ValueError):
+            await client.send_ouch_msg(enter("T1", qty=-5))
+        # the same token goes through once the order is fixed
+        written = client.send_ouch_msg(enter("T1", qty=5))
+        assert not written.done()
+        assert client.send_q.qsize() == 1
+
+    asyncio.run(run())
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+import tokens
+from ouch_msgs import *
+from tokens import TOKEN_LEN, TokenAllocator, day_prefix
+
+
+@pytest.fixture
+def state(tmp_path):
+    return str(tmp_path / "tokens.json")
+
+
+def allocator(path=None, **kwargs):
+    # a small filter keeps the tests fast, the real one is 2 MiB
+    return TokenAllocator(path, prefix="TZZZ", checkpoint_every=10, bloom_bits=1 << 12, **kwargs)
+
+
+def test_tokens_are_unique_and_fixed_width():
+    alloc = allocator()
+    handed_out = [alloc.next() for _ in range(3000)]
+    assert len(set(handed_out)) == 3000
+    assert all(len(t) == TOKEN_LEN and t.startswith("TZZZ") for t in handed_out)
+    assert handed_out[:2] == ["TZZZ0000000000", "TZZZ0000000001"]
+    assert handed_out[1296] == "TZZZ0000000100"
+
+
+def test_day_prefix():
+    assert day_prefix().startswith("T") and len(day_prefix()) == 4
+
+
+def test_restart_resumes_past_every_handed_out_token(state):
+    first = allocator(state)
+    handed_out = {first.next() for _ in range(25)}
+    # no checkpoint: the blocks reserved on the way cover what was handed out
+    second = allocator(state)
+    assert second.next_value >= first.next_value
+    assert not handed_out & {second.next() for _ in range(25)}
+
+
+def test_state_of_another_day_is_ignored(state):
+    allocator(state).next()
+    other = TokenAllocator(state, prefix="TYYY", checkpoint_every=10, bloom_bits=1 << 12)
+    assert other.next() == "TYYY0000000000"
+
+
+def test_checkpoint_reserves_ahead_so_next_does_not_write(state, monkeypatch):
+    alloc = allocator(state)
+    writes = []
+    real = tokens._write_durably
+    monkeypatch.setattr(tokens, "_write_durably", lambda path, data: (writes.append(path), real(path, data)))
+    for _ in range(15):
+        alloc.next()
+        if alloc.reserved - alloc.next_value < alloc.checkpoint_every:
+            alloc.checkpoint()
+    assert writes == [state]
+    with open(state) as f:
+        assert json.load(f)["reserved"] == alloc.reserved
+    writes.clear()
+    for _ in range(alloc.reserved - alloc.next_value):
+        alloc.next()
+    assert writes == []
+    # only a burst past the reservation writes on the order path
+    alloc.next()
+    assert writes == [state]
+
+
+def test_sent_tokens_are_seen():
+    alloc = allocator()
+    own = alloc.next()
+    assert not alloc.seen(own)
+    alloc.add(own)
+    assert alloc.seen(own)
+    alloc.add("UI-TOKEN-1")
+    assert alloc.seen("UI-TOKEN-1")
+    assert not alloc.seen("UI-TOKEN-2")
+    alloc.discard(own)
+    alloc.discard("UI-TOKEN-1")
+    assert not alloc.seen(own) and not alloc.seen("UI-TOKEN-1")
+
+
+def test_non_canonical_spelling_is_not_an_own_token():
+    alloc = allocator()
+    alloc.add(alloc.next())
+    assert not alloc.seen("TZZZ000000000a")
+    alloc.add("TZZZ000000000a")
+    assert alloc.seen("TZZZ000000000a")
+    assert "TZZZ000000000a" in alloc.others
+
+
+def test_own_token_sent_ahead_of_the_counter_is_skipped():
+    alloc = allocator()
+    alloc.add("TZZZ0000000002")
+    assert alloc.seen("TZZZ0000000002")
+    assert [alloc.next() for _ in range(3)] == ["TZZZ0000000000", "TZZZ0000000001", "TZZZ0000000003"]
+    # still a duplicate once the counter has gone past it
+    assert alloc.seen("TZZZ0000000002")
+
+
+def test_tokens_sent_ahead_survive_a_restart(state):
+    first = allocator(state)
+    ahead = "TZZZ00000000" + "ZZ"
+    first.add(ahead)
+    first.checkpoint()
+    second = allocator(state)
+    assert second.seen(ahead)
+    while second.next_value <= int("ZZ", 36) + 1:
+        assert second.next() != ahead
+
+
+def test_earlier_run_tokens_are_seen_after_restart(state):
+    first = allocator(state)
+    sent = first.next()
+    first.add(sent)
+    first.add("UI-TOKEN-1")
+    first.checkpoint()
+
+    second = allocator(state)
+    assert second.restored
+    assert second.seen(sent)
+    assert second.seen("UI-TOKEN-1")
+    assert not second.seen("UI-TOKEN-2")
+
+
+def test_ui_tokens_since_the_last_checkpoint_are_lost_on_restart(state):
+    first = allocator(state)
+    first.add("UI-TOKEN-1")
+    first.checkpoint()
+    first.add("UI-TOKEN-2")
+    second = allocator(state)
+    assert second.seen("UI-TOKEN-1")
+    assert not second.seen("UI-TOKEN-2")
+
+
+def test_assign_fills_missing_tokens_only():
+    alloc = allocator()
+    enter = EnterOrder("", 1, "B", 1, 10.0, 0, 0, "ACC", "", "", 0, 1, 0)
+    given = EnterOrder("MINE", 1, "B", 1, 10.0, 0, 0, "ACC", "", "", 0, 1, 0)
+    replace = ReplaceOrder("MINE", "", 1, 0, 0, "ACC", "", "", 0, 1)
+    cancel = CancelOrder("MINE")
+    assert alloc.assign([enter, given, replace, cancel]) == ["TZZZ0000000000", "MINE", "TZZZ0000000001", "MINE"]
+    assert enter.order_token == "TZZZ0000000000"
+    assert replace.replacement_order_token == "TZZZ0000000001"
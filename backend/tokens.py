@@ -0,0 +1,254 @@
+"""Order token allocation (day prefix plus a checkpointed base-36 counter) and the day's used tokens."""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+from typing import Iterable, List, Optional
+
+from ouch_msgs import *
+
+logger = logging.getLogger(__name__)
+
+TOKEN_LEN = 14
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# every two-digit base-36 string, the low digits of a token come from here
+_PAIRS = [a + b for a in DIGITS for b in DIGITS]
+
+
+def to_base36(n: int, width: int) -> str:
+    out = []
+    while n:
+        n, r = divmod(n, 36)
+        out.append(DIGITS[r])
+    return "".join(reversed(out)).rjust(width, "0")
+
+
+def day_prefix(day: Optional[datetime.date] = None) -> str:
+    """"T" plus days since 2000-01-01 in base 36, 3 digits last until 2127"""
+    day = day or datetime.date.today()
+    return "T" + to_base36((day - datetime.date(2000, 1, 1)).days, 3)
+
+
+class BloomFilter:
+
+    def __init__(self, bits: int = 1 << 24, hashes: int = 7, data: Optional[bytes] = None):
+        if bits & (bits - 1):
+            raise ValueError(f"Bloom filter size must be a power of two, got {bits}")
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray(data) if data is not None else bytearray(bits // 8)
+        self._mask = bits - 1
+        # the hash must be stable across processes since the filter is saved, so not hash()
+        self._steps = range(hashes)
+
+    def _positions(self, key: str):
+        # double hashing: k positions from the two 64-bit halves of one digest
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=16).digest(), "little")
+        h1, h2, mask = h & 0xFFFFFFFFFFFFFFFF, (h >> 64) | 1, self._mask
+        return [(h1 + i * h2) & mask for i in self._steps]
+
+    def add(self, key: str):
+        array = self.array
+        for p in self._positions(key):
+            array[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: str) -> bool:
+        array = self.array
+        for p in self._positions(key):
+            if not array[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+class TokenAllocator:
+
+    def __init__(self, path: Optional[str] = None, prefix: Optional[str] = None, checkpoint_every: int = 10000,
+                 bloom_bits: int = 1 << 24, bloom_hashes: int = 7):
+        self.prefix = prefix or day_prefix()
+        if not 0 < len(self.prefix) < TOKEN_LEN - 2:
+            raise ValueError(f"Token prefix {self.prefix!r} must be 1-{TOKEN_LEN - 3} characters")
+        self.width = TOKEN_LEN - len(self.prefix)
+        self.limit = 36 ** self.width
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+
+        self.next_value = 0
+        self.reserved = 0       # counter values below this are covered by the checkpoint
+        self.ahead = set()      # own tokens sent before the counter got to them, next() skips them
+        data = None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("prefix") == self.prefix:
+                self.next_value = self.reserved = state["reserved"]
+                self.ahead = {t for t in state.get("ahead", ()) if self._own(t) >= self.reserved}
+                bloom_path = path + ".bloom"
+                if os.path.exists(bloom_path):
+                    with open(bloom_path, "rb") as f:
+                        data = f.read()
+                    if len(data) * 8 != bloom_bits:
+                        data = None
+        self.start = self.next_value      # own tokens below this were handed out by an earlier run
+        self.used = bytearray()           # bit per own counter value from start on, set once sent
+        self.others = set()               # tokens sent that this allocator didn't hand out
+        self.bloom = BloomFilter(bloom_bits, bloom_hashes, data)
+        self.restored = data is not None
+        self._pending = []                # tokens added since the filter was last saved
+        self._ahead_saved = len(self.ahead)
+
+        self._high = None                 # cached prefix + digits above the last two
+        self._high_value = -1
+        if path:
+            self._reserve()
+            logger.info(f"🔖 Order tokens {self.prefix}*, resuming at {self.next_value}")
+
+    # ── allocation ──────────────────────────────────────────────────────
+
+    def next(self) -> str:
+        """A token that was never handed out or sent before"""
+        while True:
+            n = self.next_value
+            if n >= self.reserved and self.path:
+                # checkpoint() normally reserves ahead, this only happens if a burst outruns it
+                self._reserve()
+            if n >= self.limit:
+                raise RuntimeError(f"Token space for prefix {self.prefix} is exhausted")
+            self.next_value = n + 1
+            high, low = divmod(n, 1296)
+            if high != self._high_value:
+                self._high_value = high
+                self._high = self.prefix + to_base36(high, self.width - 2)
+            token = self._high + _PAIRS[low]
+            if token not in self.ahead:
+                return token
+
+    def _reserve(self):
+        # two blocks, so the counter is still a block short of the end at the next checkpoint
+        reserved = self.next_value + 2 * self.checkpoint_every
+        self._write_state(reserved)
+        # only handed out once the file that covers it is on disk
+        self.reserved = reserved
+
+    def _write_state(self, reserved: int):
+        state = {"prefix": self.prefix, "reserved": reserved, "ahead": sorted(self.ahead)}
+        _write_durably(self.path, json.dumps(state).encode())
+        self._ahead_saved = len(self.ahead)
+
+    def checkpoint(self):
+        """Reserve the next block of counter values if the current one runs low, and save the Bloom filter if it changed"""
+        if not self.path:
+            return
+        if self.reserved - self.next_value < self.checkpoint_every:
+            self._reserve()
+        elif len(self.ahead) != self._ahead_saved:
+            self._write_state(self.reserved)
+        if self._pending:
+            for token in self._pending:
+                self.bloom.add(token)
+            self._pending = []
+            _write_durably(self.path + ".bloom", self.bloom.array)
+
+    # ── duplicate tracking ──────────────────────────────────────────────
+
+    def _own(self, token: str) -> int:
+        """Counter value of one of our tokens, -1 for anything else"""
+        if len(token) != TOKEN_LEN or not token.startswith(self.prefix):
+            return -1
+        digits = token[len(self.prefix):]
+        # only the canonical spelling is ours, int() would also take lower case, signs and underscores
+        if not (digits.isascii() and digits.isalnum() and digits == digits.upper()):
+            return -1
+        return int(digits, 36)
+
+    def seen(self, token: str) -> bool:
+        """Has this token been sent today"""
+        n = self._own(token)
+        if n >= 0:
+            if n < self.start:
+                return True
+            i = n - self.start
+            if i >> 3 < len(self.used) and self.used[i >> 3] & (1 << (i & 7)):
+                return True
+            return token in self.ahead
+        if token in self.others:
+            return True
+        # the filter only knows more than the exact set when it was restored from an earlier run
+        return self.restored and token in self.bloom
+
+    def add(self, token: str):
+        """Mark a token as sent"""
+        n = self._own(token)
+        if n >= self.next_value:
+            # picked by hand ahead of the counter, the bitmap only covers values handed out
+            self.ahead.add(token)
+        elif n >= self.start:
+            i = n - self.start
+            used = self.used
+            if i >> 3 >= len(used):
+                used.extend(bytes((i >> 3) - len(used) + 1))
+            used[i >> 3] |= 1 << (i & 7)
+        elif n < 0:
+            self.others.add(token)
+            if self.path:
+                # hashed into the filter at the next checkpoint, off the order path
+                self._pending.append(token)
+
+    def discard(self, token: str):
+        """Unmark a token that was not sent after all (the Bloom filter keeps it)"""
+        n = self._own(token)
+        if n >= self.start:
+            i = n - self.start
+            if i >> 3 < len(self.used):
+                self.used[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+            self.ahead.discard(token)
+        elif n < 0:
+            self.others.discard(token)
+
+    def assign(self, ouch_msgs: Iterable) -> List[str]:
+        """Fill in missing order tokens (replacement tokens for replaces), returning each message's token"""
+        tokens = []
+        for msg in ouch_msgs:
+            if isinstance(msg, ReplaceOrder):
+                if not msg.replacement_order_token:
+                    msg.replacement_order_token = self.next()
+                tokens.append(msg.replacement_order_token)
+            elif isinstance(msg, (EnterOrder, MassQuote)):
+                if not msg.order_token:
+                    msg.order_token = self.next()
+                tokens.append(msg.order_token)
+            else:
+                tokens.append(getattr(msg, "order_token", None))
+        return tokens
+
+    def stats(self) -> dict:
+        return {"prefix": self.prefix, "next": self.next_value, "reserved": self.reserved,
+                "ahead": len(self.ahead), "others": len(self.others), "restored": self.restored}
+
+
+def _write_durably(path: str, data: bytes):
+    """Replace a file atomically, fsynced so the new content survives a crash"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # the rename itself is only durable once the directory is synced
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def checkpoint_periodically(allocator: TokenAllocator, interval: float):
+    """Checkpoint the allocator every interval seconds, which keeps file writes off the order path"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            allocator.checkpoint()
+        except OSError as e:
+            logger.error(f"Could not checkpoint order tokens: {e}")
@@ -3,62 +3,138 @@ from soupbin_msgs import *
 import os
 import logging
 import json
+import struct
+import time
 from heartbeat_controller import HeartbeatController
 from ouch_msgs import OUCH_MessageFactory
+from ipc_codec import JsonCodec
+from metrics import REGISTRY, LATENCY_BUCKETS
+from history import INBOUND, OUTBOUND
+from risk import RiskRejected
+from util import encode_ouch_messages
+
+FRAMES_IN = REGISTRY.counter("ouch_frames_in_total", "SoupBinTCP frames received", ("type",))
+BYTES_IN = REGISTRY.counter("ouch_bytes_in_total", "SoupBinTCP bytes received, framing included", ("type",))
+FRAMES_OUT = REGISTRY.counter("ouch_frames_out_total", "SoupBinTCP frames written", ("type",))
+BYTES_OUT = REGISTRY.counter("ouch_bytes_out_total", "SoupBinTCP bytes written, framing included", ("type",))
+DECODE_ERRORS = REGISTRY.counter("decode_errors_total", "Messages that could not be decoded", ("source",))
+EVENTS_PUBLISHED = REGISTRY.counter("ipc_events_published_total", "Events published on the PUB socket", ("kind",))
+BYTES_PUBLISHED = REGISTRY.counter("ipc_bytes_published_total", "Encoded event bytes published on the PUB socket")
+ENCODE_SECONDS = REGISTRY.histogram("ipc_encode_seconds", "Time to encode one published event",
+                                    LATENCY_BUCKETS, ("codec",))
+
+# children per packet type byte, so the per-frame update is one attribute add
+_IN = {t[0]: (FRAMES_IN.labels(t.decode()), BYTES_IN.labels(t.decode())) for t in SoupPacketFactory.PACKET_TYPES}
+_OUT = {t: (FRAMES_OUT.labels(t.decode()), BYTES_OUT.labels(t.decode())) for t in SoupPacketFactory.PACKET_TYPES}
 
 
 class OuchClient(asyncio.Protocol):
 
     hb: Optional["HeartbeatController"] = None
+    positions: Optional["PositionAggregator"] = None
+    strategies: Optional["StrategyRunner"] = None
+    profiler: Optional["Profiler"] = None
+    history: Optional["MessageHistory"] = None
+    index: Optional["MessageIndex"] = None
+    risk: Optional["RiskEngine"] = None
+    tokens: Optional["TokenAllocator"] = None
 
-    def __init__(self, pub):
+    def __init__(self, pub=None):
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
+        # per-message logs are DEBUG, DEBUG=false in .env keeps them off the hot path
+        debug = os.getenv("DEBUG", "true").lower() in ("1", "true", "yes")
+        self.logger.setLevel(logging.DEBUG if debug else logging.INFO)
         self.transport = None
+        self._writer_task = None
         self._buffer = bytearray()
         self.send_q = asyncio.Queue()
+        # sequence number of the next SequencedData message we expect from the server
         self.next_seq = 0
+        self.session = ""
+        # username that owns self.session; a reconnect with the same user resumes it
+        self._session_user = None
+        self._login_user = None
+        # None when running headless (see sdk.OuchSession), events are then not published
         self.pub = pub
+        # Login credentials, falling back to TEST_USERNAME/TEST_PASSWORD
+        self.username = None
+        self.password = None
+        # resolved on LoginAccepted, failed on LoginRejected; created per connection
+        self.logged_in: Optional[asyncio.Future] = None
+        # IPC encoding for published events, renegotiated by the frontend's CONN hello
+        self.codec = JsonCodec
+        # components notified of every decoded OUCH message, see add_observer
+        self.observers = []
+        # pre-encoded EnterOrder templates by name, see send_template
+        self.templates = {}
 
     def connection_made(self, transport: asyncio.Transport):
         self.transport = transport
         # Initiate writer coroutine
-        asyncio.create_task(self._writer())
+        self._writer_task = asyncio.create_task(self._writer())
 
-        test_username = os.getenv("TEST_USERNAME", "default_user")
-        test_password = os.getenv("TEST_PASSWORD", "default_pass")
-        # Send a login request
-        asyncio.create_task(self.send_q.put(LoginRequest(username=test_username, password=test_password)))
+        self.logged_in = asyncio.get_running_loop().create_future()
+        username = self.username or os.getenv("TEST_USERNAME", "default_user")
+        password = self.password or os.getenv("TEST_PASSWORD", "default_pass")
+        # Send a login request, asking to resume the previous session where we left off
+        if self.session and self._session_user == username:
+            login = LoginRequest(username=username, password=password,
+                                 requested_session=self.session, requested_sequence_number=self.next_seq)
+        else:
+            login = LoginRequest(username=username, password=password)
+        self._login_user = username
+        self.send_outgoing_msg(login)
 
     def data_received(self, data: bytes):
-        self._buffer.extend(data)
+        buf = self._buffer
+        buf.extend(data)
 
-        while True:
-            try:
-                msg, consumed = SoupPacketFactory.parse_frame(memoryview(self._buffer))
-            except KeyError:
-                raise ValueError("Unknown type byte in frame")
-            if consumed == 0:
-                break
-            # advance 
-            del self._buffer[:consumed]
-            
-            self.handle_incoming_message(msg)
+        # locate all complete frames first, then drop the consumed prefix once per read
+        frames, consumed = SoupPacketFactory.split_frames(buf)
+        if not frames:
+            return
+        packet_types = SoupPacketFactory.PACKET_TYPES_BY_BYTE
+        with memoryview(buf) as view:
+            payloads = [(packet_types.get(type_id), type_id, bytes(view[start:end]))
+                        for type_id, start, end in frames]
+        del buf[:consumed]
+
+        for pkt_cls, type_id, payload in payloads:
+            counters = _IN.get(type_id)
+            if pkt_cls is None:
+                DECODE_ERRORS.labels("soupbin").inc()
+                raise ValueError(f"Unknown packet type {bytes([type_id])!r}")
+            counters[0].value += 1
+            counters[1].value += len(payload) + 3
+            self.handle_incoming_message(pkt_cls.from_bytes(payload))
 
     def connection_lost(self, exc):
         self.on_disconnect(exc)
 
     async def _writer(self):
         while True:
-            msg = await self.send_q.get()
-            frame = SoupPacketFactory.serialize(msg)
+            msg, written = await self.send_q.get()
+            if self.transport is None or self.transport.is_closing():
+                if written is not None and not written.done():
+                    written.set_exception(ConnectionError("Not connected"))
+                    # fire-and-forget senders never look at the future, don't log it as unretrieved
+                    written.exception()
+                continue
+            # batches arrive pre-framed from send_ouch_batch
+            frame = msg if isinstance(msg, bytes) else SoupPacketFactory.serialize(msg)
     
-            assert self.transport is not None 
             self.transport.write(frame)
-            self.logger.debug(f"Sent: {msg}")
-            if isinstance(msg, SequencedData):
-                self.next_seq += 1
-                self.logger.info(f"📤 Incremented SeqNo to: {self.next_seq}")
+            if written is not None and not written.done():
+                written.set_result(len(frame))
+            if isinstance(msg, bytes):
+                # batch frames are counted in send_ouch_batch
+                _OUT[PacketType.UNSEQUENCED_DATA.value][1].value += len(frame)
+                self.logger.debug("Sent batch of %d bytes", len(frame))
+            else:
+                counters = _OUT[msg.TYPE_ID]
+                counters[0].value += 1
+                counters[1].value += len(frame)
+                self.logger.debug("Sent: %s", msg)
     
 
     # will send received acks and heartbeats
@@ -67,7 +143,7 @@ class OuchClient(asyncio.Protocol):
     def handle_incoming_message(self, msg):
         """Handle incoming messages."""
         # if(msg.TYPE_ID != PacketType.SERVER_HEARTBEAT.value):
-        self.logger.debug(f"Received message: {msg}")
+        self.logger.debug("Received message: %s", msg)
         
         if isinstance(msg, ServerHeartbeat):
             if self.hb:
@@ -79,38 +155,226 @@ class OuchClient(asyncio.Protocol):
 
         if isinstance(msg, LoginAccepted):
             self.next_seq = msg.sequence_number
+            self.session = msg.session
+            self._session_user = self._login_user
             self.logger.info("✅ Login accepted setting next seq number to " + str(self.next_seq))
+            if self.logged_in is not None and not self.logged_in.done():
+                self.logged_in.set_result(msg)
 
         if isinstance(msg, LoginRejected):
             self.logger.warning(f"❌ Login rejected: {msg.reason}")
+            if msg.reason == "S":
+                # the session we asked for is gone, the next login starts a fresh one
+                self.session = ""
+                self.next_seq = 0
+            if self.logged_in is not None and not self.logged_in.done():
+                self.logged_in.set_exception(ConnectionRefusedError(f"Login rejected: {msg.reason}"))
 
          # Promote to OUCH Handlers   
         if isinstance(msg, SequencedData):
+            self.next_seq += 1
+            if self.history is not None:
+                self.history.append(INBOUND, msg.message)
             # self.logger.info(f"📊 Sequenced data: {msg}")
-            ouch_msg = OUCH_MessageFactory.create_message(msg.message) # may need some slicing debug later
-            
+            try:
+                ouch_msg = OUCH_MessageFactory.create_inbound_message(msg.message)
+            except (ValueError, struct.error, UnicodeDecodeError) as e:
+                # the sequence number is still consumed, only this message is lost
+                DECODE_ERRORS.labels("ouch").inc()
+                self.logger.error(f"Could not decode OUCH message {bytes(msg.message[:1])!r}: {e}")
+                ouch_msg = None
+
             if ouch_msg:
-                self.logger.info(f"📊 Processed OUCH message: {ouch_msg}")
+                self.logger.debug("📊 Processed OUCH message: %s", ouch_msg)
+                for obs in self.observers:
+                    obs.on_ouch_inbound(ouch_msg, len(msg.message))
 
-                payload = {k: v for k, v in ouch_msg.__dict__.items() if k != "reserved_bits"}
-                self.send_event("Type: " + ouch_msg.TYPE_ID.decode(), payload)
+                if self.pub is not None:
+                    payload = {k: v for k, v in ouch_msg.__dict__.items() if k != "reserved_bits"}
+                    self.send_event("Type: " + ouch_msg.TYPE_ID.decode(), payload)
 
         if isinstance(msg, UnsequencedData):
             self.logger.info(f"📈 Unsequenced data: {msg}")
  
         # self.send_event("message_received", {"type": "incoming", "content": str(msg)})
 
-    def send_outgoing_msg(self, msg):
-        """Relay a message to the server."""
-        
-        asyncio.create_task(self.send_q.put(msg))
+    def send_outgoing_msg(self, msg, written: Optional[asyncio.Future] = None):
+        """
+        Relay a message to the server. If given, `written` resolves with the
+        frame size once the frame has been handed to the transport.
+        """
+        self.send_q.put_nowait((msg, written))
+
+    def pretrade(self, ouch_msgs):
+        """
+        Run the pre-trade risk checks on messages about to be sent, all or
+        nothing. A breach is published as a RiskReject event and raised as
+        RiskRejected.
+        """
+        if self.risk is None:
+            return
+        try:
+            self.risk.check(ouch_msgs)
+        except RiskRejected as e:
+            self.logger.warning(f"🛑 Risk reject {e.code} for {e.order_token or 'order'}: {e}")
+            self.send_event("RiskReject", e.to_dict())
+            raise
+
+    def send_ouch_msg(self, ouch_msg) -> asyncio.Future:
+        """
+        Wrap an OUCH message in UnsequencedData and relay it to the server.
+        Returns a future that resolves once the frame is written to the wire,
+        or fails with ValueError if the message doesn't encode and with
+        RiskRejected if the pre-trade checks stop it.
+        """
+        # encoded before the risk checks charge for it, so a malformed order leaves no trace
+        try:
+            (ouch_payload,) = encode_ouch_messages((ouch_msg,))
+        except ValueError as e:
+            return self._failed(e)
+        if self.risk is not None:
+            try:
+                self.pretrade((ouch_msg,))
+            except RiskRejected as e:
+                return self._failed(e)
+        if self.history is not None:
+            self.history.append(OUTBOUND, ouch_payload)
+        for obs in self.observers:
+            obs.on_ouch_outbound(ouch_msg, len(ouch_payload))
+        written = asyncio.get_running_loop().create_future()
+        self.send_outgoing_msg(UnsequencedData(message=ouch_payload), written)
+        return written
+
+    def send_template(self, template: "OrderTemplate", qty: int, price: float,
+                      order_token: str = "") -> asyncio.Future:
+        """
+        Send an EnterOrder from a pre-encoded OrderTemplate, patching only the
+        token, qty and price into its frame. A missing token comes from the
+        TokenAllocator. Risk checks, history and observers see the order like
+        any other; the future is as for send_ouch_msg.
+        """
+        if not order_token:
+            if self.tokens is None:
+                return self._failed(ValueError("An order token is required without a TokenAllocator"))
+            # an order that can't be encoded doesn't burn a token
+            try:
+                template.check(qty, price)
+            except ValueError as e:
+                return self._failed(e)
+            order_token = self.tokens.next()
+        # rendering first validates the fields before the risk checks charge for the order
+        try:
+            frame = template.render(order_token, qty, price)
+        except ValueError as e:
+            return self._failed(e)
+        ouch_msg = template.message(order_token, qty, price)
+        if self.risk is not None:
+            try:
+                self.pretrade((ouch_msg,))
+            except RiskRejected as e:
+                return self._failed(e)
+        if self.history is not None:
+            self.history.append(OUTBOUND, template.payload)
+        for obs in self.observers:
+            obs.on_ouch_outbound(ouch_msg, template.size)
+
+        written = asyncio.get_running_loop().create_future()
+        counters = _OUT[PacketType.UNSEQUENCED_DATA.value]
+        counters[0].value += 1
+        transport = self.transport
+        if self.send_q.empty() and transport is not None and not transport.is_closing():
+            # nothing queued ahead of it, so skip the writer task and write the template's own buffer
+            transport.write(frame)
+            if transport.get_write_buffer_size():
+                # the transport may hold on to the frame until the socket drains, render into a new one
+                template.detach()
+            counters[1].value += len(frame)
+            written.set_result(len(frame))
+        else:
+            # the next render reuses the buffer before the writer gets to this one
+            self.send_outgoing_msg(bytes(frame), written)
+        return written
+
+    def _failed(self, exc: Exception) -> asyncio.Future:
+        written = asyncio.get_running_loop().create_future()
+        written.set_exception(exc)
+        # fire-and-forget senders never look at the future, don't log it as unretrieved
+        written.exception()
+        return written
+
+    def send_ouch_batch(self, ouch_msgs, payloads=None) -> asyncio.Future:
+        """
+        Frame several OUCH messages as UnsequencedData in one pass and relay
+        them as a single coalesced write. Returns a future that resolves once
+        the whole batch is written to the wire. Callers run pretrade() on the
+        orders first, per request, so one breach doesn't sink the batch, and
+        pass the payloads they encoded while validating each request.
+        """
+        if payloads is None:
+            # everything is encoded before anything is recorded, a bad message fails the batch cleanly
+            payloads = [ouch_msg.TYPE_ID + ouch_msg.to_soupbin() for ouch_msg in ouch_msgs]
+        frames = []
+        unsequenced = PacketType.UNSEQUENCED_DATA.value
+        observers = self.observers
+        history = self.history
+        for ouch_msg, ouch_payload in zip(ouch_msgs, payloads):
+            size = len(ouch_payload)
+            if history is not None:
+                history.append(OUTBOUND, ouch_payload)
+            for obs in observers:
+                obs.on_ouch_outbound(ouch_msg, size)
+            frames.append((size + 1).to_bytes(2, "big"))
+            frames.append(unsequenced)
+            frames.append(ouch_payload)
+        _OUT[unsequenced][0].value += len(frames) // 3
+        written = asyncio.get_running_loop().create_future()
+        self.send_outgoing_msg(b"".join(frames), written)
+        return written
+
+    def add_observer(self, observer):
+        """
+        Register a component with on_ouch_inbound(msg, size) and
+        on_ouch_outbound(msg, size) hooks, plus an optional on_disconnect(exc).
+        Hooks run inline on the event loop so they must be cheap. Outbound
+        messages from send_template are reused, copy any field to keep.
+        """
+        self.observers.append(observer)
 
 
     def on_disconnect(self, exc):
         self.logger.warning(f"⚠️ Disconnected: {exc}")
+        self.transport = None
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        if self.logged_in is not None and not self.logged_in.done():
+            self.logged_in.set_exception(ConnectionError(f"Disconnected before login: {exc}"))
+        for obs in self.observers:
+            on_disconnect = getattr(obs, "on_disconnect", None)
+            if on_disconnect is not None:
+                on_disconnect(exc)
 
     def send_event(self, event_type: str, payload: dict):
+        """
+        Publish an event as a two frame message [topic, body].
+
+        The topic is "<kind>/<session>/<order_book_id>/" where kind is the OUCH
+        type byte for protocol messages ("A", "E", ...) or the event name
+        otherwise. SUB sockets filter on topic prefixes, so e.g. "E/" receives
+        only executions and the PUB side drops everything else before it
+        reaches the socket. The trailing "/" lets "E/<session>/1/" match book 1
+        without also matching books 10, 11, ...
+        """
+        if self.pub is None:
+            return
         envelope = {"type": event_type, "payload": payload}
-        json_str = json.dumps(envelope)
-        self.logger.debug(f"Sending event: {json_str}")
-        self.pub.send_string(json.dumps(envelope))
\ No newline at end of file
+        self.logger.debug("Sending event: %s", envelope)
+        kind = event_type[6:] if event_type.startswith("Type: ") else event_type
+        book = payload.get("order_book_id", "") if isinstance(payload, dict) else ""
+        topic = f"{kind}/{self.session}/{book}/".encode()
+        start = time.perf_counter()
+        body = self.codec.encode(envelope)
+        ENCODE_SECONDS.labels(self.codec.name).observe(time.perf_counter() - start)
+        self.pub.send_multipart([topic, body])
+        EVENTS_PUBLISHED.labels(kind).inc()
+        BYTES_PUBLISHED.inc(len(body))
@@ -1,27 +1,75 @@
 
 from ouch_msgs import *
 import logging
+import struct
 
 
 
+def parse_ouch_message(req):
+    """Build an outbound OUCH message from a frontend dict, raising on invalid input."""
+    msg_type = req.pop("type", None)
+    if not msg_type:
+        raise ValueError("Message type is required")
+
+    if msg_type == "EnterOrder":
+        # a missing token is filled in by the backend's TokenAllocator
+        req.setdefault("order_token", "")
+        return EnterOrder(**req)
+    elif msg_type == "CancelOrder":
+        return CancelOrder(**req)
+    elif msg_type == "CancelOrderByID":
+        return CancelOrderByID(**req)
+    elif msg_type == "ReplaceOrder":
+        req.setdefault("replacement_order_token", "")
+        return ReplaceOrder(**req)
+    raise ValueError(f"Unsupported message type: {msg_type}")
+
+
+def parse_basket(req):
+    """Parse every leg of a Basket request, raising on the first invalid leg."""
+    legs = req.get("orders")
+    if not isinstance(legs, list) or not legs:
+        raise ValueError("Basket requires a non-empty 'orders' list")
+    msgs = []
+    for i, leg in enumerate(legs):
+        try:
+            msgs.append(parse_ouch_message(dict(leg)))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Basket leg {i}: {e}") from e
+    return msgs
+
+
+def encode_ouch_messages(ouch_msgs):
+    """TYPE_ID + payload of each message, raising ValueError if one has a field of the wrong type or range."""
+    payloads = []
+    for i, msg in enumerate(ouch_msgs):
+        try:
+            payloads.append(msg.TYPE_ID + msg.to_soupbin())
+        except (struct.error, AttributeError, TypeError, ValueError, OverflowError) as e:
+            where = f" (leg {i})" if len(ouch_msgs) > 1 else ""
+            raise ValueError(f"Invalid {type(msg).__name__}{where}: {e}") from e
+    return payloads
+
+
+def parse_template_order(req, templates):
+    """Resolve a TemplateOrder request to (template, qty, price, order_token), raising on invalid input."""
+    name = req.get("template")
+    template = templates.get(name)
+    if template is None:
+        raise ValueError(f"Unknown order template {name!r}")
+    try:
+        qty, price = int(req["qty"]), float(req["price"])
+    except KeyError as e:
+        raise ValueError(f"TemplateOrder requires {e.args[0]!r}") from None
+    # checked before the caller allocates a token for it
+    template.check(qty, price)
+    return template, qty, price, str(req.get("order_token") or "")
+
+
 def create_ouch_message_from_json(req):
     logging.debug(f"Creating OUCH message from JSON: {req}")
-    msg_type = req.get("type")
     try:
-        if not msg_type:
-            raise ValueError("Message type is required")
-        else:
-            # req["TYPE_ID"] = b'O'
-            req.pop("type", None)
-
-        if msg_type == "EnterOrder":
-            return EnterOrder(**req)
-        elif msg_type == "CancelOrder":
-            return CancelOrder(**req)
-        elif msg_type == "CancelOrderByID":
-            return CancelOrderByID(**req)
-        elif msg_type == "ReplaceOrder":
-            return ReplaceOrder(**req)
+        return parse_ouch_message(req)
     except Exception as e:
         import traceback
         logging.error(f"Exception in create_ouch_message_from_json: {e}")
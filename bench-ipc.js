@@ -0,0 +1,48 @@
+// Renderer-side counterpart of backend/bench_ipc.py: decode/encode cost of
+// JSON vs msgpack IPC frames in the Electron main process.
+// Usage: node bench-ipc.js [events]
+const { encode: msgpackEncode, decode: msgpackDecode } = require("@msgpack/msgpack");
+
+const N = parseInt(process.argv[2] || "200000", 10);
+
+const SAMPLE_EVENT = {
+  type: "Type: A",
+  payload: {
+    ts_ns: 1751544073564577000, order_token: "ORD440682629HZ", order_book_id: 1232,
+    side: "S", order_id: 10001, qty: 123, price: 2200, time_in_force: 0,
+    open_close: 0, client_account: "334", order_state: 1, customer_info: "",
+    exchange_info: "", pretrade_qty: 123, display_qty: 0, client_category: 1,
+    off_hours: 1,
+  },
+};
+
+const codecs = {
+  json: {
+    encode: (obj) => Buffer.from(JSON.stringify(obj)),
+    decode: (buf) => JSON.parse(buf.toString()),
+  },
+  msgpack: {
+    encode: (obj) => Buffer.from(msgpackEncode(obj)),
+    decode: (buf) => msgpackDecode(buf),
+  },
+};
+
+function measure(fn) {
+  const cpu = process.cpuUsage();
+  const start = process.hrtime.bigint();
+  for (let i = 0; i < N; i++) fn();
+  const wallS = Number(process.hrtime.bigint() - start) / 1e9;
+  const used = process.cpuUsage(cpu);
+  return { perSec: N / wallS, cpuUs: (used.user + used.system) / N };
+}
+
+for (const [name, codec] of Object.entries(codecs)) {
+  const frame = codec.encode(SAMPLE_EVENT);
+  const enc = measure(() => codec.encode(SAMPLE_EVENT));
+  const dec = measure(() => codec.decode(frame));
+  console.log(
+    `codec=${name} size_bytes=${frame.length} ` +
+    `encode_per_sec=${enc.perSec.toFixed(0)} encode_cpu_us=${enc.cpuUs.toFixed(2)} ` +
+    `decode_per_sec=${dec.perSec.toFixed(0)} decode_cpu_us=${dec.cpuUs.toFixed(2)}`
+  );
+}
@@ -7,6 +7,36 @@ declare global {
       onBackendDisconnected: (callback: () => void) => void;
       onBackendEvent: (callback: (data: any) => void) => void;
       sendOrder: (order: any) => Promise<any>;
+      sendBasket: (orders: any[]) => Promise<any>;
+      queryHistory: (query: {
+        offset?: number;
+        limit?: number;
+        types?: string[];
+        direction?: 'I' | 'O';
+        since_ns?: number;
+        until_ns?: number;
+        newest_first?: boolean;
+      }) => Promise<{ status: string; total: number; offset: number; limit: number; messages: any[] }>;
+      lookupMessages: (query: {
+        field: 'order_token' | 'order_id' | 'order_book_id' | 'client_account' | 'match_id';
+        value: string | number;
+        offset?: number;
+        limit?: number;
+        newest_first?: boolean;
+      }) => Promise<{ status: string; total: number; messages: any[]; evicted: number[] }>;
+      defineOrderTemplate: (template: {
+        name: string;
+        order_book_id: number;
+        side: 'B' | 'S' | 'T';
+        time_in_force?: number;
+        open_close?: number;
+        client_account?: string;
+        customer_info?: string;
+        exchange_info?: string;
+        display_qty?: number;
+        client_category?: number;
+        off_hours?: number;
+      }) => Promise<{ status: string; name: string; size: number }>;
       sendConnectionConfig: (config: {
         host: string;
         port: string;
@@ -68,6 +68,9 @@ interface FixMessage {
   status?: 'sent' | 'delivered' | 'error';
 }
 
+// Live views keep only the latest rows, older ones are paged from the backend (electronAPI.queryHistory)
+const MAX_LIVE_ROWS = 500;
+
 const Index = () => {
   const [events, setEvents] = useState<any[]>([]);
   const [isConnected, setIsConnected] = useState(false);
@@ -155,8 +158,8 @@ const Index = () => {
   useEffect(() => {
     // @ts-ignore
     window.electronAPI?.onBackendEvent((data) => {
-      setEvents(prev => [...prev, data]);
-      setMessages(prev => [...prev, eventToOuchMessage(data)]);
+      setEvents(prev => [...prev.slice(-(MAX_LIVE_ROWS - 1)), data]);
+      setMessages(prev => [...prev.slice(-(MAX_LIVE_ROWS - 1)), eventToOuchMessage(data)]);
 
       const type = data.type || "";
       switch (true) {
@@ -247,6 +250,27 @@ const Index = () => {
           );
           break;
         }
+        case type === "RiskReject": { // stopped by the backend's pre-trade checks, never sent
+          const reject = data.payload;
+          setOrders(prevOrders =>
+            prevOrders.map(order =>
+              order.id === reject.order_token
+                ? {
+                    ...order,
+                    status: "Rejected",
+                    ackMessage: {
+                      id: reject.order_token,
+                      content: JSON.stringify(reject, null, 2),
+                      timestamp: new Date().toLocaleTimeString(),
+                      type: "reject"
+                    },
+                    rawData: reject
+                  }
+                : order
+            )
+          );
+          break;
+        }
         default:
           // Handle other types or ignore
           break;
@@ -259,7 +283,7 @@ const Index = () => {
   const handleSendMessage = (content: string) => {
     
     setMessages(prev => [
-      ...prev,
+      ...prev.slice(-(MAX_LIVE_ROWS - 1)),
       {
         id: String(Date.now()),
         type: 'outgoing',
@@ -277,7 +301,7 @@ const Index = () => {
     
     setMessages(prev => {
       console.log('Previous messages count:', prev.length);
-      const newMessages = [orderMessage, ...prev];
+      const newMessages = [orderMessage, ...prev.slice(0, MAX_LIVE_ROWS - 1)];
       console.log('New messages count:', newMessages.length);
       return newMessages;
     });
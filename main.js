@@ -1,5 +1,6 @@
 const { app, BrowserWindow, ipcMain } = require('electron'); 
 const zmq = require("zeromq");
+const { encode: msgpackEncode, decode: msgpackDecode } = require("@msgpack/msgpack");
 
 let mainWindow = null;
 let HEARTBEAT_INTERVAL = 5;
@@ -7,6 +8,25 @@ let heartbeatTimer = null;
 let isConnected = false;
 let pubSocket = null; 
 
+// IPC encodings we offer the backend, in preference order. JSON is always the fallback.
+const IPC_ENCODINGS = (process.env.IPC_ENCODINGS || "msgpack,json").split(",");
+let ipcEncoding = "json";
+
+// High-water marks sized for bursty flow; events beyond these are dropped by ZMQ
+const IPC_HWM = parseInt(process.env.IPC_HWM || "100000", 10);
+// Topic prefixes to receive ("<kind>/<session>/<order_book_id>/"), empty means everything.
+// A prefix naming a book needs the trailing "/", "E/S1/1" would also match books 10, 11, ...
+const IPC_TOPICS = (process.env.IPC_TOPICS || "").split(",").filter(Boolean);
+
+// Every IPC message is a map: JSON frames start with '{', msgpack frames never do
+function decodeIpc(buf) {
+  return buf[0] === 0x7b ? JSON.parse(buf.toString()) : msgpackDecode(buf);
+}
+
+function encodeIpc(obj) {
+  return ipcEncoding === "msgpack" ? Buffer.from(msgpackEncode(obj)) : JSON.stringify(obj);
+}
+
 ///////////////////////////////////////////////////////
 // Setup SUB socket to send orders to the backend
 /////////////////////////////////////////////////////////
@@ -23,7 +43,13 @@ ipcMain.handle('send-connection-config', async (event, config) => {
   try {
 
     if (pubSocket) {
+      // hello is always JSON since the backend may not have negotiated yet
       await pubSocket.send(JSON.stringify({
+        type: "CONN",
+        command: "hello",
+        encodings: IPC_ENCODINGS
+      }));
+      await pubSocket.send(encodeIpc({
         type: "CONN",
         command: "connect",
         ...config
@@ -40,7 +66,7 @@ ipcMain.handle('send-connection-config', async (event, config) => {
 ipcMain.handle('disconnect-backend', async (event) => {
   try {
     if (pubSocket) {
-      await pubSocket.send(JSON.stringify({
+      await pubSocket.send(encodeIpc({
         type: "CONN",
         command: "disconnect"
       }));
@@ -54,29 +80,37 @@ ipcMain.handle('disconnect-backend', async (event) => {
 });
 
 async function subscribeToEvents() {
-  const sock = new zmq.Subscriber();
+  const sock = new zmq.Subscriber({ receiveHighWaterMark: IPC_HWM });
   heartbeatTimer = setTimeout(handleBackendDisconnect, HEARTBEAT_INTERVAL * 1000);
 
 
   // Connect to the Python PUB socket
   sock.connect("ipc:///tmp/ouch-ipc.sock");
-  sock.subscribe();
+  // Encoding replies are needed for negotiation and heartbeats for the alive timer, whatever else is filtered
+  sock.subscribe(...(IPC_TOPICS.length ? [...IPC_TOPICS, "Encoding/", "Heartbeat/"] : []));
   console.log("Subscribed to Python backend events...");
 
   
-  for await (const [msg] of sock) {
-    const event = JSON.parse(msg.toString());
+  for await (const [topic, msg] of sock) {
+    const event = decodeIpc(msg);
+    if (event.type === "Encoding") {
+      ipcEncoding = event.payload.encoding;
+      console.log("IPC encoding negotiated:", ipcEncoding);
+    }
     // if(!event.payload.content == "ServerHeartbeat()"){
     //   console.log("Received event:", event);
     // }
     if (heartbeatTimer) clearTimeout(heartbeatTimer);
     heartbeatTimer = setTimeout(handleBackendDisconnect, HEARTBEAT_INTERVAL * 1000);
 
-    console.log("Received event:", event);
     if (!isConnected && mainWindow) {
       mainWindow.webContents.send('backend-connected');
       isConnected = true;
     }
+    // heartbeats only feed the alive timer, the renderer never sees them
+    if (event.type === "Heartbeat") continue;
+
+    console.log("Received event:", event);
     if (mainWindow) {
       mainWindow.webContents.send('backend-event', event);
     }
@@ -87,30 +121,93 @@ async function subscribeToEvents() {
 /////////////////////////////////////////////////////////
 
 async function setupPubSocket() {
-  pubSocket = new zmq.Publisher();
+  pubSocket = new zmq.Publisher({ sendHighWaterMark: IPC_HWM });
   pubSocket.bind("ipc:///tmp/ouch-ipc-orders.sock");
   console.log("PUB socket bound to /tmp/ouch-ipc-orders.sock");
 }
-async function sendOrderToBackend(order) {
-  if (!pubSocket) {
-    console.error("PUB socket is not initialized");
-    return;
+///////////////////////////////////////////////////////
+// DEALER socket for request/reply commands (orders)
+/////////////////////////////////////////////////////////
+
+const COMMAND_TIMEOUT_MS = 5000;
+let cmdSocket = null;
+let nextCorrId = 1;
+const pendingCommands = new Map(); // corr_id -> { resolve, timer }
+// zeromq.js allows one send in flight per socket, so sends are chained
+let cmdSendChain = Promise.resolve();
+
+async function setupCommandSocket() {
+  cmdSocket = new zmq.Dealer({ sendHighWaterMark: IPC_HWM, receiveHighWaterMark: IPC_HWM });
+  cmdSocket.connect("ipc:///tmp/ouch-ipc-cmd.sock");
+  console.log("DEALER socket connected to /tmp/ouch-ipc-cmd.sock");
+
+  for await (const [msg] of cmdSocket) {
+    const reply = decodeIpc(msg);
+    const pending = pendingCommands.get(reply.corr_id);
+    if (!pending) continue; // already timed out
+    pendingCommands.delete(reply.corr_id);
+    clearTimeout(pending.timer);
+    pending.resolve(reply);
   }
+}
 
-  try {
-    const orderJson = JSON.stringify(order);
-    await pubSocket.send([orderJson]);
-    console.log("Order sent to backend:", order);
-  } catch (error) {
-    console.error("Error sending order to backend:", error);
+// Resolves with the backend's reply: { corr_id, status: "sent" | "rejected" | "ok", reason? }
+function sendCommand(command) {
+  if (!cmdSocket) {
+    return Promise.resolve({ status: "rejected", reason: "Command socket is not initialized" });
+  }
+  const corr_id = nextCorrId++;
+  return new Promise((resolve) => {
+    const timer = setTimeout(() => {
+      pendingCommands.delete(corr_id);
+      resolve({ corr_id, status: "timeout" });
+    }, COMMAND_TIMEOUT_MS);
+    pendingCommands.set(corr_id, { resolve, timer });
+
+    const frame = encodeIpc({ ...command, corr_id });
+    cmdSendChain = cmdSendChain.then(() => cmdSocket.send(frame)).catch((error) => {
+      console.error("Error sending command to backend:", error);
+      pendingCommands.delete(corr_id);
+      clearTimeout(timer);
+      resolve({ corr_id, status: "rejected", reason: error.message || String(error) });
+    });
+  });
+}
+
+async function sendOrderToBackend(order) {
+  const reply = await sendCommand(order);
+  if (reply.status !== "sent") {
+    console.error("Order not sent:", order, reply);
   }
-  return { status: "ok" };
+  return reply;
 }
 
 ipcMain.handle('send-order', async (event, order) => {
   return await sendOrderToBackend(order);
 });
 
+// A basket travels as one IPC message and is written to the wire in one coalesced write
+ipcMain.handle('send-basket', async (event, orders) => {
+  return await sendCommand({ type: "Basket", orders });
+});
+
+// One page of the backend's message history:
+// { offset, limit, types, direction, since_ns, until_ns, newest_first } -> { status, total, messages, ... }
+ipcMain.handle('query-history', async (event, query) => {
+  return await sendCommand({ ...query, type: "CONN", command: "history" });
+});
+
+// Every message about one order_token / order_id / order_book_id / client_account / match_id
+ipcMain.handle('lookup-messages', async (event, query) => {
+  return await sendCommand({ ...query, type: "CONN", command: "lookup" });
+});
+
+// Pre-encode an EnterOrder prefill: { name, order_book_id, side, client_account, ... }.
+// Orders are then sent as { type: "TemplateOrder", template: name, qty, price }
+ipcMain.handle('define-order-template', async (event, template) => {
+  return await sendCommand({ ...template, type: "CONN", command: "template" });
+});
+
 ///////////////////////////////////////////////////////
 // Rest window stuff
 /////////////////////////////////////////////////////////
@@ -132,5 +229,6 @@ const createWindow = () => {
 app.whenReady().then(() => {
   subscribeToEvents();
   setupPubSocket();
+  setupCommandSocket();
   createWindow();
 })
\ No newline at end of file
@@ -3,6 +3,10 @@ const { contextBridge, ipcRenderer } = require('electron');
 contextBridge.exposeInMainWorld('electronAPI', {
   onBackendEvent: (callback) => ipcRenderer.on('backend-event', (event, data) => callback(data)),
   sendOrder: (order) => ipcRenderer.invoke('send-order', order),
+  sendBasket: (orders) => ipcRenderer.invoke('send-basket', orders),
+  queryHistory: (query) => ipcRenderer.invoke('query-history', query),
+  lookupMessages: (query) => ipcRenderer.invoke('lookup-messages', query),
+  defineOrderTemplate: (template) => ipcRenderer.invoke('define-order-template', template),
   onBackendDisconnected: (callback) => ipcRenderer.on('backend-disconnected', (event) => callback()),
   onBackendConnected: (callback) => ipcRenderer.on('backend-connected', callback),
   sendConnectionConfig: (config) => ipcRenderer.invoke('send-connection-config', config),